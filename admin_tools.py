@@ -10,7 +10,6 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database.services import get_database_service
-import sqlite3
 
 class AdminTools:
     """Ferramentas administrativas para gerenciar usuários"""
@@ -18,21 +17,17 @@ class AdminTools:
     def __init__(self):
         self.db_service = get_database_service()
         self.db_path = self.db_service.db_path
+        self.pool = self.db_service.db.pool
     
     def list_users(self):
         """Lista todos os usuários cadastrados"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT u.id, u.email, u.created_at, p.name, p.age, p.weight, p.height
-            FROM users u
-            LEFT JOIN user_profiles p ON u.id = p.user_id
-            ORDER BY u.created_at DESC
-        ''')
-        
-        users = cursor.fetchall()
-        conn.close()
+        with self.pool.connection() as conn:
+            users = conn.execute('''
+                SELECT u.id, u.email, u.created_at, p.name, p.age, p.weight, p.height
+                FROM users u
+                LEFT JOIN user_profiles p ON u.id = p.user_id
+                ORDER BY u.created_at DESC
+            ''').fetchall()
         
         if not users:
             print("❌ Nenhum usuário encontrado no banco de dados.")
@@ -56,7 +51,7 @@ class AdminTools:
     
     def delete_user_by_email(self, email):
         """Remove um usuário pelo email"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -81,7 +76,8 @@ class AdminTools:
                 print("❌ Operação cancelada.")
                 return False
             
-            # Excluir em ordem (devido às foreign keys)
+            # Excluir em ordem (devido às foreign keys, verificadas pelo perfil do banco)
+            self._delete_diet_data(cursor, user_id)
             cursor.execute("DELETE FROM chat_messages WHERE session_id IN (SELECT id FROM chat_sessions WHERE user_id = ?)", (user_id,))
             cursor.execute("DELETE FROM chat_sessions WHERE user_id = ?", (user_id,))
             cursor.execute("DELETE FROM user_profiles WHERE user_id = ?", (user_id,))
@@ -90,7 +86,7 @@ class AdminTools:
             conn.commit()
             
             print(f"✅ Usuário '{email}' foi removido com sucesso!")
-            print(f"   🗑️ Dados removidos: conta, perfil, sessões de chat e mensagens")
+            print(f"   🗑️ Dados removidos: conta, perfil, sessões de chat, mensagens, dietas e listas")
             
             return True
             
@@ -99,11 +95,23 @@ class AdminTools:
             print(f"❌ Erro ao excluir usuário: {str(e)}")
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
+    
+    def _delete_diet_data(self, cursor, user_id=None):
+        """Remove dietas, listas de compras e estoque (de um usuário ou de todos), se as tabelas existirem"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        tables = {row[0] for row in cursor.fetchall()}
+        for table in ('home_inventory', 'shopping_lists', 'user_diets'):
+            if table not in tables:
+                continue
+            if user_id is None:
+                cursor.execute(f"DELETE FROM {table}")
+            else:
+                cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
     
     def delete_user_by_id(self, user_id):
         """Remove um usuário pelo ID"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -121,11 +129,11 @@ class AdminTools:
             print(f"❌ Erro ao buscar usuário: {str(e)}")
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def clear_all_users(self):
         """Remove TODOS os usuários (usar com cuidado!)"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -152,6 +160,7 @@ class AdminTools:
                 return False
             
             # Excluir tudo em ordem
+            self._delete_diet_data(cursor)
             cursor.execute("DELETE FROM chat_messages")
             cursor.execute("DELETE FROM chat_sessions")
             cursor.execute("DELETE FROM user_profiles")
@@ -168,11 +177,11 @@ class AdminTools:
             print(f"❌ Erro ao excluir usuários: {str(e)}")
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_database_stats(self):
         """Mostra estatísticas do banco de dados"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -199,7 +208,7 @@ class AdminTools:
         except Exception as e:
             print(f"❌ Erro ao obter estatísticas: {str(e)}")
         finally:
-            conn.close()
+            self.pool.release(conn)
 
 
 def main():
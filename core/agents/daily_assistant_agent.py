@@ -8,6 +8,7 @@ import logging
 from datetime import datetime
 import json
 import re
+import copy
 
 # Langgraph imports (with fallback)
 try:
@@ -30,10 +31,31 @@ sys.path.insert(0, project_root)
 
 from core.core import BaseAgent, AgentConfig, AgentState, AgentType, TaskType
 from core.config_loader import get_config_loader
+from utils.nutrition_api import get_nutrition_service
 
 logger = logging.getLogger(__name__)
 
 
+# Base de substituições alimentares (também usada no pré-aquecimento do cache de alimentos)
+SUBSTITUTION_DATABASE: Dict[str, List[Dict[str, str]]] = {
+    'arroz': [
+        {'substitute': 'quinoa', 'ratio': '1:1', 'reason': 'Mais proteína e fibras'},
+        {'substitute': 'batata-doce', 'ratio': '100g:80g', 'reason': 'Menor índice glicêmico'},
+        {'substitute': 'couve-flor refogada', 'ratio': '1:1', 'reason': 'Muito menos carboidratos'}
+    ],
+    'açúcar': [
+        {'substitute': 'mel', 'ratio': '1:0.7', 'reason': 'Menos processado, mais antioxidantes'},
+        {'substitute': 'tâmaras', 'ratio': '1 colher:2 tâmaras', 'reason': 'Fibras e minerais'},
+        {'substitute': 'stevia', 'ratio': '1:0.1', 'reason': 'Zero calorias, natural'}
+    ],
+    'farinha de trigo': [
+        {'substitute': 'farinha de aveia', 'ratio': '1:1', 'reason': 'Mais fibras e proteínas'},
+        {'substitute': 'farinha de amêndoas', 'ratio': '1:0.8', 'reason': 'Low carb, gorduras boas'},
+        {'substitute': 'farinha de coco', 'ratio': '1:0.3', 'reason': 'Muito menos carboidratos'}
+    ]
+}
+
+
 class DailyAssistantAgent(BaseAgent):
     """Agente especializado em suporte nutricional diário e substituições alimentares"""
     
@@ -172,29 +194,9 @@ class DailyAssistantAgent(BaseAgent):
     
     def _detect_request_type(self, message: str) -> str:
         """Detecta o tipo de solicitação do usuário"""
-        message_lower = message.lower()
-        
-        # Palavras-chave para substituições
-        substitution_keywords = ['substituir', 'trocar', 'substituto', 'no lugar de', 'em vez de', 'posso usar']
-        if any(keyword in message_lower for keyword in substitution_keywords):
-            return 'substitution'
-        
-        # Palavras-chave para análise de cardápio
-        menu_keywords = ['cardápio', 'menu', 'restaurante', 'pode comer', 'posso pedir']
-        if any(keyword in message_lower for keyword in menu_keywords):
-            return 'menu_analysis'
-        
-        # Palavras-chave para lista de compras
-        shopping_keywords = ['lista de compras', 'comprar', 'mercado', 'ingredientes']
-        if any(keyword in message_lower for keyword in shopping_keywords):
-            return 'shopping_list'
-        
-        # Palavras-chave para receitas
-        recipe_keywords = ['receita', 'como fazer', 'preparar', 'cozinhar']
-        if any(keyword in message_lower for keyword in recipe_keywords):
-            return 'recipe_search'
-        
-        return 'general_support'
+        # Uma única passada pelo texto; a ordem de task_keywords no YAML define a prioridade
+        request_type = self.keyword_matcher.first_group(message, self.config.task_keywords.keys())
+        return request_type or 'general_support'
     
     def _handle_substitution_simple(self, state: AgentState) -> str:
         """Maneja substituições alimentares de forma simplificada"""
@@ -348,41 +350,12 @@ Assim posso sugerir receitas mais personalizadas! 🎯"""
     
     def _load_substitution_database(self) -> Dict[str, List[Dict[str, str]]]:
         """Carrega base de dados de substituições alimentares"""
-        return {
-            'arroz': [
-                {'substitute': 'quinoa', 'ratio': '1:1', 'reason': 'Mais proteína e fibras'},
-                {'substitute': 'batata-doce', 'ratio': '100g:80g', 'reason': 'Menor índice glicêmico'},
-                {'substitute': 'couve-flor refogada', 'ratio': '1:1', 'reason': 'Muito menos carboidratos'}
-            ],
-            'açúcar': [
-                {'substitute': 'mel', 'ratio': '1:0.7', 'reason': 'Menos processado, mais antioxidantes'},
-                {'substitute': 'tâmaras', 'ratio': '1 colher:2 tâmaras', 'reason': 'Fibras e minerais'},
-                {'substitute': 'stevia', 'ratio': '1:0.1', 'reason': 'Zero calorias, natural'}
-            ],
-            'farinha de trigo': [
-                {'substitute': 'farinha de aveia', 'ratio': '1:1', 'reason': 'Mais fibras e proteínas'},
-                {'substitute': 'farinha de amêndoas', 'ratio': '1:0.8', 'reason': 'Low carb, gorduras boas'},
-                {'substitute': 'farinha de coco', 'ratio': '1:0.3', 'reason': 'Muito menos carboidratos'}
-            ]
-        }
+        return copy.deepcopy(SUBSTITUTION_DATABASE)
     
     def _extract_foods_from_text(self, text: str) -> List[str]:
         """Extrai nomes de alimentos do texto"""
-        # Lista básica de alimentos comuns
-        common_foods = [
-            'arroz', 'feijão', 'frango', 'carne', 'peixe', 'ovo', 'ovos',
-            'açúcar', 'sal', 'óleo', 'azeite', 'leite', 'queijo', 'pão',
-            'farinha', 'batata', 'macarrão', 'massa', 'banana', 'maçã'
-        ]
-        
-        text_lower = text.lower()
-        found_foods = []
-        
-        for food in common_foods:
-            if food in text_lower:
-                found_foods.append(food)
-        
-        return found_foods
+        # Lista básica de alimentos comuns (keyword_groups.common_foods no YAML)
+        return self.keyword_matcher.scan(text).get('common_foods', [])
     
     def _get_substitution_suggestions(self, food: str, user_profile: Dict[str, Any]) -> List[Dict[str, str]]:
         """Obtém sugestões de substituição para um alimento"""
@@ -501,9 +474,9 @@ Assim posso sugerir receitas mais personalizadas! 🎯"""
         """Encontra receitas compatíveis"""
         return [{'status': 'Busca de receitas em desenvolvimento'}]
     
-    def _calculate_food_equivalences(self, food1: str, food2: str) -> Dict[str, Any]:
-        """Calcula equivalências nutricionais entre alimentos"""
-        return {'status': 'Cálculo de equivalências em desenvolvimento'}
+    def _calculate_food_equivalences(self, food1: str, food2: str = None, grams: float = 100) -> Dict[str, Any]:
+        """Calcula equivalências nutricionais entre alimentos (índice de macros em memória)"""
+        return get_nutrition_service().calculate_food_equivalences(food1, other_food=food2, grams=grams)
     
     def _check_diet_adherence(self, meals_log: List[Dict[str, Any]], diet_plan: Dict[str, Any]) -> Dict[str, Any]:
         """Verifica aderência à dieta"""
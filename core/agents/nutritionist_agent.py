@@ -22,9 +22,33 @@ from core.config_loader import get_config_loader
 from utils.nutrition_api import NutritionAPI
 from utils.pdf_generator import create_diet_pdf
 from utils.diet_manager.diet_storage import DietManager
+from utils.speculative_preview import SpeculativePreviewCache
+from utils.nutrition_calculator import calculate_from_user_data
+from utils import json_codec
+from utils.llm_json import parse_llm_json
+from utils.nutrient_matrix import NutrientMatrix, compute_menu_totals
+from utils.food_names import get_food_name_resolver
 
 logger = logging.getLogger(__name__)
 
+# Schemas das respostas JSON dos handlers YAML
+FOOD_SELECTION_SCHEMA = {
+    'type': list,
+    'items': {'type': str},
+    'min_items': 1
+}
+
+FOOD_PREFERENCES_SCHEMA = {
+    'type': dict,
+    'properties': {
+        'liked_foods': {'type': list, 'items': {'type': str}, 'default': []},
+        'disliked_foods': {'type': list, 'items': {'type': str}, 'default': []},
+        'current_foods': {'type': list, 'items': {'type': str}, 'default': []},
+        'dietary_restrictions': {'type': list, 'items': {'type': str}, 'default': []},
+        'meal_patterns': {'type': dict, 'default': {}}
+    }
+}
+
 
 class NutritionistAgent(BaseAgent):
     """Agente nutricionista baseado em configurações YAML e context prompts científicos"""
@@ -42,6 +66,9 @@ class NutritionistAgent(BaseAgent):
         # Inicializar gerenciador de dietas
         self.diet_manager = DietManager()
         
+        # Pré-cálculo especulativo do preview (opt-in via NUTRITIONIST_SPECULATIVE_PREVIEW)
+        self.preview_speculation = SpeculativePreviewCache()
+        
         # Context prompts científicos disponíveis diretamente do config YAML
         self.available_contexts = config.contexts
     
@@ -94,13 +121,9 @@ class NutritionistAgent(BaseAgent):
             if not state.get('messages'):
                 return 'consultation'
             
-            user_message = state['messages'][-1].content.lower()
-            
-            # Calcular scores para cada tipo de task
-            task_scores = {}
-            for task_type, keywords in task_keywords.items():
-                score = sum(1 for keyword in keywords if keyword in user_message)
-                task_scores[task_type] = score
+            # Calcular scores para cada tipo de task (uma única passada pela mensagem)
+            keyword_counts = self.keyword_matcher.count(state['messages'][-1].content)
+            task_scores = {task_type: keyword_counts.get(task_type, 0) for task_type in task_keywords}
             
             # Retornar task type com maior score ou default
             best_task = max(task_scores, key=task_scores.get, default='consultation')
@@ -258,12 +281,13 @@ class NutritionistAgent(BaseAgent):
             
             # Verificar se estÃ¡ em ponto de decisÃ£o baseado no estado da conversa
             conversation_length = len(consultation_state['conversation_history'])
-            last_messages = [msg['message'].lower() for msg in consultation_state['conversation_history'][-4:] if msg['role'] == 'user']
+            last_messages = [msg['message'] for msg in consultation_state['conversation_history'][-4:] if msg['role'] == 'user']
             
-            # Verificar se coletou informaÃ§Ãµes suficientes
-            has_routine_info = any('refeiÃ§Ã£o' in msg or 'como' in msg or 'cafÃ©' in msg or 'almoÃ§o' in msg for msg in last_messages)
-            has_preference_info = any('gosta' in msg or 'fruta' in msg or 'verdura' in msg for msg in last_messages)
-            has_context_info = any('tempo' in msg or 'rotina' in msg or 'desafio' in msg for msg in last_messages)
+            # Verificar se coletou informaÃ§Ãµes suficientes (keyword_groups do YAML, uma passada por mensagem)
+            found_groups = self.keyword_matcher.scan_many(last_messages)
+            has_routine_info = 'routine_info' in found_groups
+            has_preference_info = 'preference_info' in found_groups
+            has_context_info = 'context_info' in found_groups
             
             # Determinar fase atual baseado no conteÃºdo
             if conversation_length > 10 and has_routine_info and has_preference_info and has_context_info:
@@ -272,8 +296,13 @@ class NutritionistAgent(BaseAgent):
                 
                 # Se chegou na fase de preview da dieta, gerar preview completo
                 if consultation_state.get('ready_for_diet_preview', False):
-                    # Gerar preview da dieta com dados reais da API
-                    diet_preview = self._generate_diet_preview(consultation_state)
+                    # Reaproveitar o preview especulativo (pronto ou em andamento) quando houver
+                    diet_preview = self.preview_speculation.take(
+                        consultation_state.get('consultation_id'), consultation_state, self._changes_diet_inputs
+                    )
+                    if diet_preview is None:
+                        # Gerar preview da dieta com dados reais da API
+                        diet_preview = self._generate_diet_preview(consultation_state)
                     consultation_state['diet_preview'] = diet_preview
                     
                     # Gerar resposta mostrando a dieta completa
@@ -293,6 +322,15 @@ class NutritionistAgent(BaseAgent):
             elif conversation_length > 4 and not has_routine_info:
                 consultation_state['current_phase'] = 'eating_routine_assessment'
             
+            # Rotina e preferências já coletadas: antecipar cálculos e buscas USDA do preview
+            if has_routine_info and has_preference_info and not consultation_state.get('ready_for_diet_preview'):
+                self.preview_speculation.speculate(
+                    consultation_state.get('consultation_id'),
+                    consultation_state,
+                    self._generate_diet_preview,
+                    self._changes_diet_inputs
+                )
+            
             return consultation_state
             
         except Exception as e:
@@ -308,14 +346,14 @@ class NutritionistAgent(BaseAgent):
             user_data = consultation_state.get('user_data', {})
             conversation_history = consultation_state.get('conversation_history', [])
             
-            # 2. LLM calcula TMB e necessidades nutricionais baseado no contexto
-            nutritional_calculations = self._llm_calculate_nutritional_needs(user_data, conversation_history)
+            # 2. Calcular TMB e necessidades nutricionais de forma determinística a partir do perfil
+            nutritional_calculations = self._calculate_nutritional_needs(user_data)
             
             # Separar dados antropométricos dos cálculos
             anthropometric_data = nutritional_calculations.get('anthropometric_data', {})
             tmb_calculations = {k: v for k, v in nutritional_calculations.items() if k != 'anthropometric_data'}
             
-            logger.info(f"📊 LLM calculou TMB: {tmb_calculations.get('tmb_kcal')} kcal | Meta diária: {tmb_calculations.get('daily_target_kcal')} kcal")
+            logger.info(f"📊 TMB calculada: {tmb_calculations.get('tmb_kcal')} kcal | Meta diária: {tmb_calculations.get('daily_target_kcal')} kcal")
             
             # 3. Extrair preferências alimentares do usuário
             user_food_preferences = self._extract_food_preferences_from_conversation(conversation_history)
@@ -368,7 +406,7 @@ class NutritionistAgent(BaseAgent):
             {self.config.system_prompt}
             
             CONTEXTO ATUAL:
-            {json.dumps(context_data, indent=2, ensure_ascii=False)}
+            {json_codec.dumps(context_data, indent=True)}
             
             Comando: food_selection_handler
             """
@@ -376,23 +414,13 @@ class NutritionistAgent(BaseAgent):
             # Invocar LLM
             response = self.llm.invoke([SystemMessage(content=selection_prompt)])
             
-            # Parsear resposta
-            try:
-                selected_foods = json.loads(response.content.strip())
-                if isinstance(selected_foods, list):
-                    logger.info(f"✅ LLM selecionou {len(selected_foods)} alimentos")
-                    return selected_foods
-                else:
-                    raise ValueError("Resposta não é uma lista")
-            except (json.JSONDecodeError, ValueError):
-                # Tentar extrair JSON do texto
-                content = response.content.strip()
-                if content.startswith('```json'):
-                    content = content[7:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                selected_foods = json.loads(content.strip())
-                return selected_foods
+            # Parsear resposta (extração, correção e validação locais)
+            selected_foods = parse_llm_json(response.content, FOOD_SELECTION_SCHEMA)
+            
+            # Remover grafias repetidas do mesmo alimento (ex.: "arroz cozido" e "cooked white rice")
+            selected_foods = list(get_food_name_resolver().unique(selected_foods).values())
+            logger.info(f"✅ LLM selecionou {len(selected_foods)} alimentos")
+            return selected_foods
                 
         except Exception as e:
             logger.error(f"Erro na seleção de alimentos pela LLM: {e}")
@@ -405,40 +433,21 @@ class NutritionistAgent(BaseAgent):
             logger.info(f"🔍 Buscando dados nutricionais para {len(selected_foods)} alimentos na API USDA...")
             
             nutrition_database = {}
-            successful_searches = 0
-            failed_searches = []
-            
-            for food_name in selected_foods:
-                try:
-                    food_data = self.nutrition_api.search_food(food_name)
-                    if food_data:
-                        nutrition_database[food_name] = {
-                            'name': food_data.name,
-                            'calories_per_100g': food_data.calories_per_100g,
-                            'protein_g': food_data.protein_g,
-                            'carbs_g': food_data.carbs_g,
-                            'fat_g': food_data.fat_g,
-                            'fiber_g': food_data.fiber_g,
-                            'sodium_mg': food_data.sodium_mg,
-                            'sugar_g': food_data.sugar_g,
-                            'saturated_fat_g': food_data.saturated_fat_g,
-                            'source': food_data.source,
-                            'description': food_data.description
-                        }
-                        successful_searches += 1
-                        logger.info(f"✅ {food_name}: {food_data.calories_per_100g} kcal/100g")
-                    else:
-                        failed_searches.append(food_name)
-                        logger.warning(f"❌ Dados não encontrados: {food_name}")
-                        
-                except Exception as e:
-                    failed_searches.append(food_name)
-                    logger.error(f"❌ Erro ao buscar {food_name}: {str(e)}")
-            
-            logger.info(f"📊 API USDA: {successful_searches} sucessos, {len(failed_searches)} falhas")
-            
-            if failed_searches:
-                logger.warning(f"Alimentos não encontrados: {failed_searches}")
+            
+            # Busca concorrente em lote (com limite de taxa da chave USDA)
+            batch_result = self.nutrition_api.search_foods_batch(selected_foods)
+            
+            for food_name, food_data in batch_result.foods.items():
+                nutrition_database[food_name] = food_data.to_dict()
+                logger.info(f"✅ {food_name}: {food_data.calories_per_100g} kcal/100g")
+            
+            for food_name, error in batch_result.errors.items():
+                logger.warning(f"❌ {food_name}: {error}")
+            
+            logger.info(f"📊 API USDA: {batch_result.success_count} sucessos, {len(batch_result.errors)} falhas")
+            
+            if batch_result.errors:
+                logger.warning(f"Alimentos não encontrados: {batch_result.failed}")
             
             return nutrition_database
             
@@ -467,6 +476,8 @@ class NutritionistAgent(BaseAgent):
                                 break
                         break
             
+            weekly_menu = self._create_weekly_menu(nutritional_database, tmb_calculations)
+            
             # Estrutura completa da dieta
             diet_structure = {
                 'generated_at': datetime.now().isoformat(),
@@ -493,7 +504,10 @@ class NutritionistAgent(BaseAgent):
                 },
                 
                 # Menu semanal organizado
-                'weekly_menu': self._create_weekly_menu(nutritional_database, tmb_calculations),
+                'weekly_menu': weekly_menu,
+                
+                # Totais por refeição, dia e semana (matriz de nutrientes)
+                'nutrition_totals': compute_menu_totals(weekly_menu, NutrientMatrix.from_records(nutritional_database)),
                 
                 # Dados da API USDA
                 'nutrition_data_source': {
@@ -633,19 +647,9 @@ class NutritionistAgent(BaseAgent):
             # Invocar LLM
             response = self.llm.invoke([SystemMessage(content=extraction_prompt)])
             
-            try:
-                preferences = json.loads(response.content.strip())
-                logger.info(f"Preferências extraídas: {len(preferences.get('liked_foods', []))} alimentos preferidos")
-                return preferences
-            except json.JSONDecodeError:
-                # Tentar extrair JSON do texto
-                content = response.content.strip()
-                if content.startswith('```json'):
-                    content = content[7:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                preferences = json.loads(content.strip())
-                return preferences
+            preferences = parse_llm_json(response.content, FOOD_PREFERENCES_SCHEMA)
+            logger.info(f"Preferências extraídas: {len(preferences.get('liked_foods', []))} alimentos preferidos")
+            return preferences
             
         except Exception as e:
             logger.error(f"Erro ao extrair preferências alimentares: {str(e)}")
@@ -661,14 +665,14 @@ class NutritionistAgent(BaseAgent):
             user_data = consultation_state.get('user_data', {})
             conversation_history = consultation_state.get('conversation_history', [])
             
-            # 2. LLM calcula TMB e necessidades nutricionais baseado no contexto
-            nutritional_calculations = self._llm_calculate_nutritional_needs(user_data, conversation_history)
+            # 2. Calcular TMB e necessidades nutricionais de forma determinística a partir do perfil
+            nutritional_calculations = self._calculate_nutritional_needs(user_data)
             
             # Separar dados antropométricos dos cálculos
             anthropometric_data = nutritional_calculations.get('anthropometric_data', {})
             tmb_calculations = {k: v for k, v in nutritional_calculations.items() if k != 'anthropometric_data'}
             
-            logger.info(f"📊 LLM calculou TMB: {tmb_calculations.get('tmb_kcal')} kcal | Meta diária: {tmb_calculations.get('daily_target_kcal')} kcal")
+            logger.info(f"📊 TMB calculada: {tmb_calculations.get('tmb_kcal')} kcal | Meta diária: {tmb_calculations.get('daily_target_kcal')} kcal")
             
             # 3. Extrair preferências alimentares do usuário
             user_food_preferences = self._extract_food_preferences_from_conversation(conversation_history)
@@ -770,8 +774,12 @@ AÇÃO_DIETA_PRONTA"""
             # Verificar se tem preview da dieta
             diet_preview = consultation_state.get('diet_preview')
             if not diet_preview:
-                # Se não tem preview, criar primeiro
-                diet_preview = self._generate_diet_preview(consultation_state)
+                # Se não tem preview, usar o especulativo ou criar primeiro
+                diet_preview = self.preview_speculation.take(
+                    consultation_state.get('consultation_id'), consultation_state, self._changes_diet_inputs
+                )
+                if diet_preview is None:
+                    diet_preview = self._generate_diet_preview(consultation_state)
                 consultation_state['diet_preview'] = diet_preview
             
             # Converter preview para formato completo de dieta
@@ -874,6 +882,11 @@ AÇÃO_DIETA_PRONTA"""
                 # Menu semanal
                 'weekly_menu': diet_preview['weekly_menu'],
                 
+                # Totais por refeição, dia e semana (matriz de nutrientes)
+                'nutrition_totals': compute_menu_totals(
+                    diet_preview['weekly_menu'], NutrientMatrix.from_records(nutritional_database)
+                ),
+                
                 # Dados da API USDA
                 'nutrition_data_source': {
                     'primary_source': 'USDA FoodData Central API',
@@ -892,55 +905,27 @@ AÇÃO_DIETA_PRONTA"""
             logger.error(f"Erro ao converter preview para dieta completa: {str(e)}")
             raise RuntimeError(f"Falha na conversão da dieta: {str(e)}") from e
 
-    def _llm_calculate_nutritional_needs(self, user_data: Dict[str, Any], conversation_history: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """LLM calcula TMB, calorias e macronutrientes baseado no contexto da conversa"""
+    def _calculate_nutritional_needs(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Calcula TMB, calorias e macronutrientes com as fórmulas da metodologia (sem LLM)"""
         try:
-            # Preparar contexto da conversa
-            conversation_context = "\n".join([
-                f"{msg['role']}: {msg['message']}" 
-                for msg in conversation_history
-            ])
-            
-            # Contexto completo para LLM
-            context_data = {
-                'user_profile': user_data,
-                'conversation_history': conversation_context
-            }
-            
-            # Prompt limpo - apenas contexto
-            calculation_prompt = f"""
-            {self.config.system_prompt}
-            
-            CONTEXTO ATUAL:
-            {json.dumps(context_data, indent=2, ensure_ascii=False)}
-            
-            Comando: nutritional_calculations_handler
-            """
-            
-            # Invocar LLM
-            response = self.llm.invoke([SystemMessage(content=calculation_prompt)])
-            
-            # Parsear resposta
-            try:
-                calculations = json.loads(response.content.strip())
-                logger.info(f"✅ LLM calculou necessidades nutricionais com sucesso")
-                return calculations
-            except (json.JSONDecodeError, ValueError):
-                # Tentar extrair JSON do texto
-                content = response.content.strip()
-                if content.startswith('```json'):
-                    content = content[7:]
-                if content.endswith('```'):
-                    content = content[:-3]
-                calculations = json.loads(content.strip())
-                return calculations
-                
+            calculations = calculate_from_user_data(user_data)
+            logger.info(f"✅ Necessidades nutricionais calculadas com sucesso")
+            return calculations
+
         except Exception as e:
-            logger.error(f"Erro nos cálculos nutricionais pela LLM: {e}")
+            logger.error(f"Erro nos cálculos nutricionais: {e}")
             # SEM FALLBACK - propagar erro
             raise RuntimeError(f"Falha nos cálculos nutricionais: {str(e)}") from e
 
-    
+    def _changes_diet_inputs(self, message: str) -> bool:
+        """Mensagem com informação para a dieta (keyword_groups do YAML); confirmações não alteram o preview"""
+        return any(group in self.config.keyword_groups for group in self.keyword_matcher.scan(message))
+
+    def discard_speculative_preview(self, consultation_state: Optional[Dict[str, Any]]) -> bool:
+        """Cancela o preview especulativo de uma consulta encerrada ou resetada"""
+        if not consultation_state:
+            return False
+        return self.preview_speculation.discard(consultation_state.get('consultation_id'))
 
     def generate_diet_pdf_data(self, diet_json: Dict[str, Any]) -> Dict[str, Any]:
         """Prepara dados estruturados para geração de PDF"""
@@ -175,6 +175,7 @@ class ConfigLoader:
                 personality_traits=config_data.get('personality_traits', {}),
                 contexts=config_data.get('contexts', {}),
                 task_keywords=config_data.get('task_keywords', {}),
+                keyword_groups=config_data.get('keyword_groups', {}),
                 context_mapping=config_data.get('context_mapping', {}),
                 confidence_scores=config_data.get('confidence_scores', {}),
                 error_responses=config_data.get('error_responses', {})
@@ -14,6 +14,8 @@ from langchain_openai import ChatOpenAI
 import os
 from dotenv import load_dotenv
 
+from utils.keyword_matcher import KeywordMatcher
+
 # Load environment variables
 load_dotenv()
 
@@ -109,6 +111,7 @@ class AgentConfig:
     personality_traits: Dict[str, Any] = field(default_factory=dict)
     contexts: Dict[str, str] = field(default_factory=dict)
     task_keywords: Dict[str, List[str]] = field(default_factory=dict)
+    keyword_groups: Dict[str, List[str]] = field(default_factory=dict)
     context_mapping: Dict[str, List[str]] = field(default_factory=dict)
     confidence_scores: Dict[str, float] = field(default_factory=dict)
     error_responses: Dict[str, str] = field(default_factory=dict)
@@ -130,6 +133,7 @@ class AgentConfig:
             'personality_traits': self.personality_traits,
             'contexts': self.contexts,
             'task_keywords': self.task_keywords,
+            'keyword_groups': self.keyword_groups,
             'context_mapping': self.context_mapping,
             'confidence_scores': self.confidence_scores,
             'error_responses': self.error_responses
@@ -187,6 +191,9 @@ class BaseAgent(ABC):
                 max_tokens=config.max_tokens
             )
             
+        # Casador compilado com todas as palavras-chave do YAML (tarefas e grupos auxiliares)
+        self.keyword_matcher = KeywordMatcher({**config.task_keywords, **config.keyword_groups})
+            
         self.graph = None
         self._build_graph()
     
@@ -4,7 +4,11 @@ Contém todas as funcionalidades relacionadas ao banco de dados SQLite
 """
 
 from .models import Database
+from .connection import ConnectionManager, get_connection_manager
+from .migrations import run_migrations, get_schema_version
+from .chat_writer import ChatMessageWriter, get_chat_writer
+from .password_hasher import PasswordHasher, get_password_hasher
 from .schemas import UserSchema, ProfileSchema, ChatSchema, ValidationError
 from .config import *
 
-__all__ = ['Database', 'UserSchema', 'ProfileSchema', 'ChatSchema', 'ValidationError']
+__all__ = ['Database', 'ConnectionManager', 'get_connection_manager', 'run_migrations', 'get_schema_version', 'ChatMessageWriter', 'get_chat_writer', 'PasswordHasher', 'get_password_hasher', 'UserSchema', 'ProfileSchema', 'ChatSchema', 'ValidationError']
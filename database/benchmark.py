@@ -0,0 +1,262 @@
+"""
+Benchmark das operações de banco mais frequentes (login, perfil, chat e dieta)
+Compara a latência por operação abrindo uma conexão por chamada (pool_size=0) e com o pool,
+a vazão de escritas concorrentes entre os perfis de PRAGMAs 'legacy' e 'tuned', e a vazão de
+logins (bcrypt na thread da requisição vs pool de threads) com a latência do chat em paralelo
+
+Uso:
+    python -m database.benchmark [--iterations 500] [--pool-size 5]
+    python -m database.benchmark --write-load [--threads 8] [--writes 200]
+    python -m database.benchmark --login-load [--threads 8] [--logins 16]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import sqlite3
+import threading
+import statistics
+from typing import Callable, Dict, List
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from database.config import DB_PROFILES
+from database.connection import get_connection_manager
+from database.models import Database
+from database.password_hasher import PasswordHasher
+from utils.diet_manager.diet_storage import DietManager
+
+PROFILE = {
+    'name': 'Benchmark', 'age': 30, 'gender': 'feminino', 'weight': 65.0, 'height': 168.0,
+    'primary_goal': 'manutencao_peso', 'activity_level': 'moderado'
+}
+
+
+def _measure(operation: Callable[[], None], iterations: int) -> Dict[str, float]:
+    """Latências (ms) de uma operação repetida"""
+    samples: List[float] = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': samples[len(samples) // 2],
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    }
+
+
+def run_benchmark(db_path: str, pool_size: int, iterations: int) -> Dict[str, Dict[str, float]]:
+    """Executa as operações com o pool configurado para pool_size conexões ociosas"""
+    manager = get_connection_manager(db_path)
+    manager.close_all()
+    manager.pool_size = pool_size
+
+    database = Database(db_path)
+    diets = DietManager(db_path)
+
+    user_id, _ = database.create_user(f'bench-{pool_size}@example.com', 'senha-benchmark')
+    database.create_user_profile(user_id, PROFILE)
+    session_id, _ = database.create_chat_session(user_id)
+    diets.save_diet(user_id, {'weekly_menu': {}, 'nutritional_database': {}})
+
+    # Autenticação sem o bcrypt, que dominaria a medição: só a consulta ao banco
+    def login_lookup():
+        with manager.connection() as conn:
+            conn.execute('SELECT id, password_hash FROM users WHERE email = ?',
+                         (f'bench-{pool_size}@example.com',)).fetchone()
+
+    return {
+        'login_lookup': _measure(login_lookup, iterations),
+        'get_user_profile': _measure(lambda: database.get_user_profile(user_id), iterations),
+        'save_chat_message': _measure(lambda: database.save_chat_message(session_id, 'user', 'Olá!'), iterations),
+        'get_chat_history': _measure(lambda: database.get_chat_history(session_id), iterations),
+        'get_user_diet': _measure(lambda: diets.get_user_diet(user_id), iterations),
+    }
+
+
+def run_write_load(db_path: str, profile_name: str, threads: int, writes: int) -> Dict[str, float]:
+    """Teste de carga: threads gravando mensagens de chat ao mesmo tempo em que outras leem o histórico"""
+    manager = get_connection_manager(db_path)
+    manager.close_all()
+    manager.profile = dict(DB_PROFILES[profile_name])
+    manager.pool_size = threads
+
+    database = Database(db_path)
+    user_id, _ = database.create_user(f'load-{profile_name}@example.com', 'senha-benchmark')
+    session_id, _ = database.create_chat_session(user_id)
+
+    counters = {'written': 0, 'locked': 0}
+    counters_lock = threading.Lock()
+    start_barrier = threading.Barrier(threads + 1)
+
+    def writer():
+        start_barrier.wait()
+        for _ in range(writes):
+            try:
+                with manager.transaction() as conn:
+                    conn.execute(
+                        'INSERT INTO chat_messages (id, session_id, message_type, content) VALUES (?, ?, ?, ?)',
+                        (os.urandom(16).hex(), session_id, 'user', 'Mensagem de carga')
+                    )
+                    # Leitura dentro da mesma requisição, como no fluxo do chat
+                    conn.execute('SELECT COUNT(*) FROM chat_messages WHERE session_id = ?', (session_id,)).fetchone()
+                outcome = 'written'
+            except sqlite3.OperationalError:
+                # "database is locked": a escrita foi perdida
+                outcome = 'locked'
+            with counters_lock:
+                counters[outcome] += 1
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    manager.close_all()
+
+    return {
+        'written': counters['written'],
+        'locked': counters['locked'],
+        'seconds': elapsed,
+        'writes_per_second': counters['written'] / elapsed if elapsed else 0.0
+    }
+
+
+def main_write_load(threads: int, writes: int):
+    """Imprime a vazão de escritas concorrentes com os perfis 'legacy' e 'tuned'"""
+    workdir = tempfile.mkdtemp(prefix='shapemate-load-')
+    try:
+        # Arquivos separados: o journal_mode WAL persiste no arquivo do banco
+        results = {
+            name: run_write_load(os.path.join(workdir, f'{name}.db'), name, threads, writes)
+            for name in ('legacy', 'tuned')
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"📊 Escritas concorrentes: {threads} threads x {writes} mensagens")
+    print(f"{'PERFIL':<8} {'GRAVADAS':>9} {'BLOQUEADAS':>11} {'TEMPO':>8} {'ESCRITAS/S':>11}")
+    for name, result in results.items():
+        print(f"{name:<8} {result['written']:>9} {result['locked']:>11} "
+              f"{result['seconds']:>7.2f}s {result['writes_per_second']:>11.0f}")
+    legacy, tuned = results['legacy']['writes_per_second'], results['tuned']['writes_per_second']
+    if legacy:
+        print(f"🚀 Ganho de vazão: {tuned / legacy:.1f}x")
+
+
+def run_login_load(db_path: str, executor: str, threads: int, logins: int) -> Dict[str, float]:
+    """Rajada de logins concorrentes enquanto uma thread de chat mede a latência das leituras"""
+    hasher = PasswordHasher(executor=executor)
+    database = Database(db_path)
+    database.password_hasher = hasher
+
+    user_id, _ = database.create_user(f'login-{executor}@example.com', 'senha-benchmark')
+    session_id, _ = database.create_chat_session(user_id)
+    database.save_chat_message(session_id, 'user', 'Olá!')
+
+    done = threading.Event()
+    chat_samples: List[float] = []
+
+    def chat_traffic():
+        while not done.is_set():
+            started = time.perf_counter()
+            database.get_chat_history_page(session_id, 20)
+            chat_samples.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.005)
+
+    def login_burst():
+        for _ in range(logins):
+            assert database.authenticate_user(f'login-{executor}@example.com', 'senha-benchmark') == user_id
+
+    chat = threading.Thread(target=chat_traffic)
+    chat.start()
+    workers = [threading.Thread(target=login_burst) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    chat.join()
+    hasher.shutdown()
+
+    chat_samples.sort()
+    return {
+        'logins_per_second': threads * logins / elapsed,
+        'chat_p50_ms': chat_samples[len(chat_samples) // 2] if chat_samples else 0.0,
+        'chat_p99_ms': chat_samples[min(len(chat_samples) - 1, int(len(chat_samples) * 0.99))] if chat_samples else 0.0
+    }
+
+
+def main_login_load(threads: int, logins: int):
+    """Imprime a vazão de logins e a latência do chat com o bcrypt inline e no pool de threads"""
+    workdir = tempfile.mkdtemp(prefix='shapemate-login-')
+    try:
+        db_path = os.path.join(workdir, 'login.db')
+        results = {executor: run_login_load(db_path, executor, threads, logins)
+                   for executor in ('inline', 'thread')}
+    finally:
+        get_connection_manager(os.path.join(workdir, 'login.db')).close_all()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"📊 Logins concorrentes: {threads} threads x {logins} logins "
+          f"(custo bcrypt {os.getenv('BCRYPT_ROUNDS', '12')}, {os.cpu_count()} CPUs)")
+    print(f"{'BCRYPT':<8} {'LOGINS/S':>9} {'CHAT p50':>10} {'CHAT p99':>10}")
+    for executor, result in results.items():
+        print(f"{executor:<8} {result['logins_per_second']:>9.1f} "
+              f"{result['chat_p50_ms']:>8.2f}ms {result['chat_p99_ms']:>8.2f}ms")
+
+
+def main(argv: List[str] = None):
+    """Linha de comando: imprime a latência por operação antes e depois do pool"""
+    parser = argparse.ArgumentParser(description='Benchmark de conexões SQLite do ShapeMateAI')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--pool-size', type=int, default=int(os.getenv('DB_POOL_SIZE', '5')))
+    parser.add_argument('--write-load', action='store_true', help='teste de carga de escritas concorrentes')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=200, help='escritas por thread')
+    parser.add_argument('--login-load', action='store_true', help='teste de carga de logins (bcrypt)')
+    parser.add_argument('--logins', type=int, default=16, help='logins por thread')
+    args = parser.parse_args(argv)
+
+    if args.write_load:
+        main_write_load(args.threads, args.writes)
+        return
+    if args.login_load:
+        main_login_load(args.threads, args.logins)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='shapemate-bench-')
+    try:
+        db_path = os.path.join(workdir, 'benchmark.db')
+        before = run_benchmark(db_path, 0, args.iterations)
+        after = run_benchmark(db_path, args.pool_size, args.iterations)
+        stats = get_connection_manager(db_path).get_stats()
+        get_connection_manager(db_path).close_all()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"📊 Latência por operação ({args.iterations} iterações): conexão por chamada vs pool ({args.pool_size})")
+    print(f"{'OPERAÇÃO':<20} {'ANTES p50':>10} {'DEPOIS p50':>11} {'ANTES p95':>10} {'DEPOIS p95':>11} {'GANHO':>7}")
+    for operation, old in before.items():
+        new = after[operation]
+        speedup = old['mean_ms'] / new['mean_ms'] if new['mean_ms'] else 0.0
+        print(f"{operation:<20} {old['p50_ms']:>8.3f}ms {new['p50_ms']:>9.3f}ms "
+              f"{old['p95_ms']:>8.3f}ms {new['p95_ms']:>9.3f}ms {speedup:>6.1f}x")
+    print(f"🔌 Conexões: {stats['opened']} abertas, {stats['reused']} reaproveitadas")
+
+
+if __name__ == '__main__':
+    main()
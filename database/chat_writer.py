@@ -0,0 +1,240 @@
+"""
+Gravação em segundo plano das mensagens de chat (group commit)
+As mensagens de várias requisições entram em uma fila e uma única thread as grava em lote,
+junto com a atualização de last_activity das sessões, em uma transação a cada poucos milissegundos.
+
+Modos (CHAT_WRITER_MODE):
+    group - a requisição aguarda o commit do lote que contém sua mensagem (durável ao retornar)
+    async - a requisição retorna após enfileirar; o lote é gravado em milissegundos e o que
+            restar na fila é gravado no encerramento do processo
+    off   - gravação síncrona, uma transação por mensagem
+"""
+
+import os
+import time
+import queue
+import uuid
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .connection import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITER_MODES = ('group', 'async', 'off')
+
+# Marcador de encerramento da thread de gravação
+_STOP = object()
+
+# (message_id, session_id, message_type, content, timestamp, future)
+PendingMessage = Tuple[str, str, str, str, str, Future]
+
+
+def chat_writer_mode() -> str:
+    """Modo configurado em CHAT_WRITER_MODE ('group' por padrão)"""
+    mode = os.getenv('CHAT_WRITER_MODE', 'group').lower()
+    return mode if mode in CHAT_WRITER_MODES else 'group'
+
+
+def _utc_timestamp() -> str:
+    """Mesmo formato do CURRENT_TIMESTAMP do SQLite, capturado no momento do envio"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ChatMessageWriter:
+    """Fila de gravação das mensagens de chat com commit em grupo"""
+
+    def __init__(self, pool: ConnectionManager, flush_interval_ms: float = None,
+                 max_batch: int = None, max_queue: int = None):
+        self.pool = pool
+        # Janela de agrupamento: no modo group o lote se forma enquanto o commit anterior acontece,
+        # então esperar só acrescentaria latência às requisições
+        default_interval = '5' if chat_writer_mode() == 'async' else '0'
+        self.flush_interval = (flush_interval_ms if flush_interval_ms is not None
+                               else float(os.getenv('CHAT_WRITER_FLUSH_MS', default_interval))) / 1000
+        self.max_batch = max_batch or int(os.getenv('CHAT_WRITER_MAX_BATCH', '256'))
+        # Fila limitada: com o disco lento, as requisições aguardam em vez de acumular memória
+        self._queue: queue.Queue = queue.Queue(
+            maxsize=max_queue if max_queue is not None else int(os.getenv('CHAT_WRITER_MAX_QUEUE', '10000'))
+        )
+
+        # _submit_lock ordena os envios (pode aguardar a fila cheia); _lock protege só as métricas
+        self._submit_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._last_future: Optional[Future] = None
+        self._metrics: Dict[str, Any] = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_queue_depth': 0,
+            'largest_batch': 0,
+            'last_flush_ms': 0.0
+        }
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+            self._thread.start()
+            # Grava o que estiver na fila ao encerrar o processo
+            atexit.register(self.close)
+
+    def submit(self, session_id: str, message_type: str, content: str) -> Tuple[str, Future]:
+        """Enfileira a mensagem; o Future é concluído quando o lote for gravado"""
+        message_id = str(uuid.uuid4())
+        future: Future = Future()
+
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError("Gravador de mensagens encerrado")
+            self._ensure_started()
+            self._last_future = future
+            # Dentro do lock: a ordem da fila é a mesma de _last_future
+            self._queue.put((message_id, session_id, message_type, content, _utc_timestamp(), future))
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._metrics['enqueued'] += 1
+            if depth > self._metrics['max_queue_depth']:
+                self._metrics['max_queue_depth'] = depth
+
+        return message_id, future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a gravação de tudo o que já foi enfileirado"""
+        with self._submit_lock:
+            last = self._last_future
+        if last is None:
+            return True
+        try:
+            last.result(timeout)
+        except Exception:
+            # O erro já foi entregue a quem enviou a mensagem; aqui interessa só a conclusão
+            pass
+        return last.done()
+
+    def close(self, timeout: Optional[float] = 30):
+        """Grava as mensagens pendentes e encerra a thread (chamado também no atexit)"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join(timeout)
+            logger.info(f"💾 Gravador de mensagens encerrado: {self._metrics['written']} mensagens gravadas")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Profundidade da fila e contadores de lotes"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['queue_depth'] = self._queue.qsize()
+        metrics['avg_batch_size'] = round(metrics['written'] / metrics['batches'], 2) if metrics['batches'] else 0.0
+        metrics['mode'] = chat_writer_mode()
+        return metrics
+
+    def _run(self):
+        """Junta as mensagens que chegam dentro da janela de flush e grava cada lote em uma transação"""
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+
+            batch: List[PendingMessage] = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._write(batch)
+
+        # Encerramento: nada enfileirado antes do close() fica sem gravar
+        leftovers: List[PendingMessage] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        for start in range(0, len(leftovers), self.max_batch):
+            self._write(leftovers[start:start + self.max_batch])
+
+    def _write(self, batch: List[PendingMessage]):
+        """Grava o lote; se a transação falhar, regrava uma a uma para isolar a mensagem inválida"""
+        started = time.perf_counter()
+        try:
+            self._insert(batch)
+            failed = 0
+            for item in batch:
+                item[5].set_result(item[0])
+        except Exception as e:
+            logger.warning(f"Lote de {len(batch)} mensagens falhou ({e}); gravando individualmente")
+            failed = 0
+            for item in batch:
+                try:
+                    self._insert([item])
+                    item[5].set_result(item[0])
+                except Exception as item_error:
+                    failed += 1
+                    logger.error(f"❌ Erro ao gravar mensagem {item[0]}: {item_error}")
+                    item[5].set_exception(item_error)
+
+        with self._lock:
+            self._metrics['batches'] += 1
+            self._metrics['written'] += len(batch) - failed
+            self._metrics['failed'] += failed
+            self._metrics['largest_batch'] = max(self._metrics['largest_batch'], len(batch))
+            self._metrics['last_flush_ms'] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _insert(self, batch: List[PendingMessage]):
+        """Mensagens e última atividade de cada sessão em uma única transação"""
+        last_activity: Dict[str, str] = {}
+        for _, session_id, _, _, timestamp, _ in batch:
+            last_activity[session_id] = max(timestamp, last_activity.get(session_id, ''))
+
+        with self.pool.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO chat_messages (id, session_id, message_type, content, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [item[:5] for item in batch])
+            conn.executemany('''
+                UPDATE chat_sessions
+                SET last_activity = ?
+                WHERE id = ?
+            ''', [(timestamp, session_id) for session_id, timestamp in last_activity.items()])
+
+
+_writers: Dict[str, ChatMessageWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_chat_writer(pool: ConnectionManager) -> ChatMessageWriter:
+    """Gravador compartilhado para o arquivo de banco do pool"""
+    key = os.path.abspath(pool.db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.closed:
+            writer = ChatMessageWriter(pool)
+            _writers[key] = writer
+        return writer
@@ -10,6 +10,37 @@ DB_NAME = "shapemate.db"
 DB_DIR = "database"
 DB_PATH = os.path.join(DB_DIR, DB_NAME)
 
+# Perfis de execução do SQLite (PRAGMAs aplicados em cada nova conexão)
+DB_PROFILES = {
+    # WAL: leitores não bloqueiam o escritor; escritas concorrentes aguardam o busy_timeout
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,           # ms
+        'foreign_keys': 'ON',
+        'mmap_size': 64 * 1024 * 1024,  # bytes
+        'cache_size': -16000,           # negativo = KiB (~16 MB)
+    },
+    # Comportamento anterior: padrões do SQLite (journal de rollback) e espera de 5s do módulo sqlite3
+    'legacy': {
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'busy_timeout': 5000,
+        'foreign_keys': 'OFF',
+        'mmap_size': 0,
+        'cache_size': -2000,
+    },
+}
+
+DB_PROFILE_NAME = os.getenv('DB_PROFILE', 'tuned')
+DB_PROFILE = dict(DB_PROFILES.get(DB_PROFILE_NAME, DB_PROFILES['tuned']))
+
+# Ajustes individuais por variável de ambiente (ex.: DB_BUSY_TIMEOUT=10000)
+for _pragma in DB_PROFILE:
+    _override = os.getenv(f'DB_{_pragma.upper()}')
+    if _override is not None:
+        DB_PROFILE[_pragma] = int(_override) if _override.lstrip('-').isdigit() else _override
+
 # Configurações de backup
 BACKUP_DIR = os.path.join(DB_DIR, "backups")
 BACKUP_ENABLED = True
@@ -23,6 +54,13 @@ SESSION_TIMEOUT_HOURS = 24
 MAX_TEXT_LENGTH = 500
 MAX_MESSAGE_LENGTH = 2000
 
+# Paginação do histórico de chat e da lista de sessões
+CHAT_PAGE_SIZE = 50
+CHAT_MAX_PAGE_SIZE = 200
+
+# Itens aceitos por requisição na atualização do estoque em lote
+INVENTORY_BULK_MAX_ITEMS = 500
+
 # Mapeamentos para exibição
 GENDER_DISPLAY = {
     'masculino': 'Masculino',
@@ -0,0 +1,141 @@
+"""
+Gerenciador de conexões SQLite do ShapeMateAI
+Mantém um pequeno pool de conexões reutilizáveis por arquivo de banco, compartilhado por
+Database, DietManager e AdminTools, preservando o cache de statements de cada conexão.
+Cada nova conexão recebe os PRAGMAs do perfil configurado em database/config.py (DB_PROFILE)
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from .config import DB_PROFILE
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """
+    Pool de conexões SQLite para um arquivo de banco
+    Conexões ociosas (até pool_size) são reaproveitadas entre requisições e threads;
+    pool_size 0 reproduz o comportamento de abrir e fechar uma conexão por operação
+    """
+
+    def __init__(self, db_path: str, pool_size: int = None, profile: Dict[str, Any] = None):
+        self.db_path = db_path
+        self.pool_size = pool_size if pool_size is not None else int(os.getenv('DB_POOL_SIZE', '5'))
+        self.profile = dict(profile if profile is not None else DB_PROFILE)
+
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+
+    def _open(self) -> sqlite3.Connection:
+        """Abre uma nova conexão (utilizável por qualquer thread, uma de cada vez)"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # O busy_timeout do perfil substitui a espera padrão de 5s do módulo sqlite3
+        busy_timeout_ms = self.profile.get('busy_timeout', 5000)
+        conn = sqlite3.connect(self.db_path, timeout=busy_timeout_ms / 1000, check_same_thread=False)
+        apply_profile(conn, self.profile)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Retira uma conexão do pool (ou abre uma nova); devolva com release()"""
+        with self._lock:
+            if self._idle:
+                self.reused += 1
+                return self._idle.pop()
+        return self._open()
+
+    def release(self, conn: sqlite3.Connection):
+        """Devolve a conexão ao pool, desfazendo qualquer transação deixada aberta"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # Conexão inutilizável: descartar
+            self._close_quietly(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Conexão emprestada do pool durante o bloco (leituras ou transações manuais)"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Bloco transacional: commit ao final, rollback em caso de exceção"""
+        with self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close_all(self):
+        """Fecha as conexões ociosas do pool"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Conexões abertas, reaproveitadas e ociosas"""
+        with self._lock:
+            return {
+                'pool_size': self.pool_size,
+                'opened': self.opened,
+                'reused': self.reused,
+                'idle': len(self._idle)
+            }
+
+    @staticmethod
+    def _close_quietly(conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def apply_profile(conn: sqlite3.Connection, profile: Dict[str, Any]):
+    """Aplica os PRAGMAs do perfil à conexão"""
+    for pragma, value in profile.items():
+        try:
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        except sqlite3.Error as e:
+            logger.warning(f"PRAGMA {pragma}={value} não aplicado em {conn}: {e}")
+
+
+_managers: Dict[str, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_connection_manager(db_path: str) -> ConnectionManager:
+    """Gerenciador compartilhado para o arquivo de banco (um por caminho absoluto)"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path)
+            _managers[key] = manager
+        return manager
@@ -0,0 +1,261 @@
+"""
+Migrações versionadas do esquema do ShapeMateAI
+Cada migração é aplicada uma única vez, em ordem, dentro de uma transação, e registrada na
+tabela schema_version. Database e DietManager executam o mesmo runner ao inicializar
+
+Uso:
+    python -m database.migrations [caminho_do_banco]
+"""
+
+import os
+import sys
+import logging
+import threading
+from typing import List, Set, Tuple
+
+from .connection import ConnectionManager, get_connection_manager
+
+logger = logging.getLogger(__name__)
+
+# (versão, descrição, comandos SQL)
+Migration = Tuple[int, str, List[str]]
+
+MIGRATIONS: List[Migration] = [
+    (1, 'Tabelas de usuários, perfis e chat', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            gender TEXT NOT NULL,
+            weight REAL NOT NULL,
+            height REAL NOT NULL,
+            primary_goal TEXT NOT NULL,
+            activity_level TEXT NOT NULL,
+            dietary_restrictions TEXT,
+            health_conditions TEXT,
+            other_notes TEXT,
+            profile_completed BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            session_name TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            message_type TEXT NOT NULL, -- 'user' ou 'assistant'
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
+        )
+        ''',
+    ]),
+    (2, 'Tabelas de dietas, listas de compras e estoque', [
+        '''
+        CREATE TABLE IF NOT EXISTS user_diets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            diet_name VARCHAR(200),
+            diet_data TEXT NOT NULL,
+            source VARCHAR(50) DEFAULT 'nutritionist',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS shopping_lists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            diet_id INTEGER,
+            list_name VARCHAR(200),
+            items TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_completed BOOLEAN DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (diet_id) REFERENCES user_diets (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS home_inventory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            item_name VARCHAR(200) NOT NULL,
+            quantity VARCHAR(50),
+            unit VARCHAR(20),
+            category VARCHAR(100),
+            expiration_date DATE,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+    ]),
+    (3, 'Índices de chat e perfil', [
+        # get_chat_history: WHERE session_id = ? ORDER BY timestamp
+        'CREATE INDEX IF NOT EXISTS idx_chat_messages_session_timestamp '
+        'ON chat_messages (session_id, timestamp)',
+        # get_user_sessions: WHERE user_id = ? ORDER BY last_activity DESC
+        'CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_activity '
+        'ON chat_sessions (user_id, last_activity DESC)',
+        # get_user_profile: JOIN user_profiles ON user_id
+        'CREATE INDEX IF NOT EXISTS idx_user_profiles_user '
+        'ON user_profiles (user_id)',
+    ]),
+    (4, 'Índices de dietas, listas de compras e estoque (estoque sem itens duplicados)', [
+        # get_user_diet / get_user_diet_list: WHERE user_id = ? [AND is_active = 1] ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_user_diets_user_active '
+        'ON user_diets (user_id, is_active, created_at DESC)',
+        # get_shopping_lists: WHERE user_id = ? ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_shopping_lists_user_created '
+        'ON shopping_lists (user_id, created_at DESC)',
+        # Duplicatas antigas de (user_id, item_name): mantém a atualizada por último
+        '''
+        DELETE FROM home_inventory WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, item_name ORDER BY updated_at DESC, id DESC
+                ) AS position
+                FROM home_inventory
+            ) WHERE position > 1
+        )
+        ''',
+        # update_inventory_item: WHERE user_id = ? AND item_name = ?
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_home_inventory_user_item '
+        'ON home_inventory (user_id, item_name)',
+    ]),
+    (5, 'Índice de sessões para paginação por (last_activity, id)', [
+        # get_user_sessions: WHERE user_id = ? ORDER BY last_activity DESC (e desempate por id)
+        'CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_activity_id '
+        'ON chat_sessions (user_id, last_activity DESC, id DESC)',
+        'DROP INDEX IF EXISTS idx_chat_sessions_user_activity',
+    ]),
+    (6, 'Colunas de resumo das dietas (meta calórica, PDF, versão e tamanho)', [
+        'ALTER TABLE user_diets ADD COLUMN daily_target_kcal REAL',
+        'ALTER TABLE user_diets ADD COLUMN pdf_path TEXT',
+        'ALTER TABLE user_diets ADD COLUMN diet_version INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE user_diets ADD COLUMN size INTEGER',
+        # Dietas existentes: resumo extraído do JSON uma única vez
+        '''
+        UPDATE user_diets SET
+            daily_target_kcal = CASE WHEN json_valid(diet_data) THEN COALESCE(
+                json_extract(diet_data, '$.nutritional_calculations.daily_target_kcal'),
+                json_extract(diet_data, '$.nutrition_plan.daily_calories')
+            ) END,
+            pdf_path = CASE WHEN json_valid(diet_data) THEN json_extract(diet_data, '$.pdf_path') END,
+            diet_version = (
+                SELECT COUNT(*) FROM user_diets AS previous
+                WHERE previous.user_id = user_diets.user_id AND previous.id <= user_diets.id
+            ),
+            size = length(CAST(diet_data AS BLOB))
+        ''',
+    ]),
+    (7, 'Índice de sessões para paginação por (created_at, id)', [
+        # get_user_sessions_page: keyset imutável (created_at, id) DESC sem ordenação temporária
+        'CREATE INDEX IF NOT EXISTS idx_chat_sessions_user_created_id '
+        'ON chat_sessions (user_id, created_at DESC, id DESC)',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Bancos já migrados neste processo (evita repetir a verificação a cada instância)
+_migrated: Set[str] = set()
+_migrate_lock = threading.Lock()
+
+
+def _ensure_version_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def get_schema_version(pool: ConnectionManager) -> int:
+    """Maior versão aplicada (0 em um banco novo)"""
+    with pool.connection() as conn:
+        _ensure_version_table(conn)
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+
+def run_migrations(pool: ConnectionManager) -> int:
+    """Aplica as migrações pendentes; retorna quantas foram aplicadas"""
+    key = os.path.abspath(pool.db_path)
+    with _migrate_lock:
+        if key in _migrated:
+            return 0
+
+        applied = 0
+        with pool.connection() as conn:
+            _ensure_version_table(conn)
+            for version, description, statements in MIGRATIONS:
+                # BEGIN IMMEDIATE: outro processo migrando o mesmo banco aguarda a vez
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    done = conn.execute(
+                        'SELECT 1 FROM schema_version WHERE version = ?', (version,)
+                    ).fetchone()
+                    if done:
+                        conn.rollback()
+                        continue
+
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(
+                        'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                        (version, description)
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"❌ Falha na migração {version} ({description}): {e}")
+                    raise
+
+                applied += 1
+                logger.info(f"🗄️ Migração {version} aplicada: {description}")
+
+        _migrated.add(key)
+        return applied
+
+
+def main(argv: List[str] = None):
+    """Linha de comando: aplica as migrações pendentes e mostra a versão do esquema"""
+    argv = sys.argv[1:] if argv is None else argv
+    db_path = argv[0] if argv else os.path.join('database', 'shapemate.db')
+
+    pool = get_connection_manager(db_path)
+    applied = run_migrations(pool)
+    print(f"✅ {applied} migrações aplicadas; esquema na versão {get_schema_version(pool)} "
+          f"(mais recente: {LATEST_VERSION})")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,195 +3,198 @@ Modelos de banco de dados para ShapeMateAI
 Gerencia usuários e perfis conforme especificação do cadastro
 """
 
-import sqlite3
-import bcrypt
 import uuid
 from datetime import datetime
+import logging
 import os
 
+from .connection import get_connection_manager
+from .migrations import run_migrations
+from .chat_writer import chat_writer_mode, get_chat_writer
+from .pagination import encode_cursor
+from .password_hasher import get_password_hasher
+
+logger = logging.getLogger(__name__)
+
 
 class Database:
     def __init__(self, db_path="database/shapemate.db"):
         self.db_path = db_path
         # Garante que o diretório existe
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # Conexões reaproveitadas (compartilhadas com DietManager e AdminTools)
+        self.pool = get_connection_manager(self.db_path)
         self.init_database()
+        # bcrypt em um pool de workers, fora da thread da requisição
+        self.password_hasher = get_password_hasher()
+        # Mensagens de chat gravadas em lote por uma thread (None = gravação síncrona)
+        self.chat_writer_mode = chat_writer_mode()
+        self.chat_writer = get_chat_writer(self.pool) if self.chat_writer_mode != 'off' else None
     
     def init_database(self):
-        """Inicializa o banco de dados com as tabelas necessárias"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabela de usuários (autenticação)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Tabela de perfis de usuário
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                name TEXT NOT NULL,
-                age INTEGER NOT NULL,
-                gender TEXT NOT NULL,
-                weight REAL NOT NULL,
-                height REAL NOT NULL,
-                primary_goal TEXT NOT NULL,
-                activity_level TEXT NOT NULL,
-                dietary_restrictions TEXT,
-                health_conditions TEXT,
-                other_notes TEXT,
-                profile_completed BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Tabela de sessões de chat (para futuro uso com o nutricionista)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_sessions (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                session_name TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_activity TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Tabela de mensagens do chat
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id TEXT PRIMARY KEY,
-                session_id TEXT NOT NULL,
-                message_type TEXT NOT NULL, -- 'user' ou 'assistant'
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (session_id) REFERENCES chat_sessions (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Inicializa o banco de dados aplicando as migrações pendentes (tabelas e índices)"""
+        run_migrations(self.pool)
     
     def check_email_exists(self, email):
         """Verifica se o email já existe no banco"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id FROM users WHERE email = ?", (email,))
-        result = cursor.fetchone()
-        
-        conn.close()
+        with self.pool.connection() as conn:
+            result = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
         return result is not None
     
     def create_user(self, email, password):
         """Cria um novo usuário e retorna o user_id"""
-        if self.check_email_exists(email):
-            return None, "E-mail já cadastrado"
-        
-        # Gerar hash da senha
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        # Gerar hash da senha (antes de ocupar a conexão)
+        password_hash = self.password_hasher.hash_password(password)
         user_id = str(uuid.uuid4())
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute(
-                "INSERT INTO users (id, email, password_hash) VALUES (?, ?, ?)",
-                (user_id, email, password_hash)
-            )
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                if not self._insert_user(conn.cursor(), user_id, email, password_hash):
+                    return None, "E-mail já cadastrado"
             return user_id, "Usuário criado com sucesso"
         except Exception as e:
-            conn.close()
             return None, f"Erro ao criar usuário: {str(e)}"
     
+    def _insert_user(self, cursor, user_id, email, password_hash):
+        """Insere o usuário; False se o e-mail já existir (conflito na restrição UNIQUE)"""
+        cursor.execute(
+            "INSERT INTO users (id, email, password_hash) VALUES (?, ?, ?) ON CONFLICT (email) DO NOTHING",
+            (user_id, email, password_hash)
+        )
+        return cursor.rowcount == 1
+    
+    def _insert_profile(self, cursor, profile_id, user_id, profile_data):
+        cursor.execute('''
+            INSERT INTO user_profiles 
+            (id, user_id, name, age, gender, weight, height, primary_goal, 
+             activity_level, dietary_restrictions, health_conditions, other_notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            profile_id, user_id, profile_data['name'], profile_data['age'],
+            profile_data['gender'], profile_data['weight'], profile_data['height'],
+            profile_data['primary_goal'], profile_data['activity_level'],
+            profile_data.get('dietary_restrictions', ''),
+            profile_data.get('health_conditions', ''),
+            profile_data.get('other_notes', '')
+        ))
+    
+    def register_user(self, email, password, profile_data):
+        """
+        Cria usuário e perfil em uma única transação
+        Se o perfil falhar, o usuário também é desfeito (sem contas órfãs)
+        """
+        password_hash = self.password_hasher.hash_password(password)
+        user_id = str(uuid.uuid4())
+        
+        try:
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                if not self._insert_user(cursor, user_id, email, password_hash):
+                    return None, "E-mail já cadastrado"
+                
+                self._insert_profile(cursor, str(uuid.uuid4()), user_id, profile_data)
+            return user_id, "Cadastro realizado com sucesso!"
+        except Exception as e:
+            return None, f"Erro ao criar cadastro: {str(e)}"
+    
     def create_user_profile(self, user_id, profile_data):
         """Cria o perfil do usuário"""
         profile_id = str(uuid.uuid4())
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO user_profiles 
-                (id, user_id, name, age, gender, weight, height, primary_goal, 
-                 activity_level, dietary_restrictions, health_conditions, other_notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                profile_id, user_id, profile_data['name'], profile_data['age'],
-                profile_data['gender'], profile_data['weight'], profile_data['height'],
-                profile_data['primary_goal'], profile_data['activity_level'],
-                profile_data.get('dietary_restrictions', ''),
-                profile_data.get('health_conditions', ''),
-                profile_data.get('other_notes', '')
-            ))
-            
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                self._insert_profile(conn.cursor(), profile_id, user_id, profile_data)
             return profile_id, "Perfil criado com sucesso"
         except Exception as e:
-            conn.close()
             return None, f"Erro ao criar perfil: {str(e)}"
     
     def authenticate_user(self, email, password):
         """Autentica um usuário"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, password_hash FROM users WHERE email = ?", (email,))
-        result = cursor.fetchone()
-        
-        conn.close()
+        with self.pool.connection() as conn:
+            result = conn.execute("SELECT id, password_hash FROM users WHERE email = ?", (email,)).fetchone()
         
-        if result and bcrypt.checkpw(password.encode('utf-8'), result[1]):
+        if result and self.password_hasher.verify_password(password, result[1]):
+            self._rehash_if_needed(result[0], password, result[1])
             return result[0]  # Retorna user_id
         return None
     
-    def get_user_profile(self, user_id):
-        """Obtém o perfil completo do usuário"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def _rehash_if_needed(self, user_id, password, password_hash):
+        """Refaz o hash com o custo atual (BCRYPT_ROUNDS) quando o armazenado usa outro custo"""
+        if not self.password_hasher.needs_rehash(password_hash):
+            return
         
-        cursor.execute('''
-            SELECT u.email, p.name, p.age, p.gender, p.weight, p.height,
-                   p.primary_goal, p.activity_level, p.dietary_restrictions,
-                   p.health_conditions, p.other_notes, p.profile_completed
-            FROM users u
-            LEFT JOIN user_profiles p ON u.id = p.user_id
-            WHERE u.id = ?
-        ''', (user_id,))
+        new_hash = self.password_hasher.hash_password(password)
+        try:
+            with self.pool.transaction() as conn:
+                # Só substitui se ninguém trocou a senha nesse meio-tempo
+                conn.execute(
+                    "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?",
+                    (new_hash, user_id, password_hash)
+                )
+            self.password_hasher.record_rehash()
+        except Exception as e:
+            # O login já foi aceito; o rehash fica para a próxima vez
+            logger.warning(f"Erro ao atualizar hash da senha do usuário {user_id}: {e}")
+    
+    def authenticate_with_profile(self, email, password):
+        """
+        Autentica e carrega o perfil com uma única consulta (usuário + perfil)
+        Retorna (user_id, perfil com 'user_id'); (None, None) se as credenciais forem inválidas
+        e (user_id, None) se o usuário não tiver perfil cadastrado
+        """
+        with self.pool.connection() as conn:
+            result = conn.execute('''
+                SELECT u.id, u.password_hash, p.id,
+                       u.email, p.name, p.age, p.gender, p.weight, p.height,
+                       p.primary_goal, p.activity_level, p.dietary_restrictions,
+                       p.health_conditions, p.other_notes, p.profile_completed
+                FROM users u
+                LEFT JOIN user_profiles p ON u.id = p.user_id
+                WHERE u.email = ?
+            ''', (email,)).fetchone()
+        
+        if not result or not self.password_hasher.verify_password(password, result[1]):
+            return None, None
         
-        result = cursor.fetchone()
-        conn.close()
+        self._rehash_if_needed(result[0], password, result[1])
+        if result[2] is None:
+            return result[0], None
+        profile = self._profile_from_row(result[3:])
+        profile['user_id'] = result[0]
+        return result[0], profile
+    
+    @staticmethod
+    def _profile_from_row(row):
+        """Linha (email, campos do perfil...) -> dicionário do perfil"""
+        return {
+            'email': row[0],
+            'name': row[1],
+            'age': row[2],
+            'gender': row[3],
+            'weight': row[4],
+            'height': row[5],
+            'primary_goal': row[6],
+            'activity_level': row[7],
+            'dietary_restrictions': row[8],
+            'health_conditions': row[9],
+            'other_notes': row[10],
+            'profile_completed': row[11]
+        }
+    
+    def get_user_profile(self, user_id):
+        """Obtém o perfil completo do usuário"""
+        with self.pool.connection() as conn:
+            result = conn.execute('''
+                SELECT u.email, p.name, p.age, p.gender, p.weight, p.height,
+                       p.primary_goal, p.activity_level, p.dietary_restrictions,
+                       p.health_conditions, p.other_notes, p.profile_completed
+                FROM users u
+                LEFT JOIN user_profiles p ON u.id = p.user_id
+                WHERE u.id = ?
+            ''', (user_id,)).fetchone()
         
         if result:
-            return {
-                'email': result[0],
-                'name': result[1],
-                'age': result[2],
-                'gender': result[3],
-                'weight': result[4],
-                'height': result[5],
-                'primary_goal': result[6],
-                'activity_level': result[7],
-                'dietary_restrictions': result[8],
-                'health_conditions': result[9],
-                'other_notes': result[10],
-                'profile_completed': result[11]
-            }
+            return self._profile_from_row(result)
         return None
     
     def create_chat_session(self, user_id, session_name=None):
@@ -200,80 +203,177 @@ class Database:
         if not session_name:
             session_name = f"Chat {datetime.now().strftime('%d/%m/%Y %H:%M')}"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO chat_sessions (id, user_id, session_name)
-                VALUES (?, ?, ?)
-            ''', (session_id, user_id, session_name))
-            
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                conn.execute('''
+                    INSERT INTO chat_sessions (id, user_id, session_name)
+                    VALUES (?, ?, ?)
+                ''', (session_id, user_id, session_name))
             return session_id, "Sessão criada com sucesso"
         except Exception as e:
-            conn.close()
             return None, f"Erro ao criar sessão: {str(e)}"
     
     def save_chat_message(self, session_id, message_type, content):
-        """Salva uma mensagem no chat"""
-        message_id = str(uuid.uuid4())
+        """Salva uma mensagem no chat (pela fila de gravação em lote, quando ativa)"""
+        if self.chat_writer is not None and not self.chat_writer.closed:
+            try:
+                message_id, written = self.chat_writer.submit(session_id, message_type, content)
+                if self.chat_writer_mode == 'group':
+                    # Durável ao retornar: aguarda o commit do lote
+                    written.result()
+                return message_id, "Mensagem salva com sucesso"
+            except RuntimeError:
+                # Gravador encerrado durante o desligamento: segue pelo caminho síncrono
+                pass
+            except Exception as e:
+                return None, f"Erro ao salvar mensagem: {str(e)}"
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        message_id = str(uuid.uuid4())
         
         try:
-            cursor.execute('''
-                INSERT INTO chat_messages (id, session_id, message_type, content)
-                VALUES (?, ?, ?, ?)
-            ''', (message_id, session_id, message_type, content))
-            
-            # Atualiza a última atividade da sessão
-            cursor.execute('''
-                UPDATE chat_sessions 
-                SET last_activity = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (session_id,))
-            
-            conn.commit()
-            conn.close()
+            with self.pool.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO chat_messages (id, session_id, message_type, content)
+                    VALUES (?, ?, ?, ?)
+                ''', (message_id, session_id, message_type, content))
+                
+                # Atualiza a última atividade da sessão
+                cursor.execute('''
+                    UPDATE chat_sessions 
+                    SET last_activity = CURRENT_TIMESTAMP 
+                    WHERE id = ?
+                ''', (session_id,))
             return message_id, "Mensagem salva com sucesso"
         except Exception as e:
-            conn.close()
             return None, f"Erro ao salvar mensagem: {str(e)}"
     
     def get_chat_history(self, session_id):
         """Obtém o histórico de mensagens de uma sessão"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT message_type, content, timestamp
-            FROM chat_messages
-            WHERE session_id = ?
-            ORDER BY timestamp ASC
-        ''', (session_id,))
+        if self.chat_writer is not None:
+            # Lê as próprias escritas: mensagens ainda na fila são gravadas antes da consulta
+            self.chat_writer.flush()
         
-        messages = cursor.fetchall()
-        conn.close()
+        with self.pool.connection() as conn:
+            messages = conn.execute('''
+                SELECT message_type, content, timestamp
+                FROM chat_messages
+                WHERE session_id = ?
+                ORDER BY timestamp ASC, rowid ASC
+            ''', (session_id,)).fetchall()
         
         return [{'type': msg[0], 'content': msg[1], 'timestamp': msg[2]} for msg in messages]
     
     def get_user_sessions(self, user_id):
         """Obtém todas as sessões de chat de um usuário"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, session_name, created_at, last_activity, is_active
-            FROM chat_sessions
-            WHERE user_id = ?
-            ORDER BY last_activity DESC
-        ''', (user_id,))
-        
-        sessions = cursor.fetchall()
-        conn.close()
+        with self.pool.connection() as conn:
+            sessions = conn.execute('''
+                SELECT id, session_name, created_at, last_activity, is_active
+                FROM chat_sessions
+                WHERE user_id = ?
+                ORDER BY last_activity DESC
+            ''', (user_id,)).fetchall()
         
         return [{'id': s[0], 'name': s[1], 'created_at': s[2], 
                 'last_activity': s[3], 'is_active': s[4]} for s in sessions]
+    
+    def get_chat_history_page(self, session_id, limit=50, before=None, since=None):
+        """
+        Página do histórico de uma sessão por chave (timestamp, rowid), em ordem cronológica
+        
+        Sem cursores retorna as mensagens mais recentes; before=(timestamp, rowid) pagina para
+        mensagens mais antigas e since=(timestamp, rowid) traz apenas as mais novas (sincronização
+        incremental). O rowid segue a ordem de gravação e desempata mensagens do mesmo segundo
+        """
+        if self.chat_writer is not None:
+            self.chat_writer.flush()
+        
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Uma linha a mais indica se existe outra página
+            if since is not None:
+                cursor.execute('''
+                    SELECT rowid, id, message_type, content, timestamp
+                    FROM chat_messages
+                    WHERE session_id = ? AND (timestamp, rowid) > (?, ?)
+                    ORDER BY timestamp ASC, rowid ASC
+                    LIMIT ?
+                ''', (session_id, since[0], since[1], limit + 1))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+            else:
+                if before is not None:
+                    cursor.execute('''
+                        SELECT rowid, id, message_type, content, timestamp
+                        FROM chat_messages
+                        WHERE session_id = ? AND (timestamp, rowid) < (?, ?)
+                        ORDER BY timestamp DESC, rowid DESC
+                        LIMIT ?
+                    ''', (session_id, before[0], before[1], limit + 1))
+                else:
+                    cursor.execute('''
+                        SELECT rowid, id, message_type, content, timestamp
+                        FROM chat_messages
+                        WHERE session_id = ?
+                        ORDER BY timestamp DESC, rowid DESC
+                        LIMIT ?
+                    ''', (session_id, limit + 1))
+                rows = cursor.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit][::-1]
+        
+        messages = [{'id': row[1], 'type': row[2], 'content': row[3], 'timestamp': row[4]} for row in rows]
+        first, last = (rows[0], rows[-1]) if rows else (None, None)
+        
+        if since is not None:
+            sync_cursor = encode_cursor((last[4], last[0])) if last else encode_cursor(since)
+            before_cursor = None
+        else:
+            sync_cursor = encode_cursor((last[4], last[0])) if last else None
+            before_cursor = encode_cursor((first[4], first[0])) if has_more else None
+        
+        return {
+            'messages': messages,
+            'has_more': has_more,
+            'before_cursor': before_cursor,
+            'sync_cursor': sync_cursor
+        }
+    
+    def get_user_sessions_page(self, user_id, limit=50, before=None):
+        """
+        Página das sessões do usuário por chave (created_at, id), da mais nova para a mais antiga
+        A chave é imutável: sessões que recebem mensagens entre uma página e outra não mudam
+        de posição, então nenhuma é pulada ou repetida
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            if before is not None:
+                cursor.execute('''
+                    SELECT id, session_name, created_at, last_activity, is_active
+                    FROM chat_sessions
+                    WHERE user_id = ? AND (created_at, id) < (?, ?)
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, before[0], before[1], limit + 1))
+            else:
+                cursor.execute('''
+                    SELECT id, session_name, created_at, last_activity, is_active
+                    FROM chat_sessions
+                    WHERE user_id = ?
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (user_id, limit + 1))
+            
+            rows = cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'sessions': [{'id': s[0], 'name': s[1], 'created_at': s[2],
+                          'last_activity': s[3], 'is_active': s[4]} for s in rows],
+            'has_more': has_more,
+            'next_cursor': encode_cursor((rows[-1][2], rows[-1][0])) if has_more else None
+        }
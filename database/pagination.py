@@ -0,0 +1,29 @@
+"""
+Cursores opacos para paginação por chave (keyset)
+O cursor carrega os valores da chave de ordenação do último item entregue; a próxima página
+continua a partir deles pelo índice, sem OFFSET
+"""
+
+import base64
+from typing import Any, Sequence, Tuple
+
+from utils import json_codec
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Valores da chave de ordenação -> cursor opaco (base64 url-safe)"""
+    raw = json_codec.dumps_bytes(list(values))
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """Cursor opaco -> valores da chave; ValueError se o cursor for inválido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json_codec.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"Cursor inválido: {cursor}") from e
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return tuple(values)
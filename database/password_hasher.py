@@ -0,0 +1,155 @@
+"""
+Hash e verificação de senhas (bcrypt) fora da thread da requisição
+O bcrypt consome ~250 ms de CPU por chamada; as chamadas vão para um pool de workers de tamanho
+fixo, com limite de chamadas pendentes, para que uma rajada de logins não paralise o tráfego do chat.
+O bcrypt libera o GIL, então o pool de threads (padrão) já executa os hashes em paralelo.
+O custo (BCRYPT_ROUNDS) é configurável e senhas com custo diferente são refeitas no login
+"""
+
+import os
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Union
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+# thread (padrão) | process | inline (na própria thread da requisição)
+HASHER_EXECUTORS = ('process', 'thread', 'inline')
+
+
+def _as_bytes(value: Union[str, bytes]) -> bytes:
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def hash_rounds(password_hash: Union[str, bytes]) -> Optional[int]:
+    """Custo gravado no hash ($2b$12$... -> 12); None se o formato for desconhecido"""
+    try:
+        return int(_as_bytes(password_hash).split(b'$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Pool de workers para bcrypt com custo configurável"""
+
+    def __init__(self, rounds: int = None, workers: int = None, max_pending: int = None,
+                 executor: str = None):
+        self.rounds = rounds or int(os.getenv('BCRYPT_ROUNDS', '12'))
+        self.workers = workers or int(os.getenv('BCRYPT_WORKERS', str(min(4, os.cpu_count() or 1))))
+        self.executor_kind = (executor or os.getenv('BCRYPT_EXECUTOR', 'thread')).lower()
+        if self.executor_kind not in HASHER_EXECUTORS:
+            self.executor_kind = 'thread'
+
+        # Chamadas em andamento + na fila; acima disso a requisição aguarda uma vaga
+        self._slots = threading.BoundedSemaphore(
+            max_pending or int(os.getenv('BCRYPT_MAX_PENDING', str(self.workers * 4)))
+        )
+        self._lock = threading.Lock()
+        self._metrics = {'hashed': 0, 'verified': 0, 'rehashed': 0}
+        # Pool criado já na construção, nunca sob demanda no primeiro login
+        self._executor: Optional[Executor] = self._create_executor()
+
+    def _create_executor(self) -> Optional[Executor]:
+        """Cria o pool de workers (None no modo inline)"""
+        if self.executor_kind == 'inline':
+            return None
+
+        executor: Optional[Executor] = None
+        if self.executor_kind == 'process':
+            executor = self._create_process_pool()
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+
+        atexit.register(self.shutdown)
+        logger.info(f"🔐 Pool do bcrypt: {self.workers} workers ({self.executor_kind}), custo {self.rounds}")
+        return executor
+
+    def _create_process_pool(self) -> Optional[Executor]:
+        """
+        Pool de processos com todos os workers criados imediatamente (None = usar threads)
+        fork: com spawn cada worker reexecutaria o módulo principal (a inicialização do app);
+        os workers só executam funções do bcrypt. Um fork com outras threads ativas pode herdar
+        travas ocupadas por elas, então o pool precisa nascer antes de qualquer thread em segundo plano
+        """
+        if threading.active_count() > 1:
+            logger.warning("⚠️ Threads em segundo plano já ativas; pool de processos do bcrypt trocado por threads")
+            self.executor_kind = 'thread'
+            return None
+
+        try:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            # Com fork, a primeira tarefa cria todos os workers de uma vez (aqui, e não durante um login)
+            executor.submit(hash_rounds, b'').result()
+            return executor
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Pool de processos indisponível para o bcrypt ({e}); usando threads")
+            self.executor_kind = 'thread'
+            return None
+
+    def _run(self, function, *args):
+        """Executa a função do bcrypt no pool, respeitando o limite de chamadas pendentes"""
+        executor = self._executor
+        if executor is None:
+            return function(*args)
+        with self._slots:
+            return executor.submit(function, *args).result()
+
+    def hash_password(self, password: str) -> bytes:
+        """Hash bcrypt da senha com o custo configurado"""
+        password_hash = self._run(bcrypt.hashpw, _as_bytes(password), bcrypt.gensalt(rounds=self.rounds))
+        with self._lock:
+            self._metrics['hashed'] += 1
+        return password_hash
+
+    def verify_password(self, password: str, password_hash: Union[str, bytes]) -> bool:
+        """Confere a senha com o hash armazenado"""
+        try:
+            valid = self._run(bcrypt.checkpw, _as_bytes(password), _as_bytes(password_hash))
+        except ValueError:
+            # Hash corrompido ou em formato desconhecido
+            valid = False
+        with self._lock:
+            self._metrics['verified'] += 1
+        return valid
+
+    def needs_rehash(self, password_hash: Union[str, bytes]) -> bool:
+        """True quando o hash foi gerado com outro custo"""
+        return hash_rounds(password_hash) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self._metrics['rehashed'] += 1
+
+    def get_metrics(self) -> Dict[str, Union[int, str]]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics.update(rounds=self.rounds, workers=self.workers, executor=self.executor_kind)
+        return metrics
+
+    def shutdown(self):
+        """Encerra os workers"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Instância compartilhada (um pool de workers por processo)"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
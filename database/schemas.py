@@ -6,6 +6,8 @@ Define as estruturas de dados e validações para usuários e perfis
 import re
 from datetime import datetime
 
+from .pagination import decode_cursor
+
 
 class ValidationError(Exception):
     """Exceção personalizada para erros de validação"""
@@ -200,3 +202,30 @@ class ChatSchema:
             raise ValidationError(f"Tipo de mensagem deve ser um dos: {', '.join(valid_types)}")
         
         return message_type
+    
+    @staticmethod
+    def validate_page_limit(limit, default, maximum):
+        """Valida o tamanho da página (entre 1 e o máximo configurado)"""
+        if limit in (None, ''):
+            return default
+        
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            raise ValidationError("Limite de página deve ser um número inteiro")
+        
+        if limit < 1:
+            raise ValidationError("Limite de página deve ser maior que zero")
+        
+        return min(limit, maximum)
+    
+    @staticmethod
+    def validate_cursor(cursor, size=2):
+        """Valida e decodifica um cursor de paginação (None quando ausente)"""
+        if not cursor:
+            return None
+        
+        try:
+            return decode_cursor(cursor, size)
+        except ValueError:
+            raise ValidationError("Cursor de paginação inválido")
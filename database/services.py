@@ -5,7 +5,7 @@ Camada de serviço que abstrai operações complexas do banco
 
 from .models import Database
 from .schemas import UserSchema, ProfileSchema, ChatSchema, ValidationError
-from .config import DB_PATH
+from .config import DB_PATH, CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE
 import os
 
 
@@ -35,19 +35,8 @@ class DatabaseService:
             # Validar dados do perfil
             validated_profile = ProfileSchema.validate_profile_data(profile_data)
             
-            # Criar usuário
-            user_id, message = self.db.create_user(user_data['email'], user_data['password'])
-            if not user_id:
-                return None, message
-            
-            # Criar perfil
-            profile_id, profile_message = self.db.create_user_profile(user_id, validated_profile)
-            if not profile_id:
-                # Se falhou ao criar perfil, deveria idealmente remover o usuário
-                # Por simplicidade, vamos apenas retornar o erro
-                return None, f"Usuário criado mas erro no perfil: {profile_message}"
-            
-            return user_id, "Cadastro realizado com sucesso!"
+            # Criar usuário e perfil na mesma transação (e-mail duplicado detectado pela restrição UNIQUE)
+            return self.db.register_user(user_data['email'], user_data['password'], validated_profile)
             
         except ValidationError as e:
             return None, str(e)
@@ -69,17 +58,13 @@ class DatabaseService:
             # Validar formato do email
             email = UserSchema.validate_email(email)
             
-            # Autenticar
-            user_id = self.db.authenticate_user(email, password)
+            # Autenticar e buscar o perfil completo na mesma consulta
+            user_id, profile = self.db.authenticate_with_profile(email, password)
             if not user_id:
                 return None, "Email ou senha incorretos"
-            
-            # Buscar perfil completo
-            profile = self.db.get_user_profile(user_id)
             if not profile:
                 return None, "Erro ao carregar dados do usuário"
             
-            profile['user_id'] = user_id
             return profile, "Login realizado com sucesso!"
             
         except ValidationError as e:
@@ -159,6 +144,58 @@ class DatabaseService:
             print(f"Erro ao obter histórico: {str(e)}")
             return []
     
+    def get_chat_history_page(self, session_id, limit=None, before=None, since=None):
+        """
+        Obtém uma página do histórico de mensagens (paginação por cursor)
+        
+        Args:
+            session_id: ID da sessão
+            limit: Mensagens por página (padrão CHAT_PAGE_SIZE, máximo CHAT_MAX_PAGE_SIZE)
+            before: Cursor para carregar mensagens mais antigas (before_cursor da página anterior)
+            since: Cursor para sincronização incremental (sync_cursor da última resposta)
+            
+        Returns:
+            tuple: (page, message) em caso de sucesso, (None, error_message) em caso de erro
+        """
+        try:
+            limit = ChatSchema.validate_page_limit(limit, CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE)
+            before = ChatSchema.validate_cursor(before)
+            since = ChatSchema.validate_cursor(since)
+            if before and since:
+                raise ValidationError("Use apenas um dos cursores: before ou since")
+            
+            page = self.db.get_chat_history_page(session_id, limit, before=before, since=since)
+            return page, "Histórico obtido com sucesso"
+            
+        except ValidationError as e:
+            return None, str(e)
+        except Exception as e:
+            return None, f"Erro ao obter histórico: {str(e)}"
+    
+    def get_user_sessions_page(self, user_id, limit=None, before=None):
+        """
+        Obtém uma página das sessões do usuário, da criada mais recentemente para a mais antiga
+        
+        Args:
+            user_id: ID do usuário
+            limit: Sessões por página (padrão CHAT_PAGE_SIZE, máximo CHAT_MAX_PAGE_SIZE)
+            before: Cursor da página seguinte (next_cursor da página anterior)
+            
+        Returns:
+            tuple: (page, message) em caso de sucesso, (None, error_message) em caso de erro
+        """
+        try:
+            limit = ChatSchema.validate_page_limit(limit, CHAT_PAGE_SIZE, CHAT_MAX_PAGE_SIZE)
+            before = ChatSchema.validate_cursor(before)
+            
+            page = self.db.get_user_sessions_page(user_id, limit, before=before)
+            return page, "Sessões obtidas com sucesso"
+            
+        except ValidationError as e:
+            return None, str(e)
+        except Exception as e:
+            return None, f"Erro ao obter sessões: {str(e)}"
+    
     def get_user_sessions_list(self, user_id):
         """
         Obtém lista de sessões do usuário
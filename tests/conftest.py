@@ -0,0 +1,13 @@
+"""
+Configuração compartilhada dos testes
+"""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def food_cache_path(tmp_path, monkeypatch):
+    """Cache de alimentos isolado por teste (nunca o arquivo do projeto)"""
+    path = tmp_path / 'food_cache.db'
+    monkeypatch.setenv('FOOD_CACHE_PATH', str(path))
+    return path
@@ -0,0 +1,70 @@
+"""
+Testes do pré-aquecimento do cache de alimentos
+"""
+
+import pytest
+
+from utils.cache_prewarmer import CachePrewarmer, FCNTL_AVAILABLE, prewarm_enabled
+from utils.food_cache import FoodCache
+from utils.food_names import FoodNameResolver
+from utils.nutrition_api import BatchFoodResult
+
+
+class _LocalIndex:
+    def __init__(self, names):
+        self.names = set(names)
+
+    def search(self, food_name):
+        return {'description': food_name} if food_name in self.names else None
+
+
+class _NutritionAPI:
+    def __init__(self, tmp_path, local_names=(), usda_api_key='registered-key'):
+        self.usda_api_key = usda_api_key
+        self.food_cache = FoodCache(db_path=str(tmp_path / 'food_cache.db'))
+        self.food_names = FoodNameResolver()
+        self.local_index = _LocalIndex(local_names)
+        self.searched = []
+
+    def search_foods_batch(self, food_names):
+        self.searched.extend(food_names)
+        for food_name in food_names:
+            self.food_cache.set_negative(self.food_names.canonical(food_name))
+        return BatchFoodResult()
+
+
+@pytest.mark.parametrize('enabled, key, expected', [
+    (None, 'registered-key', False),
+    ('true', 'registered-key', True),
+    ('true', 'DEMO_KEY', False),
+])
+def test_prewarm_enabled(tmp_path, monkeypatch, enabled, key, expected):
+    if enabled is None:
+        monkeypatch.delenv('FOOD_PREWARM_ENABLED', raising=False)
+    else:
+        monkeypatch.setenv('FOOD_PREWARM_ENABLED', enabled)
+    assert prewarm_enabled(_NutritionAPI(tmp_path, usda_api_key=key)) is expected
+
+
+def test_local_index_foods_are_not_rewarmed(tmp_path):
+    api = _NutritionAPI(tmp_path, local_names={'banana'})
+    prewarmer = CachePrewarmer(api, foods=['banana', 'quinoa'])
+
+    prewarmer.run_once()
+    prewarmer.run_once()
+
+    assert api.searched == ['quinoa']
+
+
+@pytest.mark.skipif(not FCNTL_AVAILABLE, reason='trava entre processos requer fcntl')
+def test_run_skipped_while_another_process_holds_the_lock(tmp_path):
+    api = _NutritionAPI(tmp_path)
+    holder = CachePrewarmer(api, foods=['quinoa'])
+    lock = holder._acquire_process_lock()
+    try:
+        status = CachePrewarmer(api, foods=['quinoa']).run_once()
+    finally:
+        lock.close()
+
+    assert status['state'] == 'skipped'
+    assert api.searched == []
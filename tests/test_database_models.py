@@ -0,0 +1,112 @@
+"""
+Testes do uso do pool de conexões pelo modelo de usuários
+"""
+
+import sqlite3
+
+import pytest
+
+from database.models import Database
+from database.pagination import decode_cursor
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setenv('CHAT_WRITER_MODE', 'off')
+    monkeypatch.setenv('BCRYPT_ROUNDS', '4')
+    return Database(str(tmp_path / 'shapemate.db'))
+
+
+def test_failed_query_returns_connection_to_pool(db, monkeypatch):
+    with db.pool.connection() as conn:
+        conn.execute('DROP TABLE chat_sessions')
+
+    opened = db.pool.get_stats()['opened']
+    for _ in range(3):
+        with pytest.raises(sqlite3.OperationalError):
+            db.get_user_sessions('user')
+
+    # A mesma conexão ociosa é reaproveitada em vez de vazar uma nova a cada erro
+    assert db.pool.get_stats()['opened'] == opened
+    assert db.pool.get_stats()['idle'] >= 1
+
+
+def test_failed_write_rolls_back_transaction(db):
+    user_id, _ = db.create_user('ana@example.com', 'segredo123')
+    profile = {'name': 'Ana', 'age': 30, 'gender': 'feminino', 'weight': 60, 'height': 1.65,
+               'primary_goal': 'manutencao', 'activity_level': 'moderado'}
+
+    # Perfil sem campo obrigatório: o usuário criado na mesma transação é desfeito
+    result, _ = db.register_user('bia@example.com', 'segredo123', {'name': 'Bia'})
+    assert result is None
+    assert not db.check_email_exists('bia@example.com')
+
+    assert db.create_user_profile(user_id, profile)[0] is not None
+    assert db.get_user_profile(user_id)['name'] == 'Ana'
+    with db.pool.connection() as conn:
+        assert not conn.in_transaction
+
+
+def test_rehash_failure_is_logged(db, monkeypatch, caplog):
+    user_id, _ = db.create_user('ana@example.com', 'segredo123')
+    monkeypatch.setattr(db.password_hasher, 'needs_rehash', lambda password_hash: True)
+
+    def broken_transaction():
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(db.pool, 'transaction', broken_transaction)
+    with caplog.at_level('WARNING', logger='database.models'):
+        assert db.authenticate_user('ana@example.com', 'segredo123') == user_id
+    assert 'Erro ao atualizar hash da senha' in caplog.text
+
+
+def test_login_without_profile_is_rejected(db):
+    user_id, _ = db.create_user('ana@example.com', 'segredo123')
+
+    assert db.authenticate_with_profile('ana@example.com', 'errada') == (None, None)
+    assert db.authenticate_with_profile('ana@example.com', 'segredo123') == (user_id, None)
+
+    db.create_user_profile(user_id, {'name': 'Ana', 'age': 30, 'gender': 'feminino', 'weight': 60,
+                                     'height': 1.65, 'primary_goal': 'manutencao',
+                                     'activity_level': 'moderado'})
+    authenticated_id, profile = db.authenticate_with_profile('ana@example.com', 'segredo123')
+    assert authenticated_id == user_id
+    assert profile['name'] == 'Ana' and profile['user_id'] == user_id
+
+
+def test_service_login_reports_missing_profile(tmp_path, monkeypatch):
+    from database.services import DatabaseService
+
+    monkeypatch.setenv('CHAT_WRITER_MODE', 'off')
+    monkeypatch.setenv('BCRYPT_ROUNDS', '4')
+    service = DatabaseService(str(tmp_path / 'shapemate.db'))
+    service.db.create_user('ana@example.com', 'segredo123')
+
+    assert service.login_user('ana@example.com', 'segredo123') == (None, "Erro ao carregar dados do usuário")
+    assert service.login_user('ana@example.com', 'errada') == (None, "Email ou senha incorretos")
+
+
+def test_session_pages_are_stable_when_activity_changes(db):
+    user_id, _ = db.create_user('ana@example.com', 'segredo123')
+    session_ids = [db.create_chat_session(user_id, f'Chat {i}')[0] for i in range(5)]
+    with db.pool.transaction() as conn:
+        for i, session_id in enumerate(session_ids):
+            conn.execute("UPDATE chat_sessions SET created_at = ?, last_activity = ? WHERE id = ?",
+                         (f'2026-01-0{i + 1} 10:00:00', f'2026-01-0{i + 1} 10:00:00', session_id))
+
+    first = db.get_user_sessions_page(user_id, limit=2)
+    assert [s['id'] for s in first['sessions']] == [session_ids[4], session_ids[3]]
+
+    # Uma sessão da página seguinte recebe mensagens: a posição na paginação não muda
+    with db.pool.transaction() as conn:
+        conn.execute("UPDATE chat_sessions SET last_activity = '2026-02-01 10:00:00' WHERE id = ?",
+                     (session_ids[1],))
+
+    seen = [s['id'] for s in first['sessions']]
+    cursor = first['next_cursor']
+    while cursor:
+        page = db.get_user_sessions_page(user_id, limit=2, before=decode_cursor(cursor, 2))
+        seen.extend(s['id'] for s in page['sessions'])
+        cursor = page['next_cursor']
+
+    assert seen == session_ids[::-1]
@@ -0,0 +1,22 @@
+"""
+Testes da configuração do gerenciador de dietas
+"""
+
+from utils.diet_manager import diet_storage
+
+
+def test_ingredients_come_from_yaml_config():
+    groups = diet_storage.load_keyword_groups(diet_storage.DEFAULT_CONFIG_PATH)
+    assert 'arroz' in groups['ingredients']
+    assert diet_storage.INGREDIENT_MATCHER.scan('Arroz com feijão e frango').get('ingredients') == ['arroz', 'feijão', 'frango']
+
+
+def test_custom_config_path(tmp_path, monkeypatch):
+    config_path = tmp_path / 'diet_manager.yaml'
+    config_path.write_text('keyword_groups:\n  ingredients:\n    - "quinoa"\n', encoding='utf-8')
+    monkeypatch.setenv('DIET_MANAGER_CONFIG_PATH', str(config_path))
+    assert diet_storage.load_keyword_groups() == {'ingredients': ['quinoa']}
+
+
+def test_missing_config_yields_no_groups(tmp_path):
+    assert diet_storage.load_keyword_groups(str(tmp_path / 'missing.yaml')) == {}
@@ -0,0 +1,66 @@
+"""
+Testes da busca no índice local do FoodData Central
+"""
+
+import csv
+import os
+
+import pytest
+
+from utils.fdc_local_index import FDCLocalIndex
+
+FOODS = [
+    (1, 'Beverages, coffee, brewed, decaffeinated', 208, 1.0),
+    (2, 'Cheese bread', 208, 350.0),
+    (3, 'Rice, white, cooked', 208, 130.0),
+]
+
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def index(tmp_path):
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    _write_csv(csv_dir / 'food.csv', ['fdc_id', 'data_type', 'description'],
+               [(fdc_id, 'sr_legacy_food', description) for fdc_id, description, _, _ in FOODS])
+    _write_csv(csv_dir / 'nutrient.csv', ['id', 'name', 'nutrient_nbr'], [(1008, 'Energy', '208')])
+    _write_csv(csv_dir / 'food_nutrient.csv', ['id', 'fdc_id', 'nutrient_id', 'amount'],
+               [(fdc_id, fdc_id, 1008, amount) for fdc_id, _, _, amount in FOODS])
+
+    local_index = FDCLocalIndex(os.path.join(tmp_path, 'fdc.db'))
+    local_index.import_csv_dirs([str(csv_dir)])
+    return local_index
+
+
+def test_all_terms_must_match(index):
+    assert index.search('rice cooked')['fdc_id'] == 3
+    assert index.search('cheese bread')['fdc_id'] == 2
+
+
+@pytest.mark.parametrize('food_name', ['pão de queijo', 'molho de tomate', 'suco de laranja', 'rice and beans'])
+def test_partial_match_returns_none(index, food_name):
+    assert index.search(food_name) is None
+
+
+def test_stopwords_are_ignored(index):
+    assert index.search('rice, white and cooked')['fdc_id'] == 3
+
+
+def test_atwater_energy_fills_missing_calories(tmp_path):
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    _write_csv(csv_dir / 'food.csv', ['fdc_id', 'data_type', 'description'],
+               [(10, 'foundation_food', 'Lentils, dry')])
+    _write_csv(csv_dir / 'nutrient.csv', ['id', 'name', 'nutrient_nbr'],
+               [(2047, 'Energy (Atwater General Factors)', '957')])
+    _write_csv(csv_dir / 'food_nutrient.csv', ['id', 'fdc_id', 'nutrient_id', 'amount'], [(1, 10, 2047, 352.0)])
+
+    local_index = FDCLocalIndex(os.path.join(tmp_path, 'fdc.db'))
+    local_index.import_csv_dirs([str(csv_dir)])
+    assert local_index.search('lentils')['calories'] == 352.0
@@ -0,0 +1,90 @@
+"""
+Testes do cache de alimentos em disco (conexão por thread, acessos em lote e limpeza periódica)
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from utils.food_cache import PROJECT_ROOT, FoodCache
+
+
+@pytest.fixture
+def cache_factory(tmp_path, monkeypatch):
+    def factory(**env):
+        for name, value in env.items():
+            monkeypatch.setenv(name, str(value))
+        cache = FoodCache(db_path=str(tmp_path / 'food_cache.db'), memory_size=1, max_entries=3)
+        cache._store_ready()
+        return cache
+    return factory
+
+
+def _count_statements(cache, monkeypatch):
+    statements = []
+    conn = sqlite3.connect(cache.db_path)
+    conn.set_trace_callback(statements.append)
+    monkeypatch.setattr(cache, '_connect', lambda: conn)
+    return statements
+
+
+def test_thread_reuses_one_connection(cache_factory, monkeypatch):
+    cache = cache_factory()
+    opened = []
+    connect = cache._connect
+    monkeypatch.setattr(cache, '_connect', lambda: opened.append(1) or connect())
+
+    cache.set('arroz', {'calories': 130})
+    cache.set('feijao', {'calories': 76})
+    cache.get('arroz')
+    assert len(opened) == 1
+
+
+def test_disk_hits_update_last_access_in_batches(cache_factory, monkeypatch):
+    cache = cache_factory(FOOD_CACHE_ACCESS_BATCH=2, FOOD_CACHE_ACCESS_FLUSH_SECONDS=3600)
+    statements = _count_statements(cache, monkeypatch)
+    cache.set('arroz', {'calories': 130})
+    cache.set('feijao', {'calories': 76})
+    statements.clear()
+
+    # memory_size=1: as leituras alternadas vão ao disco
+    for key in ('arroz', 'feijao', 'arroz'):
+        assert cache.get(key) is not None
+
+    updates = [sql for sql in statements if sql.startswith('UPDATE')]
+    assert len(updates) == 2  # um único lote com as duas chaves acessadas
+    assert sum(sql == 'COMMIT' for sql in statements) == 1
+
+
+def test_size_limit_enforced_periodically(cache_factory, monkeypatch):
+    cache = cache_factory(FOOD_CACHE_PRUNE_EVERY=5, FOOD_CACHE_PRUNE_SECONDS=3600)
+    statements = _count_statements(cache, monkeypatch)
+
+    for index in range(4):
+        cache.set(f'alimento {index}', {'calories': index})
+    assert not any('COUNT(*)' in sql for sql in statements)
+    assert cache.get_metrics()['disk_entries'] == 4
+
+    cache.set('alimento 4', {'calories': 4})
+    assert cache.get_metrics()['disk_entries'] == 3
+    assert cache.get_metrics()['evictions'] == 2
+
+
+def test_store_created_on_first_use(tmp_path):
+    path = tmp_path / 'lazy' / 'food_cache.db'
+    cache = FoodCache(db_path=str(path))
+    assert not path.exists()
+
+    cache.set('arroz', {'calories': 130})
+    assert path.exists()
+    assert cache.get('arroz') == {'calories': 130}
+
+
+def test_import_does_not_create_cache_file(tmp_path):
+    path = tmp_path / 'import' / 'food_cache.db'
+    env = dict(os.environ, FOOD_CACHE_PATH=str(path))
+    subprocess.run([sys.executable, '-c', 'import utils.nutrition_api'], cwd=PROJECT_ROOT, env=env, check=True)
+    assert not path.exists()
@@ -0,0 +1,33 @@
+"""
+Testes da normalização de nomes de alimentos (plurais em português e inglês)
+"""
+
+import pytest
+
+from utils.food_names import FoodNameResolver, normalize_food_name
+
+
+@pytest.mark.parametrize('food_name, expected', [
+    ('feijões', 'feijao'),
+    ('pães', 'pao'),
+    ('grãos', 'grao'),
+    ('Limões', 'limao'),
+    ('abacaxis', 'abacaxi'),
+    ('kiwis', 'kiwi'),
+    ('pastéis', 'pastel'),
+    ('vegetais', 'vegetal'),
+    ('ovos', 'ovo'),
+    ('tomatoes', 'tomato'),
+    ('berries', 'berry'),
+    ('brócolis', 'brocolis'),
+    ('hummus', 'hummus'),
+    ('Frango  Grelhado', 'frango grelhado'),
+])
+def test_normalize_food_name(food_name, expected):
+    assert normalize_food_name(food_name) == expected
+
+
+def test_plural_resolves_to_same_alias():
+    resolver = FoodNameResolver()
+    assert resolver.canonical('Ovos cozidos') == resolver.canonical('ovo cozido')
+    assert resolver.usda_name('arroz') == 'cooked white rice'
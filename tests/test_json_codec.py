@@ -0,0 +1,64 @@
+"""
+Testes do codec JSON e do esquema do documento de dieta
+"""
+
+import pytest
+
+from utils import json_codec
+from utils.diet_manager.diet_storage import StoredDiet
+from utils.json_codec import DietValidationError, decode_diet, encode_diet
+
+DIET = {
+    'generated_at': '2026-10-19T10:00:00',
+    'patient_info': {'name': 'Ana', 'age': 30},
+    'weekly_menu': {
+        'Segunda': {
+            'breakfast': {'target_kcal': 500, 'foods': [{'food': 'oats', 'portion': '30g'}]},
+        },
+    },
+    'nutrition_totals': {'week': {'calories': 3500.0}, 'days': {'Segunda': {'calories': 500}}},
+    'nutritional_database': {'oats': {'calories_per_100g': 389.0}},
+}
+
+
+def test_valid_diet_round_trips():
+    decoded = decode_diet(encode_diet(DIET))
+    assert decoded['weekly_menu']['Segunda']['breakfast']['foods'] == [{'food': 'oats', 'portion': '30g'}]
+    assert decoded['nutrition_totals']['days']['Segunda']['calories'] == 500.0
+    assert decoded['patient_info'] == {'name': 'Ana', 'age': 30}
+
+
+@pytest.mark.parametrize('document', [
+    # Refeição com foods fora do formato de lista
+    {'weekly_menu': {'Segunda': {'lunch': {'foods': 'arroz'}}}},
+    # Alimento sem nome
+    {'weekly_menu': {'Segunda': {'lunch': {'foods': [{'portion': '100g'}]}}}},
+    # Total nutricional não numérico
+    {'nutrition_totals': {'week': {'calories': 'muitas'}}},
+    # Campo conhecido no topo com tipo inválido
+    {'pdf_generated': 'sim'},
+])
+def test_malformed_nested_document_is_rejected(document):
+    with pytest.raises(DietValidationError):
+        decode_diet(json_codec.dumps(document))
+    with pytest.raises(DietValidationError):
+        encode_diet(document)
+
+
+def test_stored_diet_is_materialized_for_encoding():
+    stored = StoredDiet(json_codec.dumps(DIET), id=1, name='Dieta')
+    plain = json_codec._materialize({'diet': stored})
+
+    assert type(plain['diet']) is dict
+    assert plain['diet']['data']['patient_info']['name'] == 'Ana'
+    assert json_codec.loads(json_codec.dumps({'diet': stored}))['diet']['data']['generated_at'] == DIET['generated_at']
+
+
+def test_msgspec_encoder_loads_stored_diet(monkeypatch):
+    msgspec = pytest.importorskip('msgspec')
+    monkeypatch.setattr(json_codec, 'JSON_BACKEND', 'msgspec')
+    monkeypatch.setattr(json_codec, '_msgspec_encoder', msgspec.json.Encoder(), raising=False)
+
+    stored = StoredDiet(json_codec.dumps(DIET), id=1, name='Dieta')
+    encoded = json_codec.loads(json_codec.dumps_bytes(stored))
+    assert encoded['data']['weekly_menu']['Segunda']['breakfast']['target_kcal'] == 500
@@ -0,0 +1,53 @@
+"""
+Testes da extração de JSON das respostas da LLM
+"""
+
+import pytest
+
+from utils.llm_json import LLMJSONError, find_json_value, parse_llm_json
+
+FOOD_LIST_SCHEMA = {'type': list, 'items': {'type': str}, 'min_items': 1}
+
+
+def test_prose_brackets_are_skipped():
+    text = 'Segue a lista [abaixo]:\n["arroz", "feijão"]'
+    assert parse_llm_json(text, FOOD_LIST_SCHEMA) == ['arroz', 'feijão']
+    assert find_json_value(text) == '["arroz", "feijão"]'
+
+
+def test_candidate_outside_schema_is_skipped():
+    text = 'Exemplo de formato: {"nome": "x"}\nResposta: ["aveia"]'
+    assert parse_llm_json(text, FOOD_LIST_SCHEMA) == ['aveia']
+
+
+def test_repairs_are_still_applied():
+    assert parse_llm_json("Aqui: {liked_foods: ['banana',], ativo: True}") == {
+        'liked_foods': ['banana'], 'ativo': True
+    }
+
+
+@pytest.mark.parametrize('text', [
+    '["arroz", "feijão", "fran',
+    'Dieta: {"refeicoes": [{"nome": "café"}, {"nome": "almo',
+])
+def test_truncated_output_is_rejected(text):
+    with pytest.raises(LLMJSONError, match='truncada'):
+        parse_llm_json(text)
+
+
+@pytest.mark.parametrize('text', [
+    'Responda com {chaves duplas, assim: {"foods": ["aveia", "banana"]}',
+    "Formato {d'água {\"foods\": [\"aveia\", \"banana\"]} e pronto",
+])
+def test_stray_brace_before_valid_json(text):
+    assert parse_llm_json(text, {'type': dict}) == {'foods': ['aveia', 'banana']}
+
+
+def test_stray_brace_without_later_json_is_truncation():
+    with pytest.raises(LLMJSONError, match='truncada'):
+        parse_llm_json('Responda com {chaves duplas, sem json', {'type': dict})
+
+
+def test_no_json_raises():
+    with pytest.raises(LLMJSONError):
+        parse_llm_json('Não consegui montar a lista [desculpe]', FOOD_LIST_SCHEMA)
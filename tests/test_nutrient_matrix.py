@@ -0,0 +1,27 @@
+"""
+Testes dos totais nutricionais calculados pela matriz de nutrientes
+"""
+
+import pytest
+
+from utils.nutrient_matrix import compute_diet_totals, compute_totals_for_diets
+
+
+def _diet(rice_kcal, grams=200):
+    return {
+        'nutritional_database': {'Arroz': {'calories_per_100g': rice_kcal, 'protein_g': 2.5}},
+        'weekly_menu': {'segunda': {'almoco': {'foods': [{'food': 'arroz', 'quantity_g': grams}]}}},
+    }
+
+
+def test_each_diet_uses_its_own_nutritional_database():
+    totals = compute_totals_for_diets([_diet(130), _diet(360)])
+    assert totals[0]['week']['calories'] == pytest.approx(260.0)
+    assert totals[1]['week']['calories'] == pytest.approx(720.0)
+
+
+@pytest.mark.parametrize('chunk_foods', [1, 2, 512])
+def test_batched_totals_match_single_diet_totals(chunk_foods):
+    diets = [_diet(100 + i, grams=50 + i) for i in range(7)]
+    batched = compute_totals_for_diets(diets, chunk_foods=chunk_foods)
+    assert batched == [compute_diet_totals(diet) for diet in diets]
@@ -0,0 +1,162 @@
+"""
+Testes da API de nutrição do USDA (conversão de alimentos e busca em duas fases)
+"""
+
+import pytest
+
+from utils.nutrition_api import FoodData, NutritionAPI
+
+
+def test_atwater_energy_used_when_208_is_missing():
+    food = {
+        'description': 'Lentils, dry',
+        'foodNutrients': [
+            {'nutrientNumber': '957', 'value': 352.0},
+            {'nutrientNumber': '958', 'value': 347.0},
+            {'nutrientNumber': '203', 'value': 24.6},
+        ]
+    }
+    result = NutritionAPI._food_from_usda(food, 'lentils')
+    assert result.calories_per_100g == 347.0
+    assert result.protein_g == 24.6
+
+
+def test_energy_208_takes_precedence():
+    food = {'foodNutrients': [
+        {'number': '958', 'amount': 347.0},
+        {'number': '208', 'amount': 353.0},
+    ]}
+    assert NutritionAPI._food_from_usda(food, 'lentils').calories_per_100g == 353.0
+
+
+def test_energy_by_name_ignores_kj():
+    food = {'foodNutrients': [
+        {'nutrient': {'name': 'Energy', 'unitName': 'kJ'}, 'amount': 1477.0},
+        {'nutrient': {'name': 'Energy (Atwater General Factors)', 'unitName': 'kcal'}, 'amount': 352.0},
+    ]}
+    assert NutritionAPI._food_from_usda(food, 'lentils').calories_per_100g == 352.0
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.setenv('FOOD_CACHE_PATH', str(tmp_path / 'food_cache.db'))
+    monkeypatch.setenv('FDC_LOCAL_DB', str(tmp_path / 'missing_fdc.db'))
+    monkeypatch.setenv('USDA_TWO_PHASE', 'true')
+    return NutritionAPI()
+
+
+def test_two_phase_uses_nutrients_from_search_hit(api, monkeypatch):
+    calls = []
+
+    def fake_request(method, url, params, json_body=None):
+        calls.append((method, url))
+        if url.endswith('/foods/search'):
+            query = params['query']
+            if query == 'mystery food':
+                return _FakeResponse({'foods': [{'fdcId': 99, 'description': 'Mystery'}]})
+            return _FakeResponse({'foods': [{
+                'fdcId': len(calls), 'description': query,
+                'foodNutrients': [{'nutrientNumber': '208', 'value': 100.0}]
+            }]})
+        return _FakeResponse([{'fdcId': 99, 'description': 'Mystery',
+                               'foodNutrients': [{'number': '208', 'amount': 42.0}]}])
+
+    monkeypatch.setattr(api, '_http_request', fake_request)
+    result = api.search_foods_batch(['banana', 'oats', 'mystery food'])
+
+    assert result.foods['banana'].calories_per_100g == 100.0
+    assert result.foods['mystery food'].calories_per_100g == 42.0
+    # Uma busca por alimento e um único lote de detalhes para o resultado sem nutrientes
+    assert [method for method, _ in calls].count('GET') == 3
+    assert [method for method, _ in calls].count('POST') == 1
+
+
+@pytest.mark.parametrize('key, expected', [('DEMO_KEY', 30), ('registered-key', 1000)])
+def test_rate_limit_default_follows_api_key(tmp_path, monkeypatch, key, expected):
+    monkeypatch.setenv('FOOD_CACHE_PATH', str(tmp_path / 'food_cache.db'))
+    monkeypatch.setenv('USDA_API_KEY', key)
+    monkeypatch.delenv('USDA_RATE_LIMIT_PER_HOUR', raising=False)
+    api = NutritionAPI()
+    assert api.rate_limiter.rate_per_second * 3600 == pytest.approx(expected)
+
+
+def test_retries_take_tokens_and_cap_retry_after(api, monkeypatch):
+    responses = [_FakeResponse({}, 429, {'Retry-After': '9999'}), _FakeResponse({'foods': []})]
+    acquired = []
+    sleeps = []
+
+    monkeypatch.setattr(api.session, 'request', lambda *args, **kwargs: responses.pop(0))
+    monkeypatch.setattr(api.rate_limiter, 'acquire', lambda max_wait: acquired.append(max_wait) or True)
+    monkeypatch.setattr('utils.nutrition_api.time.sleep', sleeps.append)
+    api.rate_limit_max_wait = 5.0
+
+    response = api._http_request('GET', 'https://example.test/foods/search', {'query': 'banana'})
+
+    assert response.status_code == 200
+    # Cada tentativa passa pelo limitador de taxa e o Retry-After respeita o teto de espera
+    assert len(acquired) == 2
+    assert sleeps == [5.0]
+    assert api.get_http_metrics()['retries'] == 1
+
+
+def test_similarity_lookup_never_calls_the_api(api, monkeypatch):
+    def no_network(*args, **kwargs):
+        raise AssertionError("busca na API durante a similaridade")
+
+    monkeypatch.setattr(api, 'search_food', no_network)
+    monkeypatch.setattr(api, '_search_usda_api', no_network)
+    api.food_cache.set('chicken breast', FoodData('chicken breast', 165, 31, 0, 3.6).to_dict())
+    api.food_cache.set('turkey breast', FoodData('turkey breast', 135, 30, 0, 1.0).to_dict())
+
+    # Antes da primeira construção o índice está vazio: alimento desconhecido, sem bloquear
+    monkeypatch.setattr(api, 'schedule_similarity_refresh', lambda: False)
+    assert api.calculate_food_equivalences('chicken breast')['status'].startswith('Alimento')
+
+    api.refresh_similarity_index()
+    assert [food.name for food in api.suggest_food_alternatives('chicken breast')] == ['turkey breast']
+    assert api.suggest_food_alternatives('dragon fruit') == []
+
+
+def test_expired_similarity_index_rebuilds_in_background(api, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(api, 'schedule_similarity_refresh', lambda: scheduled.append(True))
+    index = api.refresh_similarity_index()
+
+    assert api.get_similarity_index() is index
+    assert scheduled == []
+
+    api.similarity_refresh_seconds = 0
+    assert api.get_similarity_index() is index
+    assert scheduled == [True]
+
+
+@pytest.mark.parametrize('two_phase', [True, False])
+def test_llm_food_names_are_searched_by_usda_name(api, monkeypatch, two_phase):
+    queries = []
+
+    def fake_request(method, url, params, json_body=None):
+        queries.append(params['query'])
+        return _FakeResponse({'foods': [{
+            'fdcId': len(queries), 'description': params['query'],
+            'foodNutrients': [{'nutrientNumber': '208', 'value': 100.0}]
+        }]})
+
+    api.two_phase = two_phase
+    monkeypatch.setattr(api, '_http_request', fake_request)
+    api.search_food('Arroz branco')
+    api.search_foods_batch(['feijões pretos', 'grilled chicken breast'])
+
+    assert sorted(queries) == ['cooked black beans', 'cooked white rice', 'grilled chicken breast']
@@ -0,0 +1,38 @@
+"""
+Testes da calculadora nutricional (altura do cadastro em metros)
+"""
+
+import pytest
+
+from utils.nutrition_calculator import AnthropometricProfile, calculate_from_user_data, height_to_cm
+
+# Perfil como gravado pelo cadastro: altura em metros
+STORED_PROFILE = {
+    'weight': 80,
+    'height': 1.75,
+    'age': 30,
+    'gender': 'masculino',
+    'activity_level': 'moderado',
+    'primary_goal': 'perda_peso',
+}
+
+
+def test_height_in_meters_is_converted_to_cm():
+    assert height_to_cm(1.75) == pytest.approx(175.0)
+    assert height_to_cm('1.6') == pytest.approx(160.0)
+    assert height_to_cm(175) == 175.0
+
+
+def test_stored_profile_uses_height_in_cm():
+    profile = AnthropometricProfile.from_user_data(STORED_PROFILE)
+    assert profile.height_cm == pytest.approx(175.0)
+
+
+def test_stored_profile_matches_profile_in_cm():
+    in_meters = calculate_from_user_data(STORED_PROFILE)
+    in_cm = calculate_from_user_data(dict(STORED_PROFILE, height=175))
+
+    # Harris-Benedict masculino: 88.362 + 13.397*80 + 4.799*175 - 5.677*30
+    assert in_meters['tmb_kcal'] == pytest.approx(1829.6, abs=0.1)
+    assert in_meters['tmb_kcal'] == pytest.approx(in_cm['tmb_kcal'])
+    assert in_meters['daily_target_kcal'] == pytest.approx(in_cm['daily_target_kcal'])
@@ -0,0 +1,35 @@
+"""
+Testes do pool de workers do bcrypt
+"""
+
+import threading
+
+from database.password_hasher import PasswordHasher
+
+
+def test_thread_pool_is_default_and_created_eagerly(monkeypatch):
+    monkeypatch.delenv('BCRYPT_EXECUTOR', raising=False)
+    hasher = PasswordHasher(rounds=4, workers=2)
+    try:
+        assert hasher.executor_kind == 'thread'
+        # Pool pronto antes do primeiro login
+        assert hasher._executor is not None
+        password_hash = hasher.hash_password('segredo123')
+        assert hasher.verify_password('segredo123', password_hash)
+        assert not hasher.verify_password('outra', password_hash)
+    finally:
+        hasher.shutdown()
+
+
+def test_process_pool_not_forked_with_background_threads():
+    stop = threading.Event()
+    background = threading.Thread(target=stop.wait, daemon=True)
+    background.start()
+    try:
+        hasher = PasswordHasher(rounds=4, workers=1, executor='process')
+        assert hasher.executor_kind == 'thread'
+        assert hasher.verify_password('segredo123', hasher.hash_password('segredo123'))
+        hasher.shutdown()
+    finally:
+        stop.set()
+        background.join()
@@ -0,0 +1,136 @@
+"""
+Testes do preview especulativo (reaproveitamento só com o mesmo estado da consulta)
+"""
+
+import copy
+from types import SimpleNamespace
+
+import pytest
+
+from utils.speculative_preview import SpeculativePreviewCache
+
+
+def _state(*user_messages):
+    return {
+        'consultation_id': 'c1',
+        'user_data': {'weight': 80, 'height': 1.75},
+        'conversation_history': [{'role': 'user', 'message': message} for message in user_messages],
+    }
+
+
+def _preview(state):
+    return {'messages': [msg['message'] for msg in state['conversation_history']]}
+
+
+def test_preview_reused_when_state_unchanged():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h', 'gosto de frango')
+    assert cache.speculate('c1', state, _preview)
+
+    assert cache.take('c1', copy.deepcopy(state)) == {'messages': ['almoço às 12h', 'gosto de frango']}
+    assert cache.get_metrics()['warm_hits'] + cache.get_metrics()['in_flight_hits'] == 1
+    cache.shutdown()
+
+
+def test_preview_discarded_after_new_user_message():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h', 'gosto de frango')
+    cache.speculate('c1', state, _preview)
+
+    state['conversation_history'].append({'role': 'user', 'message': 'sou alérgico a amendoim'})
+    assert cache.take('c1', state) is None
+    assert cache.get_metrics()['stale'] == 1
+    cache.shutdown()
+
+
+def test_preview_discarded_after_profile_change():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h')
+    cache.speculate('c1', state, _preview)
+
+    state['user_data']['weight'] = 75
+    assert cache.take('c1', state) is None
+    cache.shutdown()
+
+
+def test_speculation_restarted_when_state_changes():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h')
+    assert cache.speculate('c1', state, _preview)
+    assert not cache.speculate('c1', state, _preview)
+
+    state['conversation_history'].append({'role': 'user', 'message': 'sem lactose'})
+    assert cache.speculate('c1', state, _preview)
+    assert cache.take('c1', state) == {'messages': ['almoço às 12h', 'sem lactose']}
+    cache.shutdown()
+
+
+def _changes_inputs(message):
+    return 'alérgico' in message
+
+
+def test_preview_reused_after_confirmation_message():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h', 'gosto de frango')
+    cache.speculate('c1', state, _preview, _changes_inputs)
+
+    state['conversation_history'].append({'role': 'user', 'message': 'pode montar a dieta'})
+    state['conversation_history'].append({'role': 'assistant', 'message': 'Aqui está o preview'})
+    assert not cache.speculate('c1', state, _preview, _changes_inputs)
+    assert cache.take('c1', state, _changes_inputs) == {'messages': ['almoço às 12h', 'gosto de frango']}
+    cache.shutdown()
+
+
+def test_preview_discarded_when_new_message_changes_inputs():
+    cache = SpeculativePreviewCache(enabled=True)
+    state = _state('almoço às 12h')
+    cache.speculate('c1', state, _preview, _changes_inputs)
+
+    state['conversation_history'].append({'role': 'user', 'message': 'sou alérgico a amendoim'})
+    assert cache.take('c1', state, _changes_inputs) is None
+    cache.shutdown()
+
+
+def test_consultation_turns_reuse_speculative_preview(monkeypatch):
+    pytest.importorskip('langchain_core')
+    pytest.importorskip('langchain_openai')
+    from core.agents.nutritionist_agent import NutritionistAgent
+    from utils.keyword_matcher import KeywordMatcher
+
+    keyword_groups = {
+        'routine_info': ['almoço'],
+        'preference_info': ['gosta', 'fruta'],
+        'context_info': ['tempo'],
+    }
+    agent = NutritionistAgent.__new__(NutritionistAgent)
+    agent.config = SimpleNamespace(system_prompt='', keyword_groups=keyword_groups)
+    agent.keyword_matcher = KeywordMatcher(keyword_groups)
+    agent.llm = SimpleNamespace(invoke=lambda messages: SimpleNamespace(content='Entendi!'))
+    agent.preview_speculation = SpeculativePreviewCache(enabled=True)
+
+    generated = []
+
+    def generate_preview(state):
+        generated.append(len(state['conversation_history']))
+        return {'meals': []}
+
+    agent._generate_diet_preview = generate_preview
+    agent._format_diet_preview_response = lambda preview: 'Preview da dieta'
+
+    state = {
+        'consultation_id': 'c1',
+        'user_data': {'weight': 80, 'height': 1.75},
+        'conversation_history': [{'role': role, 'message': 'oi'} for role in ('assistant', 'user') * 4],
+    }
+    # Turno com rotina, preferências e contexto: a especulação começa
+    agent.continue_structured_consultation(state, 'No almoço gosto de fruta, tenho pouco tempo')
+    assert not state.get('ready_for_diet_preview')
+    # Turno de confirmação: o preview especulativo é reaproveitado
+    agent.continue_structured_consultation(state, 'Pode montar, por favor')
+
+    assert state['ready_for_diet_preview']
+    assert state['diet_preview'] == {'meals': []}
+    assert generated == [10]
+    metrics = agent.preview_speculation.get_metrics()
+    assert metrics['warm_hits'] + metrics['in_flight_hits'] == 1
+    agent.preview_speculation.shutdown()
@@ -0,0 +1,262 @@
+"""
+Pré-aquecimento do cache de alimentos
+Resolve em segundo plano o vocabulário de alimentos usado com frequência (tabela de aliases,
+alimentos comuns do assistente diário, substituições e ingredientes das listas de compras),
+respeitando o limite de taxa da API USDA, e sinaliza quando o cache está pronto
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional
+
+import yaml
+from dotenv import load_dotenv
+
+# fcntl é opcional (POSIX): com ele, só um processo por máquina executa cada rodada
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+from utils.food_names import get_food_name_resolver
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DAILY_ASSISTANT_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'agents', 'daily_assistant.yaml'
+)
+
+
+def prewarm_enabled(nutrition_api: Any) -> bool:
+    """
+    FOOD_PREWARM_ENABLED (desativado por padrão); nunca com a DEMO_KEY do USDA,
+    cujo limite (30 requisições/hora) não comporta o vocabulário comum
+    """
+    if os.getenv('FOOD_PREWARM_ENABLED', 'False').lower() not in ('1', 'true', 'yes', 'on'):
+        return False
+    if getattr(nutrition_api, 'usda_api_key', 'DEMO_KEY') == 'DEMO_KEY':
+        logger.warning("Pré-aquecimento do cache de alimentos desativado: a DEMO_KEY do USDA "
+                       "permite apenas 30 requisições/hora")
+        return False
+    return True
+
+
+def collect_common_vocabulary() -> List[str]:
+    """Reúne os alimentos usados com frequência pelas várias partes do sistema (sem duplicatas canônicas)"""
+    foods: List[str] = list(get_food_name_resolver().usda_names())
+
+    # Alimentos comuns do assistente diário (keyword_groups.common_foods)
+    try:
+        with open(DAILY_ASSISTANT_CONFIG, 'r', encoding='utf-8') as f:
+            config_data = yaml.safe_load(f) or {}
+        foods.extend((config_data.get('keyword_groups') or {}).get('common_foods') or [])
+    except (OSError, yaml.YAMLError) as e:
+        logger.warning(f"Não foi possível ler os alimentos comuns do assistente diário: {e}")
+
+    # Ingredientes das listas de compras
+    try:
+        from utils.diet_manager.diet_storage import INGREDIENT_MATCHER
+        for keywords in INGREDIENT_MATCHER.groups.values():
+            foods.extend(keywords)
+    except Exception as e:
+        logger.warning(f"Ingredientes do gerenciador de dietas indisponíveis: {e}")
+
+    # Alimentos e substitutos da base de substituições
+    try:
+        from core.agents.daily_assistant_agent import SUBSTITUTION_DATABASE
+        for original, substitutions in SUBSTITUTION_DATABASE.items():
+            foods.append(original)
+            foods.extend(item['substitute'] for item in substitutions)
+    except Exception as e:
+        logger.warning(f"Base de substituições indisponível: {e}")
+
+    return list(get_food_name_resolver().unique(foods).values())
+
+
+class CachePrewarmer:
+    """Job (na inicialização ou periódico) que resolve o vocabulário comum para o cache de alimentos"""
+
+    def __init__(self, nutrition_api: Any, foods: Optional[Iterable[str]] = None,
+                 interval_seconds: Optional[float] = None):
+        self.nutrition_api = nutrition_api
+        self._foods = list(foods) if foods is not None else None
+        # 0 = apenas uma vez na inicialização
+        self.interval_seconds = interval_seconds if interval_seconds is not None else float(
+            os.getenv('FOOD_PREWARM_INTERVAL_SECONDS', '0'))
+        self.chunk_size = int(os.getenv('FOOD_PREWARM_CHUNK_SIZE', '10'))
+        self.max_attempts = int(os.getenv('FOOD_PREWARM_MAX_ATTEMPTS', '3'))
+        self.retry_pause_seconds = float(os.getenv('FOOD_PREWARM_RETRY_PAUSE_SECONDS', '60'))
+
+        # Sinal de prontidão: definido ao final da primeira rodada completa
+        self.ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._status: Dict[str, Any] = {
+            'state': 'idle',
+            'runs': 0,
+            'total': 0,
+            'already_cached': 0,
+            'warmed': 0,
+            'not_found': 0,
+            'failed': 0,
+            'last_started_at': None,
+            'last_duration_seconds': None
+        }
+
+    def start(self) -> bool:
+        """Inicia o job em uma thread de segundo plano (uma única vez)"""
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self._run_loop, name='food-cache-prewarm', daemon=True)
+            self._thread.start()
+        logger.info("🔥 Pré-aquecimento do cache de alimentos iniciado")
+        return True
+
+    def stop(self):
+        """Interrompe o job na próxima pausa"""
+        self._stop.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda a primeira rodada terminar"""
+        return self.ready.wait(timeout)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Estado atual e contadores da última rodada"""
+        with self._lock:
+            status = dict(self._status)
+        status['ready'] = self.ready.is_set()
+        return status
+
+    def _update_status(self, **values: Any):
+        with self._lock:
+            self._status.update(values)
+
+    def _run_loop(self):
+        """Executa a rodada inicial e, se configurado, repete a cada interval_seconds"""
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Erro no pré-aquecimento do cache de alimentos: {e}")
+                self._update_status(state='failed')
+            finally:
+                # Mesmo com falhas, o sistema segue disponível (as buscas caem para a API sob demanda)
+                self.ready.set()
+
+            if self.interval_seconds <= 0 or self._stop.wait(self.interval_seconds):
+                break
+
+    def _needs_warming(self, food_name: str) -> bool:
+        """
+        Alimentos do índice local FDC ou já válidos no cache (inclusive negativos) não geram requisições
+        (as buscas resolvidas pelo índice local não passam pelo cache)
+        """
+        local_index = getattr(self.nutrition_api, 'local_index', None)
+        if local_index is not None:
+            try:
+                if local_index.search(self.nutrition_api.food_names.usda_name(food_name)):
+                    return False
+            except Exception as e:
+                logger.warning(f"Erro no índice local FDC para '{food_name}': {e}")
+
+        cache_key = self.nutrition_api.food_names.canonical(food_name)
+        entry = self.nutrition_api.food_cache.get_entry(cache_key, allow_stale=False)
+        return entry is None
+
+    def _acquire_process_lock(self) -> Optional[Any]:
+        """
+        Trava entre processos (arquivo ao lado do cache em disco): com vários workers,
+        apenas um executa a rodada; os demais usam o cache compartilhado que ele preenche.
+        Retorna o arquivo travado, True quando não há como travar, ou None se outro processo já está na rodada
+        """
+        if not FCNTL_AVAILABLE:
+            return True
+        lock_path = f"{self.nutrition_api.food_cache.db_path}.prewarm.lock"
+        try:
+            directory = os.path.dirname(lock_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handle = open(lock_path, 'w')
+        except OSError as e:
+            logger.warning(f"Trava do pré-aquecimento indisponível ({lock_path}): {e}")
+            return True
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def run_once(self) -> Dict[str, Any]:
+        """Uma rodada, executada por um único processo de cada vez"""
+        lock = self._acquire_process_lock()
+        if lock is None:
+            self._update_status(state='skipped')
+            logger.info("🔥 Pré-aquecimento já em andamento em outro processo; rodada ignorada")
+            return self.get_status()
+        try:
+            status = self._run_pass()
+        finally:
+            if lock is not True:
+                lock.close()
+        # Alimentos recém-aquecidos entram no índice de similaridade aqui, fora das requisições
+        refresh_similarity = getattr(self.nutrition_api, 'refresh_similarity_index', None)
+        if refresh_similarity is not None and not self._stop.is_set():
+            try:
+                refresh_similarity()
+            except Exception as e:
+                logger.warning(f"Erro ao reconstruir o índice de similaridade: {e}")
+        return status
+
+    def _run_pass(self) -> Dict[str, Any]:
+        """Busca em lotes pequenos os alimentos ausentes do cache, com novas tentativas"""
+        started = time.monotonic()
+        foods = self._foods if self._foods is not None else collect_common_vocabulary()
+        pending = [food_name for food_name in foods if self._needs_warming(food_name)]
+
+        self._update_status(
+            state='running', total=len(foods), already_cached=len(foods) - len(pending),
+            warmed=0, not_found=0, failed=0, last_started_at=time.strftime('%Y-%m-%dT%H:%M:%S')
+        )
+        logger.info(f"🔥 Pré-aquecimento: {len(foods)} alimentos, {len(pending)} fora do cache")
+
+        warmed = not_found = 0
+        for attempt in range(1, self.max_attempts + 1):
+            retry: List[str] = []
+            for start in range(0, len(pending), self.chunk_size):
+                if self._stop.is_set():
+                    return self.get_status()
+                # Lotes pequenos: o limitador de taxa é compartilhado com as buscas dos usuários
+                result = self.nutrition_api.search_foods_batch(pending[start:start + self.chunk_size])
+                warmed += result.success_count
+                for food_name in result.errors:
+                    # Não encontrado já fica como entrada negativa; o resto (rede, limite de taxa) é repetido
+                    if self._needs_warming(food_name):
+                        retry.append(food_name)
+                    else:
+                        not_found += 1
+                self._update_status(warmed=warmed, not_found=not_found)
+
+            pending = retry
+            if not pending or attempt == self.max_attempts:
+                break
+            logger.info(f"🔥 Pré-aquecimento: {len(pending)} alimentos serão tentados novamente "
+                        f"em {self.retry_pause_seconds:.0f}s")
+            if self._stop.wait(self.retry_pause_seconds):
+                break
+
+        duration = round(time.monotonic() - started, 1)
+        with self._lock:
+            self._status.update(
+                state='ready', failed=len(pending), last_duration_seconds=duration,
+                runs=self._status['runs'] + 1
+            )
+        logger.info(f"✅ Cache de alimentos pré-aquecido em {duration}s: {warmed} buscados, "
+                    f"{not_found} não encontrados, {len(pending)} com falha")
+        return self.get_status()
@@ -3,79 +3,146 @@ Gerenciador de Dietas
 Armazena e gerencia dietas dos usuários
 """
 
-import json
-import sqlite3
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import logging
+import os
+
+import yaml
+
+from database.connection import get_connection_manager
+from database.migrations import run_migrations
+from utils import json_codec
+from utils.json_codec import DietValidationError, decode_diet, encode_diet
+from utils.keyword_matcher import KeywordMatcher
+from utils.nutrient_matrix import compute_totals_for_diets
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'config', 'diet_manager.yaml'
+)
+
+
+def load_keyword_groups(config_path: Optional[str] = None) -> Dict[str, List[str]]:
+    """Grupos de palavras-chave do gerenciador de dietas (keyword_groups do YAML)"""
+    config_path = config_path or os.getenv('DIET_MANAGER_CONFIG_PATH', DEFAULT_CONFIG_PATH)
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config_data = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        logger.warning(f"Configuração do gerenciador de dietas não encontrada: {config_path}")
+        return {}
+    except yaml.YAMLError as e:
+        logger.error(f"Erro ao carregar a configuração do gerenciador de dietas ({config_path}): {e}")
+        return {}
+    return config_data.get('keyword_groups') or {}
+
+
+# Ingredientes comuns (keyword_groups.ingredients), compilados uma única vez
+INGREDIENT_MATCHER = KeywordMatcher(load_keyword_groups())
+
+
+def diet_summary(diet_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos promovidos a colunas de user_diets (meta calórica diária e caminho do PDF)"""
+    calculations = diet_data.get('nutritional_calculations') or {}
+    plan = diet_data.get('nutrition_plan') or {}
+    target = calculations.get('daily_target_kcal', plan.get('daily_calories'))
+    try:
+        target = float(target) if target is not None else None
+    except (TypeError, ValueError):
+        target = None
+    return {'daily_target_kcal': target, 'pdf_path': diet_data.get('pdf_path')}
+
+
+def _decode_stored_diet(raw_data: str) -> Dict[str, Any]:
+    """Decodifica a dieta gravada; documentos antigos fora do esquema são lidos mesmo assim"""
+    try:
+        return decode_diet(raw_data)
+    except DietValidationError as e:
+        logger.warning(f"Dieta gravada fora do esquema: {e}")
+        return json_codec.loads(raw_data)
+
+
+class StoredDiet(dict):
+    """
+    Dieta lida do banco: as colunas de resumo ficam disponíveis de imediato e o JSON completo
+    ('data') só é decodificado quando algum chamador acessa o plano
+    """
+
+    def __init__(self, raw_data: str, **summary: Any):
+        super().__init__(**summary)
+        self._raw_data = raw_data
+
+    @property
+    def data_loaded(self) -> bool:
+        return dict.__contains__(self, 'data')
+
+    def _load(self):
+        if not self.data_loaded:
+            dict.__setitem__(self, 'data', _decode_stored_diet(self._raw_data))
+            self._raw_data = None
+
+    def __missing__(self, key):
+        if key == 'data':
+            self._load()
+            return dict.__getitem__(self, 'data')
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == 'data':
+            return self['data']
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        return key == 'data' or super().__contains__(key)
+
+    def __bool__(self):
+        # Sempre há colunas de resumo; "if diet:" não deve decodificar o plano
+        return True
+
+    # Acesso ao dicionário inteiro (iteração, serialização) decodifica o plano antes
+    def __iter__(self):
+        self._load()
+        return super().__iter__()
+
+    def __len__(self):
+        self._load()
+        return super().__len__()
+
+    def keys(self):
+        self._load()
+        return super().keys()
+
+    def values(self):
+        self._load()
+        return super().values()
+
+    def items(self):
+        self._load()
+        return super().items()
+
+    def copy(self):
+        self._load()
+        return dict(super().items())
+
+
 class DietManager:
     """Gerenciador de dietas dos usuários"""
     
     def __init__(self, db_path: str = "database/shapemate.db"):
         self.db_path = db_path
+        self.pool = get_connection_manager(db_path)
         self._init_diet_tables()
     
     def _init_diet_tables(self):
-        """Inicializa tabelas para dietas"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabela de dietas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_diets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                diet_name VARCHAR(200),
-                diet_data TEXT NOT NULL,
-                source VARCHAR(50) DEFAULT 'nutritionist',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT 1,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        # Tabela de listas de compras
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS shopping_lists (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                diet_id INTEGER,
-                list_name VARCHAR(200),
-                items TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_completed BOOLEAN DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (diet_id) REFERENCES user_diets (id)
-            )
-        ''')
-        
-        # Tabela de estoque em casa
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS home_inventory (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                item_name VARCHAR(200) NOT NULL,
-                quantity VARCHAR(50),
-                unit VARCHAR(20),
-                category VARCHAR(100),
-                expiration_date DATE,
-                added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Inicializa tabelas e índices das dietas (migrações versionadas compartilhadas)"""
+        run_migrations(self.pool)
     
     def save_diet(self, user_id: int, diet_data: Dict[str, Any], 
                   diet_name: str = None, source: str = "nutritionist") -> int:
         """Salva uma dieta para o usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -89,11 +156,17 @@ class DietManager:
                     WHERE user_id = ? AND is_active = 1
                 ''', (user_id,))
             
-            # Inserir nova dieta
+            # Inserir nova dieta com as colunas de resumo (versão = próxima do usuário)
+            # Valida e serializa em um único passo (rejeita campos conhecidos com tipo inválido)
+            encoded = encode_diet(diet_data)
+            summary = diet_summary(diet_data)
             cursor.execute('''
-                INSERT INTO user_diets (user_id, diet_name, diet_data, source)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, diet_name, json.dumps(diet_data), source))
+                INSERT INTO user_diets
+                (user_id, diet_name, diet_data, source, daily_target_kcal, pdf_path, size, diet_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?,
+                        (SELECT COALESCE(MAX(diet_version), 0) + 1 FROM user_diets WHERE user_id = ?))
+            ''', (user_id, diet_name, encoded, source, summary['daily_target_kcal'],
+                  summary['pdf_path'], len(encoded.encode('utf-8')), user_id))
             
             diet_id = cursor.lastrowid
             conn.commit()
@@ -106,24 +179,26 @@ class DietManager:
             logger.error(f"Erro ao salvar dieta: {e}")
             raise
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def get_user_diet(self, user_id: int, diet_id: int = None) -> Optional[Dict[str, Any]]:
-        """Obtém a dieta do usuário"""
-        conn = sqlite3.connect(self.db_path)
+        """Obtém a dieta do usuário (o JSON do plano é decodificado só quando 'data' for acessado)"""
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
             if diet_id:
                 cursor.execute('''
-                    SELECT id, diet_name, diet_data, source, created_at, is_active
+                    SELECT id, diet_name, diet_data, source, created_at, is_active,
+                           daily_target_kcal, pdf_path, diet_version, size
                     FROM user_diets 
                     WHERE user_id = ? AND id = ?
                 ''', (user_id, diet_id))
             else:
                 # Pegar dieta ativa
                 cursor.execute('''
-                    SELECT id, diet_name, diet_data, source, created_at, is_active
+                    SELECT id, diet_name, diet_data, source, created_at, is_active,
+                           daily_target_kcal, pdf_path, diet_version, size
                     FROM user_diets 
                     WHERE user_id = ? AND is_active = 1
                     ORDER BY created_at DESC LIMIT 1
@@ -132,14 +207,19 @@ class DietManager:
             result = cursor.fetchone()
             
             if result:
-                return {
-                    'id': result[0],
-                    'name': result[1],
-                    'data': json.loads(result[2]),
-                    'source': result[3],
-                    'created_at': result[4],
-                    'is_active': bool(result[5])
-                }
+                return StoredDiet(
+                    result[2],
+                    id=result[0],
+                    name=result[1],
+                    source=result[3],
+                    created_at=result[4],
+                    is_active=bool(result[5]),
+                    daily_target_kcal=result[6],
+                    pdf_path=result[7],
+                    pdf_generated=bool(result[7]),
+                    diet_version=result[8],
+                    size=result[9]
+                )
             
             return None
             
@@ -147,16 +227,34 @@ class DietManager:
             logger.error(f"Erro ao obter dieta: {e}")
             return None
         finally:
-            conn.close()
+            self.pool.release(conn)
+    
+    def has_active_diet(self, user_id: int) -> bool:
+        """Verifica se o usuário tem dieta ativa sem carregar nenhuma dieta"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT EXISTS (SELECT 1 FROM user_diets WHERE user_id = ? AND is_active = 1)
+            ''', (user_id,))
+            return bool(cursor.fetchone()[0])
+            
+        except Exception as e:
+            logger.error(f"Erro ao verificar dieta ativa: {e}")
+            return False
+        finally:
+            self.pool.release(conn)
     
     def get_user_diet_list(self, user_id: int) -> List[Dict[str, Any]]:
-        """Lista todas as dietas do usuário"""
-        conn = sqlite3.connect(self.db_path)
+        """Lista todas as dietas do usuário (apenas colunas de resumo)"""
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
-                SELECT id, diet_name, source, created_at, is_active
+                SELECT id, diet_name, source, created_at, is_active,
+                       daily_target_kcal, pdf_path, diet_version, size
                 FROM user_diets 
                 WHERE user_id = ?
                 ORDER BY created_at DESC
@@ -169,19 +267,23 @@ class DietManager:
                 'name': row[1],
                 'source': row[2],
                 'created_at': row[3],
-                'is_active': bool(row[4])
+                'is_active': bool(row[4]),
+                'daily_target_kcal': row[5],
+                'pdf_path': row[6],
+                'diet_version': row[7],
+                'size': row[8]
             } for row in results]
             
         except Exception as e:
             logger.error(f"Erro ao listar dietas: {e}")
             return []
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def create_shopping_list(self, user_id: int, diet_id: int = None, 
                            custom_items: List[str] = None) -> int:
         """Cria lista de compras baseada na dieta"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -204,7 +306,7 @@ class DietManager:
             cursor.execute('''
                 INSERT INTO shopping_lists (user_id, diet_id, list_name, items)
                 VALUES (?, ?, ?, ?)
-            ''', (user_id, diet_id, list_name, json.dumps(items)))
+            ''', (user_id, diet_id, list_name, json_codec.dumps(items)))
             
             list_id = cursor.lastrowid
             conn.commit()
@@ -216,7 +318,7 @@ class DietManager:
             logger.error(f"Erro ao criar lista de compras: {e}")
             raise
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def _extract_ingredients_from_diet(self, diet_data: Dict[str, Any]) -> List[str]:
         """Extrai ingredientes da dieta"""
@@ -237,26 +339,13 @@ class DietManager:
     
     def _parse_ingredients_from_text(self, text: str) -> List[str]:
         """Extrai ingredientes de texto livre"""
-        # Lista básica de ingredientes comuns
-        common_ingredients = [
-            'arroz', 'feijão', 'frango', 'carne', 'peixe', 'ovo', 'leite',
-            'pão', 'macarrão', 'batata', 'cenoura', 'alface', 'tomate',
-            'cebola', 'alho', 'azeite', 'sal', 'açúcar', 'farinha',
-            'aveia', 'banana', 'maçã', 'iogurte', 'queijo'
-        ]
-        
-        found_ingredients = []
-        text_lower = text.lower()
-        
-        for ingredient in common_ingredients:
-            if ingredient in text_lower:
-                found_ingredients.append(ingredient.title())
-        
-        return found_ingredients
+        # Uma única passada pelo texto com o autômato compilado
+        found = INGREDIENT_MATCHER.scan(text).get('ingredients', [])
+        return [ingredient.title() for ingredient in found]
     
     def get_shopping_lists(self, user_id: int) -> List[Dict[str, Any]]:
         """Obtém listas de compras do usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -272,7 +361,7 @@ class DietManager:
             return [{
                 'id': row[0],
                 'name': row[1],
-                'items': json.loads(row[2]),
+                'items': json_codec.loads(row[2]),
                 'created_at': row[3],
                 'is_completed': bool(row[4])
             } for row in results]
@@ -281,52 +370,127 @@ class DietManager:
             logger.error(f"Erro ao obter listas de compras: {e}")
             return []
         finally:
-            conn.close()
+            self.pool.release(conn)
     
     def update_inventory_item(self, user_id: int, item_name: str, 
                             quantity: str, unit: str = 'unidade', 
                             category: str = 'geral', expiration_date: str = None):
         """Atualiza item no estoque"""
-        conn = sqlite3.connect(self.db_path)
+        self.bulk_update_inventory(user_id, upserts=[{
+            'item_name': item_name,
+            'quantity': quantity,
+            'unit': unit,
+            'category': category,
+            'expiration_date': expiration_date
+        }])
+
+    def bulk_update_inventory(self, user_id: int, upserts: List[Dict[str, Any]] = None,
+                              deletes: List[str] = None) -> Dict[str, int]:
+        """
+        Adiciona/atualiza e remove vários itens do estoque em uma única transação
+        (ex.: uma compra de supermercado inteira em uma requisição)
+
+        Args:
+            user_id: ID do usuário
+            upserts: Itens com item_name, quantity e, opcionalmente, unit, category e
+                     expiration_date; um item já existente com o mesmo nome é atualizado
+            deletes: Nomes dos itens a remover (aplicados antes dos upserts)
+
+        Returns:
+            Quantidade de itens gravados e removidos
+        """
+        upsert_rows = [(
+            user_id,
+            item['item_name'],
+            item.get('quantity'),
+            item.get('unit') or 'unidade',
+            item.get('category') or 'geral',
+            item.get('expiration_date')
+        ) for item in upserts or []]
+        delete_rows = [(user_id, item_name) for item_name in deletes or []]
+
+        conn = self.pool.acquire()
         cursor = conn.cursor()
-        
+
         try:
-            # Verificar se item já existe
-            cursor.execute('''
-                SELECT id FROM home_inventory 
-                WHERE user_id = ? AND item_name = ?
-            ''', (user_id, item_name))
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Atualizar existente
-                cursor.execute('''
-                    UPDATE home_inventory 
-                    SET quantity = ?, unit = ?, category = ?, 
-                        expiration_date = ?, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (quantity, unit, category, expiration_date, existing[0]))
-            else:
-                # Inserir novo
-                cursor.execute('''
-                    INSERT INTO home_inventory 
+            deleted = 0
+            if delete_rows:
+                cursor.executemany('''
+                    DELETE FROM home_inventory
+                    WHERE user_id = ? AND item_name = ?
+                ''', delete_rows)
+                deleted = cursor.rowcount
+
+            if upsert_rows:
+                # Conflito resolvido pelo índice único idx_home_inventory_user_item
+                cursor.executemany('''
+                    INSERT INTO home_inventory
                     (user_id, item_name, quantity, unit, category, expiration_date)
                     VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, item_name, quantity, unit, category, expiration_date))
-            
+                    ON CONFLICT (user_id, item_name) DO UPDATE SET
+                        quantity = excluded.quantity,
+                        unit = excluded.unit,
+                        category = excluded.category,
+                        expiration_date = excluded.expiration_date,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', upsert_rows)
+
             conn.commit()
-            
+            return {'upserted': len(upsert_rows), 'deleted': deleted}
+
         except Exception as e:
             conn.rollback()
             logger.error(f"Erro ao atualizar estoque: {e}")
             raise
         finally:
-            conn.close()
+            self.pool.release(conn)
     
+    def recompute_nutrition_totals(self, user_id: int = None) -> int:
+        """
+        Recalcula os totais nutricionais (refeição, dia e semana) das dietas salvas
+        Todas as dietas são processadas juntas com uma única matriz de nutrientes
+        """
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+
+        try:
+            if user_id is None:
+                cursor.execute('SELECT id, diet_data FROM user_diets')
+            else:
+                cursor.execute('SELECT id, diet_data FROM user_diets WHERE user_id = ?', (user_id,))
+
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+
+            diets = [_decode_stored_diet(row[1]) for row in rows]
+            all_totals = compute_totals_for_diets(diets)
+
+            updates = []
+            for (diet_id, _), diet_data, totals in zip(rows, diets, all_totals):
+                diet_data['nutrition_totals'] = totals
+                encoded = encode_diet(diet_data)
+                updates.append((encoded, len(encoded.encode('utf-8')), diet_id))
+
+            cursor.executemany('''
+                UPDATE user_diets SET diet_data = ?, size = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            ''', updates)
+            conn.commit()
+
+            logger.info(f"Totais nutricionais recalculados para {len(updates)} dietas")
+            return len(updates)
+
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Erro ao recalcular totais nutricionais: {e}")
+            raise
+        finally:
+            self.pool.release(conn)
+
     def get_inventory(self, user_id: int) -> List[Dict[str, Any]]:
         """Obtém estoque do usuário"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
         
         try:
@@ -352,7 +516,7 @@ class DietManager:
             logger.error(f"Erro ao obter estoque: {e}")
             return []
         finally:
-            conn.close()
+            self.pool.release(conn)
 
 # Instância global
 diet_manager = DietManager()
@@ -0,0 +1,348 @@
+"""
+Índice local do USDA FoodData Central
+Importa os CSVs de download em massa (Foundation / SR Legacy) para um SQLite com FTS5
+e responde buscas de alimentos sem depender da rede
+
+Uso:
+    python -m utils.fdc_local_index import <pasta_csv> [<pasta_csv> ...] [--db caminho.db]
+    python -m utils.fdc_local_index search "chicken breast" [--db caminho.db]
+"""
+
+import os
+import re
+import csv
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Add project root to path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from utils.keyword_matcher import fold_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'database/fdc_local.db'
+
+# Tipos de dados importados do download em massa
+IMPORTED_DATA_TYPES = ('foundation_food', 'sr_legacy_food')
+
+# Números de nutrientes (nutrient_nbr) mapeados para as colunas da tabela compacta
+NUTRIENT_COLUMNS = {
+    '208': 'calories',
+    '203': 'protein',
+    '205': 'carbs',
+    '204': 'fat',
+    '291': 'fiber',
+    '307': 'sodium',
+    '269': 'sugar',
+    '606': 'saturated_fat',
+    '601': 'cholesterol_mg',
+    '301': 'calcium_mg',
+    '303': 'iron_mg',
+    '304': 'magnesium_mg',
+    '306': 'potassium_mg',
+    '309': 'zinc_mg',
+    '320': 'vitamin_a_ug',
+    '401': 'vitamin_c_mg',
+    '328': 'vitamin_d_ug',
+    '418': 'vitamin_b12_ug',
+    '435': 'folate_ug',
+    # Energia pelos fatores de Atwater: substitui calories quando o alimento não informa o 208
+    '958': 'energy_atwater_specific',
+    '957': 'energy_atwater_general',
+}
+ENERGY_FALLBACK_COLUMNS = ('energy_atwater_specific', 'energy_atwater_general')
+
+# Palavras de ligação (português e inglês) que não restringem a busca
+SEARCH_STOPWORDS = frozenset({
+    'de', 'da', 'do', 'das', 'dos', 'com', 'sem', 'e', 'em', 'a', 'o', 'ao', 'na', 'no',
+    'and', 'or', 'with', 'without', 'of', 'in', 'the',
+})
+
+# Linhas acumuladas antes de cada executemany durante a importação
+IMPORT_CHUNK_SIZE = 5000
+
+
+def _read_csv(path: str) -> Iterable[Dict[str, str]]:
+    """Lê um CSV linha a linha (memória limitada)"""
+    with open(path, newline='', encoding='utf-8') as handle:
+        yield from csv.DictReader(handle)
+
+
+class FDCLocalIndex:
+    """Índice SQLite (FTS5 + tabela compacta de nutrientes) do FoodData Central"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv('FDC_LOCAL_DB', DEFAULT_DB_PATH)
+        self._local = threading.local()
+
+    @classmethod
+    def open_if_available(cls, db_path: Optional[str] = None) -> Optional['FDCLocalIndex']:
+        """Abre o índice apenas se o banco já tiver sido importado"""
+        index = cls(db_path)
+        if not os.path.exists(index.db_path):
+            return None
+        try:
+            if index.count_foods() == 0:
+                return None
+        except sqlite3.Error as e:
+            logger.warning(f"Índice local FDC inválido ({index.db_path}): {e}")
+            return None
+        logger.info(f"Índice local FDC disponível: {index.db_path}")
+        return index
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão somente leitura reutilizada por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    # =================== IMPORTAÇÃO ===================
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection):
+        """Cria as tabelas do índice"""
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS foods (
+                fdc_id INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                data_type TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS food_nutrients (
+                fdc_id INTEGER PRIMARY KEY REFERENCES foods(fdc_id),
+                %s
+            );
+
+            CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+                description,
+                content='foods',
+                content_rowid='fdc_id',
+                tokenize='unicode61 remove_diacritics 2'
+            );
+
+            CREATE TABLE IF NOT EXISTS index_metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''' % ',\n                '.join(f'{column} REAL DEFAULT 0' for column in NUTRIENT_COLUMNS.values()))
+
+    def import_csv_dirs(self, csv_dirs: List[str]) -> Dict[str, int]:
+        """
+        Importa um ou mais downloads em massa (pastas com food.csv, nutrient.csv e food_nutrient.csv)
+        O banco é reconstruído em um arquivo temporário e substituído ao final
+        """
+        started = time.monotonic()
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.db_path}.importing"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        conn = sqlite3.connect(tmp_path)
+        stats = {'foods': 0, 'nutrient_values': 0}
+
+        try:
+            conn.execute('PRAGMA journal_mode=OFF')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._create_schema(conn)
+
+            for csv_dir in csv_dirs:
+                nutrient_ids = self._load_nutrient_ids(os.path.join(csv_dir, 'nutrient.csv'))
+                food_ids = self._import_foods(conn, os.path.join(csv_dir, 'food.csv'), stats)
+                self._import_food_nutrients(conn, os.path.join(csv_dir, 'food_nutrient.csv'),
+                                            food_ids, nutrient_ids, stats)
+
+            conn.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+            conn.executemany('INSERT OR REPLACE INTO index_metadata (key, value) VALUES (?, ?)', [
+                ('imported_at', time.strftime('%Y-%m-%dT%H:%M:%S')),
+                ('sources', ';'.join(os.path.abspath(d) for d in csv_dirs)),
+                ('foods', str(stats['foods']))
+            ])
+            conn.commit()
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+
+        os.replace(tmp_path, self.db_path)
+        self._local = threading.local()
+
+        stats['seconds'] = round(time.monotonic() - started, 1)
+        logger.info(f"Índice local FDC importado: {stats}")
+        return stats
+
+    @staticmethod
+    def _load_nutrient_ids(path: str) -> Dict[str, str]:
+        """Mapeia nutrient.id -> coluna da tabela compacta (pelo nutrient_nbr)"""
+        nutrient_ids = {}
+        for row in _read_csv(path):
+            number = (row.get('nutrient_nbr') or '').split('.')[0]
+            column = NUTRIENT_COLUMNS.get(number)
+            if column:
+                nutrient_ids[row['id']] = column
+        return nutrient_ids
+
+    @staticmethod
+    def _import_foods(conn: sqlite3.Connection, path: str, stats: Dict[str, int]) -> set:
+        """Importa food.csv, mantendo apenas os tipos de dados suportados"""
+        food_ids = set()
+        batch: List[Tuple[int, str, str]] = []
+
+        for row in _read_csv(path):
+            if row.get('data_type') not in IMPORTED_DATA_TYPES:
+                continue
+            fdc_id = int(row['fdc_id'])
+            food_ids.add(row['fdc_id'])
+            batch.append((fdc_id, row.get('description', ''), row['data_type']))
+
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                conn.executemany('INSERT OR REPLACE INTO foods VALUES (?, ?, ?)', batch)
+                stats['foods'] += len(batch)
+                batch.clear()
+
+        if batch:
+            conn.executemany('INSERT OR REPLACE INTO foods VALUES (?, ?, ?)', batch)
+            stats['foods'] += len(batch)
+
+        return food_ids
+
+    @staticmethod
+    def _import_food_nutrients(conn: sqlite3.Connection, path: str, food_ids: set,
+                               nutrient_ids: Dict[str, str], stats: Dict[str, int]):
+        """Importa food_nutrient.csv para a tabela compacta (uma linha por alimento)"""
+        batches: Dict[str, List[Tuple[int, float]]] = {column: [] for column in NUTRIENT_COLUMNS.values()}
+
+        def flush(column: str):
+            conn.executemany(
+                f'INSERT INTO food_nutrients (fdc_id, {column}) VALUES (?, ?) '
+                f'ON CONFLICT(fdc_id) DO UPDATE SET {column} = excluded.{column}',
+                batches[column]
+            )
+            stats['nutrient_values'] += len(batches[column])
+            batches[column].clear()
+
+        for row in _read_csv(path):
+            column = nutrient_ids.get(row.get('nutrient_id'))
+            if column is None or row.get('fdc_id') not in food_ids:
+                continue
+            try:
+                amount = float(row.get('amount') or 0)
+            except ValueError:
+                continue
+
+            batches[column].append((int(row['fdc_id']), amount))
+            if len(batches[column]) >= IMPORT_CHUNK_SIZE:
+                flush(column)
+
+        for column in batches:
+            if batches[column]:
+                flush(column)
+
+    # =================== BUSCA ===================
+
+    def count_foods(self) -> int:
+        """Número de alimentos no índice"""
+        return self._connection().execute('SELECT COUNT(*) FROM foods').fetchone()[0]
+
+    def iter_foods(self) -> Iterator[Dict[str, Any]]:
+        """Percorre todos os alimentos do índice com seus nutrientes"""
+        cursor = self._connection().execute('''
+            SELECT f.fdc_id, f.description, f.data_type, n.*
+            FROM foods f
+            JOIN food_nutrients n ON n.fdc_id = f.fdc_id
+        ''')
+        for row in cursor:
+            yield self._row_to_food(row, cursor.description)
+
+    @staticmethod
+    def _row_to_food(row: Tuple, description: Sequence[Tuple]) -> Dict[str, Any]:
+        """Converte uma linha (fdc_id, description, data_type, n.*) no dicionário de resultado"""
+        values = dict(zip((column[0] for column in description[3:]), row[3:]))
+        food = {
+            'fdc_id': row[0],
+            'description': row[1],
+            'data_type': row[2],
+            **{column: values.get(column) or 0 for column in NUTRIENT_COLUMNS.values()}
+        }
+        if not food['calories']:
+            food['calories'] = next((food[column] for column in ENERGY_FALLBACK_COLUMNS if food[column]), 0)
+        return food
+
+    @staticmethod
+    def _fts_query(food_name: str) -> str:
+        """
+        Monta a consulta FTS5 exigindo todos os termos, cada um entre aspas e como prefixo
+        (banana -> bananas); palavras de ligação ("de", "com", "and"...) são ignoradas
+        """
+        tokens = [token for token in re.findall(r'\w+', fold_text(food_name))
+                  if token not in SEARCH_STOPWORDS]
+        return ' AND '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, food_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o alimento mais relevante que contém todos os termos, ou None
+        (sem correspondência completa, a busca segue para o cache e a API do USDA)
+        """
+        query = self._fts_query(food_name)
+        if not query:
+            return None
+
+        # n.* mantém compatibilidade com índices importados antes de novas colunas de nutrientes
+        cursor = self._connection().execute('''
+            SELECT f.fdc_id, f.description, f.data_type, n.*
+            FROM foods_fts
+            JOIN foods f ON f.fdc_id = foods_fts.rowid
+            LEFT JOIN food_nutrients n ON n.fdc_id = f.fdc_id
+            WHERE foods_fts MATCH ?
+            ORDER BY bm25(foods_fts), length(f.description)
+            LIMIT 1
+        ''', (query,))
+        row = cursor.fetchone()
+
+        return self._row_to_food(row, cursor.description) if row else None
+
+
+def main(argv: Optional[List[str]] = None):
+    """Linha de comando: importação e busca no índice local"""
+    parser = argparse.ArgumentParser(description='Índice local do USDA FoodData Central')
+    parser.add_argument('--db', default=None, help=f'Caminho do banco (padrão: FDC_LOCAL_DB ou {DEFAULT_DB_PATH})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Importa pastas de CSV do download em massa')
+    import_parser.add_argument('csv_dirs', nargs='+', help='Pastas com food.csv, nutrient.csv e food_nutrient.csv')
+
+    search_parser = subparsers.add_parser('search', help='Busca um alimento no índice')
+    search_parser.add_argument('food_name')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    index = FDCLocalIndex(args.db)
+
+    if args.command == 'import':
+        stats = index.import_csv_dirs(args.csv_dirs)
+        print(f"✅ {stats['foods']} alimentos e {stats['nutrient_values']} valores de nutrientes "
+              f"importados em {stats['seconds']}s -> {index.db_path}")
+    else:
+        started = time.perf_counter()
+        result = index.search(args.food_name)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if result:
+            print(f"✅ {result['description']} ({result['fdc_id']}): {result['calories']} kcal/100g "
+                  f"[{elapsed_ms:.2f} ms]")
+        else:
+            print(f"❌ Nenhum alimento encontrado para '{args.food_name}'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+"""
+Cache de alimentos em dois níveis para a API USDA
+Memória (LRU por processo) + SQLite em disco compartilhado entre processos, com TTL e limite de tamanho.
+Também guarda resultados negativos (alimento não encontrado) com TTL curto e mantém entradas vencidas
+por uma janela de "stale-while-revalidate", para serem servidas enquanto são atualizadas em segundo plano.
+Cada thread reutiliza sua conexão SQLite; os acessos (last_access) são gravados em lote e o limite de
+tamanho é aplicado periodicamente, e não a cada escrita
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils import json_codec
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Caminho padrão relativo ao projeto (e não ao diretório de trabalho do processo)
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(PROJECT_ROOT, 'database', 'food_cache.db')
+
+
+@dataclass
+class FoodCacheMetrics:
+    """Contadores de uso do cache de alimentos"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    stale_hits: int = 0
+    negative_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte as métricas para dicionário, incluindo a taxa de acerto"""
+        hits = self.memory_hits + self.disk_hits + self.stale_hits
+        lookups = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'stale_hits': self.stale_hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'writes': self.writes,
+            'evictions': self.evictions,
+            'hit_rate': round(hits / lookups, 3) if lookups else 0.0
+        }
+
+
+@dataclass
+class FoodCacheEntry:
+    """Entrada encontrada no cache; value None indica resultado negativo (alimento não encontrado)"""
+    value: Optional[Dict[str, Any]]
+    stale: bool = False
+
+    @property
+    def negative(self) -> bool:
+        return self.value is None
+
+
+class FoodCache:
+    """Cache LRU em memória sobre um armazenamento SQLite compartilhado"""
+
+    def __init__(self, db_path: Optional[str] = None, memory_size: Optional[int] = None,
+                 ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None,
+                 negative_ttl_seconds: Optional[float] = None, stale_seconds: Optional[float] = None):
+        self.db_path = db_path or os.getenv('FOOD_CACHE_PATH', DEFAULT_CACHE_PATH)
+        self.memory_size = memory_size or int(os.getenv('FOOD_CACHE_MEMORY_SIZE', '512'))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(
+            os.getenv('FOOD_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+        self.max_entries = max_entries or int(os.getenv('FOOD_CACHE_MAX_ENTRIES', '20000'))
+        self.negative_ttl_seconds = negative_ttl_seconds if negative_ttl_seconds is not None else float(
+            os.getenv('FOOD_CACHE_NEGATIVE_TTL_SECONDS', '3600'))
+        # Por quanto tempo uma entrada vencida ainda pode ser servida enquanto é atualizada (0 desativa)
+        self.stale_seconds = stale_seconds if stale_seconds is not None else float(
+            os.getenv('FOOD_CACHE_STALE_SECONDS', str(7 * 24 * 3600)))
+
+        # Acessos acumulados antes de gravar last_access em disco (por quantidade ou por tempo)
+        self.access_batch_size = int(os.getenv('FOOD_CACHE_ACCESS_BATCH', '64'))
+        self.access_flush_seconds = float(os.getenv('FOOD_CACHE_ACCESS_FLUSH_SECONDS', '30'))
+        # Limpeza de vencidos e do excesso sobre max_entries a cada N escritas ou T segundos
+        self.prune_every_writes = int(os.getenv('FOOD_CACHE_PRUNE_EVERY', '256'))
+        self.prune_interval_seconds = float(os.getenv('FOOD_CACHE_PRUNE_SECONDS', '600'))
+
+        self.metrics = FoodCacheMetrics()
+        self._memory: 'OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_enabled = True
+        # O arquivo em disco só é criado no primeiro uso (importar o módulo não cria nada)
+        self._store_checked = False
+        self._store_lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}
+        self._last_access_flush = time.monotonic()
+        self._writes_since_prune = 0
+        self._last_prune = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre conexão com o armazenamento em disco"""
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexão reutilizada por thread (fechada junto com a thread)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _store_ready(self) -> bool:
+        """Cria o armazenamento em disco no primeiro uso; False quando o cache está só em memória"""
+        if not self._store_checked:
+            with self._store_lock:
+                if not self._store_checked:
+                    self._init_store()
+                    self._store_checked = True
+        return self._disk_enabled
+
+    def _init_store(self):
+        """Cria a tabela do cache; sem disco disponível, o cache fica apenas em memória"""
+        try:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = self._connect()
+            try:
+                # WAL permite leituras concorrentes de vários processos enquanto um escreve
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS food_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        expires_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_food_cache_last_access ON food_cache(last_access)')
+                conn.commit()
+            finally:
+                conn.close()
+
+        except sqlite3.Error as e:
+            logger.warning(f"Cache de alimentos em disco indisponível ({self.db_path}): {e}")
+            self._disk_enabled = False
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Busca um alimento válido no cache (memória, depois disco); ignora negativos e vencidos"""
+        entry = self.get_entry(key, allow_stale=False)
+        if entry is None or entry.negative:
+            return None
+        return entry.value
+
+    def get_entry(self, key: str, allow_stale: bool = True) -> Optional[FoodCacheEntry]:
+        """
+        Busca uma entrada no cache (memória, depois disco)
+        Com allow_stale, entradas vencidas dentro da janela de stale são retornadas com stale=True
+        """
+        now = time.time()
+        stale_window = self.stale_seconds if allow_stale else 0
+        # Melhor entrada vencida encontrada (valor, expires_at), servida só se o disco não tiver uma válida
+        stale_candidate: Optional[Tuple[Optional[Dict[str, Any]], float]] = None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._pending_access[key] = now
+                    self.metrics.memory_hits += 1
+                    return self._hit_locked(value, stale=False)
+                if expires_at + stale_window > now:
+                    stale_candidate = entry
+                elif expires_at + self.stale_seconds <= now:
+                    del self._memory[key]
+                    self.metrics.expired += 1
+
+        if self._store_ready():
+            try:
+                conn = self._connection()
+                row = conn.execute(
+                    'SELECT data, expires_at FROM food_cache WHERE cache_key = ?', (key,)
+                ).fetchone()
+                if row and row[1] + stale_window > now:
+                    value = json_codec.loads(row[0])
+                    with self._lock:
+                        self._remember_locked(key, value, row[1])
+                        self._pending_access[key] = now
+                    self._maybe_flush_access()
+                    if row[1] > now:
+                        with self._lock:
+                            self.metrics.disk_hits += 1
+                            return self._hit_locked(value, stale=False)
+                    if stale_candidate is None or row[1] > stale_candidate[1]:
+                        stale_candidate = (value, row[1])
+                elif row and row[1] + self.stale_seconds <= now:
+                    conn.execute('DELETE FROM food_cache WHERE cache_key = ?', (key,))
+                    conn.commit()
+                    with self._lock:
+                        self.metrics.expired += 1
+            except sqlite3.Error as e:
+                logger.warning(f"Erro ao ler cache de alimentos em disco: {e}")
+
+        if stale_candidate is not None:
+            with self._lock:
+                self.metrics.stale_hits += 1
+                return self._hit_locked(stale_candidate[0], stale=True)
+
+        with self._lock:
+            self.metrics.misses += 1
+        return None
+
+    def _hit_locked(self, value: Optional[Dict[str, Any]], stale: bool) -> FoodCacheEntry:
+        """Monta a entrada retornada, contando resultados negativos (chamado com o lock adquirido)"""
+        if value is None:
+            self.metrics.negative_hits += 1
+        return FoodCacheEntry(value=value, stale=stale)
+
+    def set(self, key: str, value: Optional[Dict[str, Any]], ttl_seconds: Optional[float] = None):
+        """Armazena um alimento nos dois níveis do cache (value None = resultado negativo)"""
+        now = time.time()
+        if ttl_seconds is None:
+            ttl_seconds = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        expires_at = now + ttl_seconds
+
+        with self._lock:
+            self._remember_locked(key, value, expires_at)
+            self._pending_access.pop(key, None)
+            self.metrics.writes += 1
+            self._writes_since_prune += 1
+            prune = (self._writes_since_prune >= self.prune_every_writes or
+                     time.monotonic() - self._last_prune >= self.prune_interval_seconds)
+            if prune:
+                self._writes_since_prune = 0
+                self._last_prune = time.monotonic()
+
+        if not self._store_ready():
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO food_cache (cache_key, data, created_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, json_codec.dumps(value), now, expires_at, now))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao gravar cache de alimentos em disco: {e}")
+            return
+
+        if prune:
+            self.prune()
+
+    def set_negative(self, key: str, ttl_seconds: Optional[float] = None):
+        """Registra que o alimento não foi encontrado (TTL curto)"""
+        self.set(key, None, ttl_seconds if ttl_seconds is not None else self.negative_ttl_seconds)
+
+    def _remember_locked(self, key: str, value: Optional[Dict[str, Any]], expires_at: float):
+        """Insere no LRU em memória (chamado com o lock adquirido)"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _maybe_flush_access(self):
+        """Grava os acessos pendentes quando o lote enche ou o intervalo de gravação vence"""
+        with self._lock:
+            due = (len(self._pending_access) >= self.access_batch_size or
+                   time.monotonic() - self._last_access_flush >= self.access_flush_seconds)
+        if due:
+            self.flush_access()
+
+    def flush_access(self):
+        """Grava em disco, em uma única transação, o last_access dos acessos pendentes"""
+        with self._lock:
+            pending, self._pending_access = self._pending_access, {}
+            self._last_access_flush = time.monotonic()
+        if not pending or not self._store_ready():
+            return
+
+        try:
+            conn = self._connection()
+            conn.executemany(
+                'UPDATE food_cache SET last_access = MAX(last_access, ?) WHERE cache_key = ?',
+                [(accessed_at, key) for key, accessed_at in pending.items()]
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            # Apenas a ordem de remoção por LRU fica menos precisa
+            logger.warning(f"Erro ao gravar acessos do cache de alimentos: {e}")
+
+    def prune(self):
+        """Aplica a janela de stale e o limite de tamanho do armazenamento em disco"""
+        if not self._store_ready():
+            return
+        # Acessos pendentes primeiro, para não remover entradas lidas recentemente
+        self.flush_access()
+        try:
+            conn = self._connection()
+            self._enforce_size_limit(conn)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Erro ao limpar cache de alimentos em disco: {e}")
+
+    def _enforce_size_limit(self, conn: sqlite3.Connection):
+        """Remove entradas vencidas além da janela de stale e as menos acessadas acima do limite"""
+        removed = conn.execute(
+            'DELETE FROM food_cache WHERE expires_at <= ?', (time.time() - self.stale_seconds,)
+        ).rowcount
+
+        total = conn.execute('SELECT COUNT(*) FROM food_cache').fetchone()[0]
+        if total > self.max_entries:
+            removed += conn.execute('''
+                DELETE FROM food_cache WHERE cache_key IN (
+                    SELECT cache_key FROM food_cache ORDER BY last_access ASC LIMIT ?
+                )
+            ''', (total - self.max_entries,)).rowcount
+
+        if removed:
+            with self._lock:
+                self.metrics.evictions += removed
+
+    def clear(self):
+        """Esvazia os dois níveis do cache"""
+        with self._lock:
+            self._memory.clear()
+
+            self._pending_access.clear()
+
+        if self._store_ready():
+            conn = self._connection()
+            conn.execute('DELETE FROM food_cache')
+            conn.commit()
+
+    def iter_values(self) -> Iterator[Dict[str, Any]]:
+        """Percorre os alimentos armazenados (sem negativos e sem entradas além da janela de stale)"""
+        cutoff = time.time() - self.stale_seconds
+
+        if not self._store_ready():
+            with self._lock:
+                entries = list(self._memory.values())
+            for value, expires_at in entries:
+                if value is not None and expires_at > cutoff:
+                    yield value
+            return
+
+        # Conexão própria: o cursor fica aberto enquanto o chamador percorre os valores
+        conn = self._connect()
+        try:
+            for (data,) in conn.execute(
+                "SELECT data FROM food_cache WHERE expires_at > ? AND data != 'null'", (cutoff,)
+            ):
+                yield json_codec.loads(data)
+        finally:
+            conn.close()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna métricas de acerto e ocupação do cache"""
+        with self._lock:
+            metrics = self.metrics.to_dict()
+            metrics['memory_entries'] = len(self._memory)
+        metrics['disk_enabled'] = self._store_ready()
+
+        if metrics['disk_enabled']:
+            try:
+                metrics['disk_entries'] = self._connection().execute('SELECT COUNT(*) FROM food_cache').fetchone()[0]
+            except sqlite3.Error:
+                metrics['disk_entries'] = None
+
+        return metrics
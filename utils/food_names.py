@@ -0,0 +1,157 @@
+"""
+Normalização canônica de nomes de alimentos
+Grafias diferentes do mesmo alimento ("Frango grelhado", "frango  grelhado", "grilled chicken breast")
+resultam na mesma chave canônica, usada no cache e na deduplicação das buscas na API USDA.
+A tabela de aliases (português → nome USDA) é carregada de config/food_aliases.yaml
+"""
+
+import os
+import re
+import logging
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import yaml
+
+from utils.keyword_matcher import fold_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ALIASES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'food_aliases.yaml'
+)
+
+# Terminações que não indicam plural (hummus, grass...)
+_NON_PLURAL_ENDINGS = ('ss', 'us')
+# Palavras terminadas em "is" que não são plurais (brócolis, lápis...); os demais "-is" são (kiwis, abacaxis)
+_INVARIANT_WORDS = frozenset({'brocolis', 'lapis', 'tenis', 'tennis', 'pires', 'anis', 'chassis', 'pastis'})
+# Plurais portugueses de -al, -el, -ol e -ul (vegetais, pastéis, anzóis, azuis)
+_L_PLURAL_ENDINGS = {'ais': 'al', 'eis': 'el', 'ois': 'ol', 'uis': 'ul'}
+
+# Plurais nasais (feijões, pães -> feijão, pão), tratados antes da remoção dos acentos:
+# sem o til, "feijoes" seria confundido com o plural inglês em -oes (tomatoes)
+_NASAL_PLURAL_PATTERN = re.compile(r'(?:ões|ães)\b')
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def _singularize(token: str) -> str:
+    """Remove o plural regular de uma palavra já normalizada (inglês e português)"""
+    if (len(token) <= 3 or not token.endswith('s') or token.endswith(_NON_PLURAL_ENDINGS)
+            or token in _INVARIANT_WORDS):
+        return token
+    if token.endswith('ies') and len(token) > 4:
+        return token[:-3] + 'y'
+    if token.endswith('oes'):
+        return token[:-2]
+    if len(token) > 4 and token[-3:] in _L_PLURAL_ENDINGS:
+        return token[:-3] + _L_PLURAL_ENDINGS[token[-3:]]
+    return token[:-1]
+
+
+def normalize_food_name(food_name: str) -> str:
+    """Remove acentos, maiúsculas, pontuação, espaços extras e plurais regulares"""
+    text = _NASAL_PLURAL_PATTERN.sub('ão', unicodedata.normalize('NFC', food_name or '').casefold())
+    tokens = _TOKEN_PATTERN.findall(fold_text(text))
+    return ' '.join(_singularize(token) for token in tokens)
+
+
+class FoodNameResolver:
+    """Resolve qualquer grafia de um alimento para sua chave canônica, nome USDA e nome em português"""
+
+    def __init__(self, aliases_path: Optional[str] = None):
+        self.aliases_path = aliases_path or os.getenv('FOOD_ALIASES_PATH', DEFAULT_ALIASES_PATH)
+        # Chave canônica -> (nome USDA, nome em português)
+        self._foods: Dict[str, Dict[str, str]] = {}
+        # Grafia normalizada -> chave canônica
+        self._aliases: Dict[str, str] = {}
+        self._load_aliases()
+
+    def _load_aliases(self):
+        """Carrega a tabela de aliases; sem o arquivo, apenas a normalização é aplicada"""
+        try:
+            with open(self.aliases_path, 'r', encoding='utf-8') as f:
+                config_data = yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            logger.warning(f"Tabela de aliases de alimentos não encontrada: {self.aliases_path}")
+            return
+        except yaml.YAMLError as e:
+            logger.error(f"Erro ao carregar aliases de alimentos ({self.aliases_path}): {e}")
+            return
+
+        for usda_name, entry in (config_data.get('foods') or {}).items():
+            entry = entry or {}
+            canonical = normalize_food_name(usda_name)
+            self._foods[canonical] = {
+                'usda': usda_name,
+                'pt': entry.get('pt') or usda_name.title()
+            }
+            for alias in [usda_name, entry.get('pt', '')] + list(entry.get('aliases') or []):
+                normalized = normalize_food_name(alias)
+                if normalized:
+                    # A primeira definição vence em caso de alias repetido
+                    self._aliases.setdefault(normalized, canonical)
+
+        logger.info(f"Aliases de alimentos carregados: {len(self._foods)} alimentos, {len(self._aliases)} grafias")
+
+    def canonical(self, food_name: str) -> str:
+        """Chave canônica do alimento (usada como chave de cache e de deduplicação)"""
+        normalized = normalize_food_name(food_name)
+        return self._aliases.get(normalized, normalized)
+
+    def usda_name(self, food_name: str) -> str:
+        """Nome a ser consultado na API USDA (inglês quando houver alias)"""
+        entry = self._foods.get(self.canonical(food_name))
+        if entry:
+            return entry['usda']
+        return ' '.join((food_name or '').split())
+
+    def portuguese_name(self, food_name: str) -> str:
+        """Nome do alimento para exibição em português"""
+        entry = self._foods.get(self.canonical(food_name))
+        if entry:
+            return entry['pt']
+        return ' '.join((food_name or '').split()).title()
+
+    def usda_names(self) -> List[str]:
+        """Nomes USDA de todos os alimentos da tabela de aliases"""
+        return [entry['usda'] for entry in self._foods.values()]
+
+    def unique(self, food_names: Iterable[str]) -> Dict[str, str]:
+        """Chave canônica -> primeira grafia encontrada, preservando a ordem"""
+        unique_names: Dict[str, str] = {}
+        for food_name in food_names:
+            canonical = self.canonical(food_name)
+            if canonical:
+                unique_names.setdefault(canonical, food_name)
+        return unique_names
+
+
+_resolver: Optional[FoodNameResolver] = None
+_resolver_lock = threading.Lock()
+
+
+def get_food_name_resolver() -> FoodNameResolver:
+    """Instância compartilhada do resolvedor (a tabela é carregada uma única vez)"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = FoodNameResolver()
+    return _resolver
+
+
+def canonical_food_name(food_name: str) -> str:
+    """Atalho para a chave canônica usando o resolvedor compartilhado"""
+    return get_food_name_resolver().canonical(food_name)
+
+
+def usda_food_name(food_name: str) -> str:
+    """Atalho para o nome de busca na API USDA"""
+    return get_food_name_resolver().usda_name(food_name)
+
+
+def portuguese_food_name(food_name: str) -> str:
+    """Atalho para o nome em português"""
+    return get_food_name_resolver().portuguese_name(food_name)
@@ -0,0 +1,149 @@
+"""
+Índice de similaridade de macronutrientes (KD-tree em memória)
+Cada alimento vira um vetor com a fração das calorias vinda de proteínas, carboidratos e gorduras;
+alimentos próximos nesse espaço são substitutos equivalentes, com porções ajustadas pelas calorias
+"""
+
+import heapq
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from utils.food_names import canonical_food_name
+
+logger = logging.getLogger(__name__)
+
+# kcal por grama de cada macronutriente (fatores de Atwater)
+ATWATER_FACTORS = (4.0, 4.0, 9.0)
+
+Vector = Tuple[float, float, float]
+
+
+def macro_vector(protein_g: float, carbs_g: float, fat_g: float) -> Optional[Vector]:
+    """Fração das calorias de cada macronutriente (proteína, carboidrato, gordura); None sem macros"""
+    energies = [
+        float(grams or 0) * factor
+        for grams, factor in zip((protein_g, carbs_g, fat_g), ATWATER_FACTORS)
+    ]
+    total = sum(energies)
+    if total <= 0:
+        return None
+    return energies[0] / total, energies[1] / total, energies[2] / total
+
+
+def food_vector(food: Any) -> Optional[Vector]:
+    """Vetor de macros de um alimento (FoodData ou objeto com os mesmos atributos)"""
+    return macro_vector(food.protein_g, food.carbs_g, food.fat_g)
+
+
+def _squared_distance(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum((x - y) ** 2 for x, y in zip(a, b))
+
+
+class MacroKDTree:
+    """KD-tree estática sobre vetores de macros (construída uma vez, consultas k-NN)"""
+
+    def __init__(self, points: Sequence[Vector]):
+        self.points = list(points)
+        self.dimensions = len(self.points[0]) if self.points else 0
+        # Nós em listas paralelas: índice do ponto, eixo de corte e filhos (-1 = vazio)
+        self._point: List[int] = []
+        self._axis: List[int] = []
+        self._left: List[int] = []
+        self._right: List[int] = []
+        self._root = self._build(list(range(len(self.points))), 0)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        """Constrói a subárvore pela mediana do eixo corrente; retorna o nó raiz"""
+        if not indices:
+            return -1
+
+        axis = depth % self.dimensions
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+
+        node = len(self._point)
+        self._point.append(indices[middle])
+        self._axis.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+
+        self._left[node] = self._build(indices[:middle], depth + 1)
+        self._right[node] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def query(self, target: Sequence[float], k: int = 1, skip: Optional[Set[int]] = None) -> List[Tuple[float, int]]:
+        """Os k pontos mais próximos como (distância, índice), do mais próximo ao mais distante"""
+        if self._root < 0 or k <= 0:
+            return []
+
+        skip = skip or set()
+        best: List[Tuple[float, int]] = []  # heap máximo via distância negativa
+        stack = [self._root]
+
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+
+            point_index = self._point[node]
+            point = self.points[point_index]
+            if point_index not in skip:
+                distance = _squared_distance(point, target)
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, point_index))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, point_index))
+
+            axis = self._axis[node]
+            delta = target[axis] - point[axis]
+            near, far = (self._left[node], self._right[node]) if delta < 0 else (self._right[node], self._left[node])
+
+            # O lado oposto só é visitado se a esfera de busca cruzar o plano de corte
+            if len(best) < k or delta * delta < -best[0][0]:
+                stack.append(far)
+            stack.append(near)
+
+        return sorted(((-distance) ** 0.5, index) for distance, index in best)
+
+
+class FoodSimilarityIndex:
+    """Alimentos indexados pelo perfil de macros para substituições e porções equivalentes"""
+
+    def __init__(self, foods: Iterable[Any]):
+        self.foods: List[Any] = []
+        vectors: List[Vector] = []
+        self._by_name: Dict[str, int] = {}
+
+        for food in foods:
+            vector = food_vector(food)
+            if vector is None or not food.calories_per_100g:
+                continue
+            key = canonical_food_name(food.name)
+            if key in self._by_name:
+                continue
+            self._by_name[key] = len(self.foods)
+            self.foods.append(food)
+            vectors.append(vector)
+
+        self.tree = MacroKDTree(vectors)
+        logger.info(f"Índice de similaridade de alimentos: {len(self.foods)} alimentos")
+
+    def __len__(self) -> int:
+        return len(self.foods)
+
+    def find(self, food_name: str) -> Optional[Any]:
+        """Alimento indexado com o mesmo nome canônico"""
+        position = self._by_name.get(canonical_food_name(food_name))
+        return self.foods[position] if position is not None else None
+
+    def nearest(self, vector: Vector, k: int = 3, exclude: Iterable[str] = ()) -> List[Tuple[Any, float]]:
+        """Os k alimentos de perfil de macros mais próximo do vetor, com a distância"""
+        skip = {self._by_name[key] for key in map(canonical_food_name, exclude) if key in self._by_name}
+        return [(self.foods[index], distance) for distance, index in self.tree.query(vector, k, skip)]
+
+    @staticmethod
+    def equivalent_grams(food: Any, grams: float, substitute: Any) -> float:
+        """Porção do substituto com as mesmas calorias da porção original"""
+        if not substitute.calories_per_100g:
+            return 0.0
+        return grams * food.calories_per_100g / substitute.calories_per_100g
@@ -0,0 +1,312 @@
+"""
+Codec JSON único do ShapeMateAI
+Usa orjson ou msgspec quando instalados e cai para o módulo json da biblioteca padrão.
+Também define o esquema do documento de dieta (DietDocument, com refeições, alimentos e totais).
+Com msgspec, a dieta é decodificada e validada em um único passo para Structs gerados do esquema;
+sem ele, o mesmo esquema aninhado é validado em Python
+"""
+
+import os
+import json
+import logging
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, TypedDict, Union, get_args, get_origin, get_type_hints
+
+logger = logging.getLogger(__name__)
+
+# orjson e msgspec são opcionais: sem eles, o json da biblioteca padrão é usado
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+
+
+def _select_backend() -> str:
+    """JSON_CODEC=auto|orjson|msgspec|stdlib; backends ausentes caem para o próximo disponível"""
+    requested = os.getenv('JSON_CODEC', 'auto').lower()
+    available = {'orjson': ORJSON_AVAILABLE, 'msgspec': MSGSPEC_AVAILABLE, 'stdlib': True}
+    if requested in available and available[requested]:
+        return requested
+    if requested not in ('auto', 'stdlib'):
+        logger.warning(f"Codec JSON '{requested}' indisponível; selecionando automaticamente")
+    return next(name for name in ('orjson', 'msgspec', 'stdlib') if available[name])
+
+
+JSON_BACKEND = _select_backend()
+
+if JSON_BACKEND == 'msgspec':
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+
+
+class DietValidationError(ValueError):
+    """Documento de dieta com campos conhecidos de tipo inválido"""
+    pass
+
+
+def _subclass_default(default: Optional[Callable[[Any], Any]]) -> Callable[[Any], Any]:
+    """
+    Conversão das subclasses de dict/list/str/int (ex.: StoredDiet, OrderedDict, enums) pelos seus
+    métodos públicos, como faz o json padrão, em vez da leitura direta do armazenamento interno
+    """
+    def convert(obj: Any) -> Any:
+        if isinstance(obj, Enum):
+            return obj.value
+        if isinstance(obj, dict):
+            return dict(obj.items())
+        if isinstance(obj, (list, tuple)):
+            return list(obj)
+        if isinstance(obj, str):
+            return str(obj)
+        if isinstance(obj, int) and not isinstance(obj, bool):
+            return int(obj)
+        if default is not None:
+            return default(obj)
+        raise TypeError(f"Objeto do tipo {type(obj).__name__} não é serializável em JSON")
+    return convert
+
+
+def _materialize(obj: Any) -> Any:
+    """
+    Copia subclasses de dict/list (ex.: StoredDiet, que decodifica o plano sob demanda) pelos seus
+    métodos públicos: o encoder do msgspec lê o armazenamento interno do dict e pularia o carregamento.
+    Contêineres comuns sem subclasses dentro são devolvidos sem cópia
+    """
+    obj_type = type(obj)
+    if obj_type is dict:
+        copied = None
+        for key, value in obj.items():
+            plain = _materialize(value)
+            if plain is not value:
+                if copied is None:
+                    copied = dict(obj)
+                copied[key] = plain
+        return obj if copied is None else copied
+    if obj_type is list or obj_type is tuple:
+        items = [_materialize(value) for value in obj]
+        return obj if all(a is b for a, b in zip(items, obj)) else items
+    if isinstance(obj, dict):
+        return _materialize(dict(obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return _materialize(list(obj))
+    return obj
+
+
+def dumps_bytes(obj: Any, indent: bool = False, sort_keys: bool = False,
+                default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Serializa para JSON em UTF-8 (acentos preservados, sem escapes \\uXXXX)"""
+    if JSON_BACKEND == 'orjson':
+        # OPT_NON_STR_KEYS: chaves numéricas viram texto, como no json padrão;
+        # datas passam pelo default, como no json padrão (o Flask as formata como data HTTP)
+        option = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+                  | orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_PASSTHROUGH_DATETIME)
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=_subclass_default(default), option=option)
+
+    if JSON_BACKEND == 'msgspec' and not (indent or sort_keys or default):
+        return _msgspec_encoder.encode(_materialize(obj))
+
+    return json.dumps(
+        obj, ensure_ascii=False, indent=2 if indent else None, sort_keys=sort_keys, default=default
+    ).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Serializa para texto JSON"""
+    return dumps_bytes(obj, indent=indent, sort_keys=sort_keys, default=default).decode('utf-8')
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """Desserializa JSON (texto ou bytes); erros levantam ValueError"""
+    if JSON_BACKEND == 'orjson':
+        return orjson.loads(data)
+    if JSON_BACKEND == 'msgspec':
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(data)
+
+
+class _FoodItemName(TypedDict):
+    food: str
+
+
+class FoodItem(_FoodItemName, total=False):
+    """Alimento de uma refeição do weekly_menu (o nome é obrigatório)"""
+    portion: Union[str, float, None]
+    quantity_g: Optional[float]
+
+
+class Meal(TypedDict, total=False):
+    """Refeição do weekly_menu ({dia: {refeição: Meal}})"""
+    target_kcal: Optional[float]
+    foods: List[FoodItem]
+
+
+class NutritionTotals(TypedDict, total=False):
+    """Totais da matriz de nutrientes por refeição, dia, semana e média diária"""
+    meals: Dict[str, Dict[str, Dict[str, float]]]
+    days: Dict[str, Dict[str, float]]
+    week: Dict[str, float]
+    daily_average: Dict[str, float]
+
+
+class DietDocument(TypedDict, total=False):
+    """Documento de dieta gravado em user_diets.diet_data (campos fora do esquema são descartados)"""
+    # Dietas geradas pelo nutricionista
+    generated_at: str
+    diet_id: Union[str, int]
+    patient_info: Dict[str, Any]
+    nutritional_calculations: Dict[str, Any]
+    weekly_menu: Dict[str, Dict[str, Meal]]
+    nutrition_totals: NutritionTotals
+    nutrition_data_source: Dict[str, Any]
+    nutritional_database: Dict[str, Dict[str, Any]]
+    pdf_path: Optional[str]
+    pdf_generated: bool
+    saved_to_database: bool
+    is_active: bool
+    # Dietas enviadas pelo usuário
+    meal_plans: Dict[str, Any]
+    nutrition_plan: Dict[str, Any]
+    recommendations: Dict[str, Any]
+    restrictions: List[Any]
+
+
+def _is_typed_dict(hint: Any) -> bool:
+    return isinstance(hint, type) and issubclass(hint, dict) and hasattr(hint, '__required_keys__')
+
+
+if MSGSPEC_AVAILABLE:
+    _structs: Dict[type, type] = {}
+
+    def _struct_hint(hint: Any) -> Any:
+        """Anotação do esquema -> anotação do msgspec (TypedDicts aninhados viram Structs)"""
+        if _is_typed_dict(hint):
+            return _struct_for(hint)
+        origin = get_origin(hint)
+        if origin is Union:
+            return Union[tuple(_struct_hint(arg) for arg in get_args(hint))]
+        if origin is list:
+            return List[_struct_hint(get_args(hint)[0])]
+        if origin is dict:
+            key, value = get_args(hint)
+            return Dict[key, _struct_hint(value)]
+        return hint
+
+    def _struct_for(typed_dict: type) -> type:
+        """msgspec.Struct equivalente ao TypedDict do esquema (campos opcionais ficam UNSET)"""
+        struct = _structs.get(typed_dict)
+        if struct is None:
+            fields = []
+            for name, hint in get_type_hints(typed_dict).items():
+                hint = _struct_hint(hint)
+                if name in typed_dict.__required_keys__:
+                    fields.append((name, hint))
+                else:
+                    fields.append((name, Union[hint, msgspec.UnsetType], msgspec.UNSET))
+            struct = msgspec.defstruct(typed_dict.__name__, fields, kw_only=True)
+            _structs[typed_dict] = struct
+        return struct
+
+    DIET_STRUCT = _struct_for(DietDocument)
+    _diet_decoder = msgspec.json.Decoder(DIET_STRUCT)
+
+
+def _check_value(value: Any, hint: Any, path: str) -> Any:
+    """Valida (e normaliza) um valor contra a anotação do esquema, como o msgspec faria"""
+    if hint is Any:
+        return value
+    if _is_typed_dict(hint):
+        return _check_fields(value, hint, path)
+
+    origin = get_origin(hint)
+    if origin is Union:
+        for arg in get_args(hint):
+            try:
+                return _check_value(value, arg, path)
+            except DietValidationError:
+                continue
+        raise DietValidationError(f"{path}: tipo inválido ({type(value).__name__})")
+    if origin is list:
+        if not isinstance(value, list):
+            raise DietValidationError(f"{path}: esperado lista, recebido {type(value).__name__}")
+        item_hint = get_args(hint)[0]
+        return [_check_value(item, item_hint, f"{path}[{i}]") for i, item in enumerate(value)]
+    if origin is dict:
+        if not isinstance(value, dict):
+            raise DietValidationError(f"{path}: esperado objeto, recebido {type(value).__name__}")
+        value_hint = get_args(hint)[1]
+        return {key: _check_value(item, value_hint, f"{path}.{key}") for key, item in value.items()}
+
+    if hint is type(None):
+        if value is not None:
+            raise DietValidationError(f"{path}: esperado null, recebido {type(value).__name__}")
+        return None
+    if hint is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise DietValidationError(f"{path}: esperado número, recebido {type(value).__name__}")
+        return float(value)
+    if hint is int and isinstance(value, bool):
+        raise DietValidationError(f"{path}: esperado int, recebido bool")
+    if not isinstance(value, hint):
+        raise DietValidationError(f"{path}: esperado {hint.__name__}, recebido {type(value).__name__}")
+    return value
+
+
+def _check_fields(value: Any, typed_dict: type, path: str) -> Dict[str, Any]:
+    """Valida os campos de um objeto do esquema; campos desconhecidos são descartados"""
+    if not isinstance(value, dict):
+        raise DietValidationError(f"{path}: esperado objeto, recebido {type(value).__name__}")
+    for name in typed_dict.__required_keys__:
+        if name not in value:
+            raise DietValidationError(f"{path}: campo obrigatório '{name}' ausente")
+    return {
+        name: _check_value(value[name], hint, f"{path}.{name}")
+        for name, hint in _SCHEMA_HINTS[typed_dict].items() if name in value
+    }
+
+
+# Anotações do esquema resolvidas uma única vez
+_SCHEMA_HINTS: Dict[type, Dict[str, Any]] = {
+    typed_dict: get_type_hints(typed_dict) for typed_dict in (FoodItem, Meal, NutritionTotals, DietDocument)
+}
+
+
+def validate_diet(document: Any) -> DietDocument:
+    """Valida o documento de dieta inteiro (refeições, alimentos e totais) e o normaliza ao esquema"""
+    if MSGSPEC_AVAILABLE:
+        try:
+            return msgspec.to_builtins(msgspec.convert(document, type=DIET_STRUCT, str_keys=True))
+        except msgspec.ValidationError as e:
+            raise DietValidationError(f"Dieta fora do esquema: {e}") from e
+    return _check_fields(document, DietDocument, '$')
+
+
+def encode_diet(document: DietDocument) -> str:
+    """Valida e serializa o documento de dieta"""
+    return dumps(validate_diet(document))
+
+
+def decode_diet(data: Union[str, bytes]) -> DietDocument:
+    """Desserializa e valida o documento de dieta em um único passo (msgspec) ou pelo mesmo esquema (stdlib)"""
+    if MSGSPEC_AVAILABLE:
+        try:
+            return msgspec.to_builtins(_diet_decoder.decode(data))
+        except msgspec.ValidationError as e:
+            raise DietValidationError(f"Dieta fora do esquema: {e}") from e
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return _check_fields(loads(data), DietDocument, '$')
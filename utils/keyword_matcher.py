@@ -0,0 +1,115 @@
+"""
+Casador de palavras-chave compilado (autômato de Aho-Corasick)
+Encontra todas as palavras-chave de todos os grupos em uma única passada pelo texto,
+ignorando maiúsculas/minúsculas e acentos
+"""
+
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Set, Tuple
+
+
+def fold_text(text: str) -> str:
+    """Normaliza o texto para comparação: remove acentos e ignora maiúsculas/minúsculas"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+class KeywordMatcher:
+    """Autômato de Aho-Corasick sobre grupos nomeados de palavras-chave"""
+
+    def __init__(self, groups: Mapping[str, Iterable[str]]):
+        self.groups: Dict[str, List[str]] = {name: list(keywords or []) for name, keywords in groups.items()}
+
+        # Estado 0 é a raiz; cada estado tem transições, link de falha e saídas (grupo, palavra)
+        self._transitions: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[Tuple[str, str]]] = [[]]
+
+        for group, keywords in self.groups.items():
+            for keyword in keywords:
+                self._add_keyword(group, keyword)
+        self._build_failure_links()
+
+    def _add_keyword(self, group: str, keyword: str):
+        """Insere uma palavra-chave (normalizada) na trie"""
+        folded = fold_text(keyword)
+        if not folded:
+            return
+
+        state = 0
+        for char in folded:
+            next_state = self._transitions[state].get(char)
+            if next_state is None:
+                next_state = len(self._transitions)
+                self._transitions[state][char] = next_state
+                self._transitions.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            state = next_state
+
+        if (group, keyword) not in self._outputs[state]:
+            self._outputs[state].append((group, keyword))
+
+    def _build_failure_links(self):
+        """Calcula os links de falha em largura e propaga as saídas dos sufixos"""
+        queue = deque(self._transitions[0].values())
+
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback and char not in self._transitions[fallback]:
+                    fallback = self._fail[fallback]
+                candidate = self._transitions[fallback].get(char, 0)
+                self._fail[next_state] = candidate if candidate != next_state else 0
+                self._outputs[next_state] = self._outputs[next_state] + self._outputs[self._fail[next_state]]
+
+    def find_all(self, text: str) -> List[Tuple[str, str]]:
+        """Retorna todas as ocorrências (grupo, palavra-chave) na ordem em que aparecem no texto"""
+        matches: List[Tuple[str, str]] = []
+        state = 0
+
+        for char in fold_text(text):
+            while state and char not in self._transitions[state]:
+                state = self._fail[state]
+            state = self._transitions[state].get(char, 0)
+            if self._outputs[state]:
+                matches.extend(self._outputs[state])
+
+        return matches
+
+    def scan(self, text: str) -> Dict[str, List[str]]:
+        """Retorna, por grupo, as palavras-chave distintas encontradas no texto"""
+        found: Dict[str, List[str]] = {}
+        seen: Set[Tuple[str, str]] = set()
+
+        for match in self.find_all(text):
+            if match not in seen:
+                seen.add(match)
+                found.setdefault(match[0], []).append(match[1])
+
+        return found
+
+    def scan_many(self, texts: Iterable[str]) -> Dict[str, List[str]]:
+        """Une os resultados de scan para vários textos (uma passada por texto)"""
+        found: Dict[str, List[str]] = {}
+        for text in texts:
+            for group, keywords in self.scan(text).items():
+                group_keywords = found.setdefault(group, [])
+                group_keywords.extend(k for k in keywords if k not in group_keywords)
+        return found
+
+    def count(self, text: str) -> Dict[str, int]:
+        """Número de palavras-chave distintas de cada grupo presentes no texto"""
+        return {group: len(keywords) for group, keywords in self.scan(text).items()}
+
+    def first_group(self, text: str, priority: Iterable[str]) -> str:
+        """Primeiro grupo da lista de prioridade com alguma ocorrência no texto (ou string vazia)"""
+        found = self.scan(text)
+        for group in priority:
+            if group in found:
+                return group
+        return ''
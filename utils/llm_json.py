@@ -0,0 +1,285 @@
+"""
+Extração e validação de JSON em respostas da LLM
+Percorre os grupos balanceados do texto até encontrar um que seja JSON válido, corrige defeitos
+comuns (vírgulas finais, chaves sem aspas, aspas simples, literais Python) e valida o resultado
+contra um schema simples por handler. Saída truncada é rejeitada em vez de completada
+"""
+
+import json
+import logging
+from typing import Dict, Any, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {'{': '}', '[': ']'}
+_PYTHON_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+
+
+class LLMJSONError(ValueError):
+    """Resposta da LLM sem JSON utilizável ou fora do schema esperado"""
+
+
+def _scan_group(text: str, start: int) -> int:
+    """
+    Varre o grupo aberto em text[start] respeitando strings (inclusive com escapes)
+    Retorna o índice do fechamento, -1 se o texto termina com o grupo aberto (truncado)
+    ou -2 se um fechamento não corresponde à abertura (não é JSON)
+    """
+    stack: List[str] = [_CLOSERS[text[start]]]
+    quote: Optional[str] = None
+    escaped = False
+
+    for index in range(start + 1, len(text)):
+        char = text[index]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+            continue
+
+        if char in ('"', "'"):
+            quote = char
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]':
+            if char != stack[-1]:
+                return -2
+            stack.pop()
+            if not stack:
+                return index
+
+    return -1
+
+
+def _is_cut_off_json(fragment: str) -> bool:
+    """
+    Grupo aberto até o fim do texto que é JSON válido até o corte (o erro de decodificação
+    está no último token), e não uma chave solta seguida de texto livre
+    """
+    repaired = repair_json(fragment).rstrip()
+    try:
+        json.loads(repaired)
+    except json.JSONDecodeError as e:
+        last_separator = max(repaired.rfind(char) for char in ',:[{')
+        return e.pos > last_separator
+    return True
+
+
+def iter_json_candidates(text: str, expected: Optional[str] = None) -> Iterator[str]:
+    """
+    Gera, em ordem, os grupos balanceados do texto (objetos ou listas) candidatos a JSON
+    expected: '{' ou '[' para considerar apenas esse tipo de valor
+    Um grupo aberto até o fim do texto que decodifica como JSON até o corte indica resposta truncada
+    e gera LLMJSONError; se não decodifica (chave solta no texto livre), as aberturas seguintes ainda
+    são tentadas, e o erro de truncamento só é gerado quando nenhum candidato posterior foi aceito
+    """
+    openers = expected if expected else '{['
+    index = 0
+    length = len(text)
+    truncated_at: Optional[int] = None
+
+    while index < length:
+        if text[index] not in openers:
+            index += 1
+            continue
+
+        end = _scan_group(text, index)
+        if end == -1:
+            if _is_cut_off_json(text[index:]):
+                raise LLMJSONError(f"Resposta da LLM truncada: estrutura aberta na posição {index} não foi fechada")
+            if truncated_at is None:
+                truncated_at = index
+        if end < 0:
+            # Chave solta ou colchetes de texto livre: tentar a próxima abertura
+            index += 1
+            continue
+
+        yield text[index:end + 1]
+        index = end + 1
+
+    if truncated_at is not None:
+        raise LLMJSONError(f"Resposta da LLM truncada: estrutura aberta na posição {truncated_at} não foi fechada")
+
+
+def load_json_fragment(fragment: str) -> Any:
+    """Decodifica um fragmento JSON, aplicando as correções locais quando necessário"""
+    try:
+        return json.loads(fragment)
+    except ValueError:
+        pass
+
+    try:
+        value = json.loads(repair_json(fragment))
+    except ValueError as e:
+        raise LLMJSONError(f"JSON inválido mesmo após correções: {e}") from e
+    logger.info("🔧 JSON da LLM corrigido localmente")
+    return value
+
+
+def find_json_value(text: str, expected: Optional[str] = None) -> str:
+    """
+    Retorna o primeiro grupo do texto que é um valor JSON válido (após correções)
+    expected: '{' ou '[' para aceitar apenas esse tipo de valor
+    """
+    for fragment in iter_json_candidates(text, expected):
+        try:
+            load_json_fragment(fragment)
+        except LLMJSONError:
+            continue
+        return fragment
+    raise LLMJSONError("Nenhum valor JSON encontrado na resposta")
+
+
+def repair_json(fragment: str) -> str:
+    """Corrige defeitos comuns de JSON gerado por LLM em uma única passada"""
+    output: List[str] = []
+    length = len(fragment)
+    index = 0
+
+    while index < length:
+        char = fragment[index]
+
+        # Strings: normalizar aspas simples para aspas duplas
+        if char in ('"', "'"):
+            quote = char
+            chunk = ['"']
+            index += 1
+            while index < length and fragment[index] != quote:
+                current = fragment[index]
+                if current == '\\' and index + 1 < length:
+                    following = fragment[index + 1]
+                    # \' não é um escape válido em JSON
+                    chunk.append(following if following == "'" else current + following)
+                    index += 2
+                    continue
+                chunk.append('\\"' if current == '"' else current)
+                index += 1
+            chunk.append('"')
+            output.append(''.join(chunk))
+            index += 1
+            continue
+
+        # Comentários de linha (// ...)
+        if char == '/' and fragment.startswith('//', index):
+            newline = fragment.find('\n', index)
+            index = length if newline < 0 else newline
+            continue
+
+        # Vírgula final antes de fechar objeto ou lista
+        if char in '}]':
+            position = len(output) - 1
+            while position >= 0 and output[position].isspace():
+                position -= 1
+            if position >= 0 and output[position] == ',':
+                del output[position]
+
+        # Identificadores: chaves sem aspas e literais Python
+        if char.isalpha() or char == '_':
+            end = index
+            while end < length and (fragment[end].isalnum() or fragment[end] == '_'):
+                end += 1
+            word = fragment[index:end]
+
+            lookahead = end
+            while lookahead < length and fragment[lookahead].isspace():
+                lookahead += 1
+
+            if lookahead < length and fragment[lookahead] == ':':
+                output.append(f'"{word}"')
+            else:
+                output.append(_PYTHON_LITERALS.get(word, word))
+            index = end
+            continue
+
+        output.append(char)
+        index += 1
+
+    return ''.join(output)
+
+
+def validate_schema(value: Any, schema: Dict[str, Any], path: str = '$') -> Any:
+    """
+    Valida (e normaliza) um valor contra um schema simples:
+    {'type': dict|list|str|int|float|bool, 'properties': {...}, 'required': [...],
+     'items': {...}, 'min_items': n, 'default': valor}
+    Propriedades ausentes recebem o 'default' quando definido
+    """
+    expected_type = schema.get('type')
+
+    if expected_type is float and isinstance(value, int) and not isinstance(value, bool):
+        value = float(value)
+    elif expected_type is str and isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+
+    if expected_type is not None and not isinstance(value, expected_type):
+        raise LLMJSONError(
+            f"{path}: esperado {expected_type.__name__}, recebido {type(value).__name__}"
+        )
+
+    if isinstance(value, dict):
+        properties = schema.get('properties', {})
+        for key in schema.get('required', []):
+            if key not in value:
+                raise LLMJSONError(f"{path}: campo obrigatório '{key}' ausente")
+
+        normalized = dict(value)
+        for key, property_schema in properties.items():
+            if key in normalized and normalized[key] is not None:
+                normalized[key] = validate_schema(normalized[key], property_schema, f"{path}.{key}")
+            elif 'default' in property_schema:
+                default = property_schema['default']
+                normalized[key] = default.copy() if isinstance(default, (dict, list)) else default
+        return normalized
+
+    if isinstance(value, list):
+        item_schema = schema.get('items')
+        items = value
+        if item_schema:
+            items = [validate_schema(item, item_schema, f"{path}[{i}]") for i, item in enumerate(value)]
+        min_items = schema.get('min_items', 0)
+        if len(items) < min_items:
+            raise LLMJSONError(f"{path}: esperado ao menos {min_items} itens, recebido {len(items)}")
+        return items
+
+    if isinstance(value, str):
+        return value.strip()
+
+    return value
+
+
+def parse_llm_json(text: str, schema: Optional[Dict[str, Any]] = None) -> Any:
+    """
+    Extrai, corrige e valida o JSON de uma resposta da LLM
+    Candidatos que não decodificam ou não seguem o schema são ignorados em favor do próximo
+    """
+    if text is None:
+        raise LLMJSONError("Resposta vazia da LLM")
+
+    expected = None
+    if schema and schema.get('type') is dict:
+        expected = '{'
+    elif schema and schema.get('type') is list:
+        expected = '['
+
+    content = text.strip()
+    try:
+        value = json.loads(content)
+    except ValueError:
+        pass
+    else:
+        return validate_schema(value, schema) if schema else value
+
+    last_error: Optional[LLMJSONError] = None
+    for fragment in iter_json_candidates(content, expected):
+        try:
+            value = load_json_fragment(fragment)
+            return validate_schema(value, schema) if schema else value
+        except LLMJSONError as e:
+            last_error = e
+
+    if last_error:
+        raise last_error
+    raise LLMJSONError("Nenhum valor JSON encontrado na resposta")
@@ -0,0 +1,255 @@
+"""
+Matriz de nutrientes (alimentos × nutrientes) para totais de refeições e dietas
+Totais de refeição, dia e semana são calculados como produtos de matrizes com vetores de porções;
+usa NumPy quando disponível e uma implementação em Python puro caso contrário
+"""
+
+import re
+import logging
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# NumPy é opcional: sem ele, os produtos de matrizes são feitos em Python puro
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Campos de FoodData (por 100g) e nomes usados nos totais
+MACRONUTRIENT_FIELDS: Tuple[str, ...] = (
+    'calories_per_100g', 'protein_g', 'carbs_g', 'fat_g',
+    'fiber_g', 'sodium_mg', 'sugar_g', 'saturated_fat_g'
+)
+MICRONUTRIENT_FIELDS: Tuple[str, ...] = (
+    'cholesterol_mg', 'calcium_mg', 'iron_mg', 'magnesium_mg', 'potassium_mg', 'zinc_mg',
+    'vitamin_a_ug', 'vitamin_c_mg', 'vitamin_d_ug', 'vitamin_b12_ug', 'folate_ug'
+)
+NUTRIENT_FIELDS: Tuple[str, ...] = MACRONUTRIENT_FIELDS + MICRONUTRIENT_FIELDS
+TOTAL_KEYS: Tuple[str, ...] = ('calories',) + NUTRIENT_FIELDS[1:]
+
+# Gramas equivalentes por unidade de porção
+PORTION_UNIT_GRAMS: Dict[str, float] = {
+    'g': 1.0,
+    'kg': 1000.0,
+    'mg': 0.001,
+    'ml': 1.0,        # densidade aproximada da água
+    'l': 1000.0,
+    'unidade': 100.0,
+    'unidades': 100.0,
+    'fatia': 25.0,
+    'fatias': 25.0,
+    'colher': 15.0,
+    'colheres': 15.0,
+    'xicara': 120.0,
+    'xícara': 120.0,
+    'copo': 200.0,
+}
+
+DEFAULT_PORTION_GRAMS = 100.0
+
+_PORTION_PATTERN = re.compile(r'^\s*(\d+(?:[.,]\d+)?)?\s*([a-zà-ú]+)?', re.IGNORECASE)
+
+
+def parse_portion_grams(portion: Any) -> float:
+    """Converte uma porção ('150g', '200ml', '1 unidade', 120) em gramas"""
+    if isinstance(portion, (int, float)):
+        return float(portion)
+
+    match = _PORTION_PATTERN.match(str(portion or ''))
+    if not match or not (match.group(1) or match.group(2)):
+        return DEFAULT_PORTION_GRAMS
+
+    amount = float(match.group(1).replace(',', '.')) if match.group(1) else 1.0
+    unit = (match.group(2) or 'g').lower()
+    return amount * PORTION_UNIT_GRAMS.get(unit, DEFAULT_PORTION_GRAMS)
+
+
+def _normalize_name(food_name: str) -> str:
+    return (food_name or '').lower().strip()
+
+
+def _round_totals(values: Sequence[float]) -> Dict[str, float]:
+    return {key: round(float(value), 1) for key, value in zip(TOTAL_KEYS, values)}
+
+
+def build_name_index(food_names: Sequence[str], offset: int = 0) -> Dict[str, int]:
+    """Nome normalizado -> linha da matriz (a primeira ocorrência de cada nome)"""
+    index: Dict[str, int] = {}
+    for position, food_name in enumerate(food_names):
+        index.setdefault(_normalize_name(food_name), offset + position)
+    return index
+
+
+def record_rows(nutritional_database: Dict[str, Any]) -> Tuple[List[str], List[List[float]]]:
+    """Nomes e linhas de nutrientes de {nome: dict ou FoodData}"""
+    names: List[str] = []
+    rows: List[List[float]] = []
+    for food_name, food in nutritional_database.items():
+        getter = food.get if isinstance(food, dict) else (lambda attr, default=0, _f=food: getattr(_f, attr, default))
+        names.append(food_name)
+        rows.append([float(getter(field, 0) or 0) for field in NUTRIENT_FIELDS])
+    return names, rows
+
+
+class NutrientMatrix:
+    """Tabela colunar de nutrientes por 100g, uma linha por alimento"""
+
+    def __init__(self, food_names: List[str], rows: List[List[float]]):
+        self.food_names = food_names
+        self.index = build_name_index(food_names)
+
+        self.matrix = np.array(rows, dtype=float).reshape(len(rows), len(NUTRIENT_FIELDS)) if NUMPY_AVAILABLE else rows
+
+    @classmethod
+    def from_records(cls, nutritional_database: Dict[str, Any]) -> 'NutrientMatrix':
+        """Cria a matriz a partir de {nome: dict ou FoodData}"""
+        return cls(*record_rows(nutritional_database))
+
+    def __len__(self) -> int:
+        return len(self.food_names)
+
+    def row_of(self, food_name: str, index: Optional[Dict[str, int]] = None) -> Optional[int]:
+        """Linha do alimento na matriz (ou None se desconhecido); index restringe a um trecho das linhas"""
+        return (self.index if index is None else index).get(_normalize_name(food_name))
+
+    def portion_vector(self, items: Sequence[Dict[str, Any]],
+                       index: Optional[Dict[str, int]] = None) -> List[float]:
+        """Vetor de porções (gramas/100) de uma refeição: [{'food': nome, 'portion' | 'quantity_g': ...}]"""
+        vector = [0.0] * len(self)
+        for item in items:
+            row = self.row_of(item.get('food', ''), index)
+            if row is None:
+                continue
+            grams = item['quantity_g'] if 'quantity_g' in item else parse_portion_grams(item.get('portion'))
+            vector[row] += float(grams or 0) / 100.0
+        return vector
+
+    def multiply(self, portions: List[List[float]]) -> List[List[float]]:
+        """Produto (refeições × alimentos) · (alimentos × nutrientes)"""
+        if not portions:
+            return []
+        if NUMPY_AVAILABLE:
+            if not len(self):
+                return [[0.0] * len(NUTRIENT_FIELDS) for _ in portions]
+            return (np.asarray(portions, dtype=float) @ self.matrix).tolist()
+
+        result = []
+        for portion_row in portions:
+            totals = [0.0] * len(NUTRIENT_FIELDS)
+            for row, amount in enumerate(portion_row):
+                if amount:
+                    food_row = self.matrix[row]
+                    for column in range(len(NUTRIENT_FIELDS)):
+                        totals[column] += amount * food_row[column]
+            result.append(totals)
+        return result
+
+    def meal_totals(self, items: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+        """Totais de nutrientes de uma única refeição"""
+        return _round_totals(self.multiply([self.portion_vector(items)])[0])
+
+
+def _menu_portions(weekly_menu: Dict[str, Any], matrix: NutrientMatrix,
+                   index: Optional[Dict[str, int]] = None) -> Tuple[List[Tuple[str, str]], List[List[float]]]:
+    """Chaves (dia, refeição) e vetores de porções de todas as refeições de um weekly_menu"""
+    meal_keys: List[Tuple[str, str]] = []
+    portions: List[List[float]] = []
+    for day, meals in (weekly_menu or {}).items():
+        for meal, meal_data in (meals or {}).items():
+            foods = meal_data.get('foods', []) if isinstance(meal_data, dict) else []
+            meal_keys.append((day, meal))
+            portions.append(matrix.portion_vector(foods, index))
+    return meal_keys, portions
+
+
+def _aggregate_menu_totals(meal_keys: List[Tuple[str, str]], meal_values: List[List[float]]) -> Dict[str, Any]:
+    """Agrupa os totais por refeição em totais por dia, da semana e média diária"""
+    totals: Dict[str, Any] = {'meals': {}, 'days': {}, 'week': {}, 'daily_average': {}}
+    day_sums: Dict[str, List[float]] = {}
+    for (day, meal), values in zip(meal_keys, meal_values):
+        totals['meals'].setdefault(day, {})[meal] = _round_totals(values)
+        day_sum = day_sums.setdefault(day, [0.0] * len(NUTRIENT_FIELDS))
+        for column, value in enumerate(values):
+            day_sum[column] += value
+
+    week = [0.0] * len(NUTRIENT_FIELDS)
+    for day, values in day_sums.items():
+        totals['days'][day] = _round_totals(values)
+        for column, value in enumerate(values):
+            week[column] += value
+
+    totals['week'] = _round_totals(week)
+    days_count = len(day_sums) or 1
+    totals['daily_average'] = _round_totals([value / days_count for value in week])
+    return totals
+
+
+def compute_menu_totals(weekly_menu: Dict[str, Any], matrix: NutrientMatrix) -> Dict[str, Any]:
+    """
+    Totais de refeição, dia e semana de um weekly_menu ({dia: {refeição: {'foods': [...]}}})
+    Todas as refeições entram em um único produto de matrizes
+    """
+    meal_keys, portions = _menu_portions(weekly_menu, matrix)
+    return _aggregate_menu_totals(meal_keys, matrix.multiply(portions))
+
+
+def compute_diet_totals(diet_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Totais nutricionais de uma dieta salva (weekly_menu + nutritional_database)"""
+    matrix = NutrientMatrix.from_records(diet_data.get('nutritional_database', {}))
+    return compute_menu_totals(diet_data.get('weekly_menu', {}), matrix)
+
+
+def compute_totals_for_diets(diets: Sequence[Dict[str, Any]], chunk_foods: int = 512) -> List[Dict[str, Any]]:
+    """
+    Recalcula os totais de várias dietas com poucos produtos de matrizes
+    Cada dieta contribui com as linhas do seu próprio nutritional_database (o mesmo alimento em
+    dietas diferentes pode ter valores diferentes). As dietas são agrupadas em blocos de até
+    chunk_foods alimentos; as refeições de cada bloco são empilhadas e multiplicadas de uma vez
+    """
+    results: List[Dict[str, Any]] = []
+    batch: List[Tuple[Dict[str, Any], List[str], List[List[float]]]] = []
+    batch_foods = 0
+    products = 0
+
+    def flush():
+        names: List[str] = []
+        rows: List[List[float]] = []
+        diet_indexes: List[Dict[str, int]] = []
+        for _, diet_names, diet_rows in batch:
+            diet_indexes.append(build_name_index(diet_names, offset=len(names)))
+            names.extend(diet_names)
+            rows.extend(diet_rows)
+        matrix = NutrientMatrix(names, rows)
+
+        diet_meal_keys: List[List[Tuple[str, str]]] = []
+        all_portions: List[List[float]] = []
+        for (diet_data, _, _), diet_index in zip(batch, diet_indexes):
+            meal_keys, portions = _menu_portions(diet_data.get('weekly_menu', {}), matrix, diet_index)
+            diet_meal_keys.append(meal_keys)
+            all_portions.extend(portions)
+
+        all_values = matrix.multiply(all_portions)
+        offset = 0
+        for meal_keys in diet_meal_keys:
+            results.append(_aggregate_menu_totals(meal_keys, all_values[offset:offset + len(meal_keys)]))
+            offset += len(meal_keys)
+
+    for diet_data in diets:
+        diet_names, diet_rows = record_rows(diet_data.get('nutritional_database') or {})
+        if batch and batch_foods + len(diet_names) > chunk_foods:
+            flush()
+            products += 1
+            batch, batch_foods = [], 0
+        batch.append((diet_data, diet_names, diet_rows))
+        batch_foods += len(diet_names)
+
+    if batch:
+        flush()
+        products += 1
+
+    logger.info(f"Matriz de nutrientes: {len(diets)} dietas em {products} produtos de matrizes "
+                f"({'NumPy' if NUMPY_AVAILABLE else 'Python puro'})")
+    return results
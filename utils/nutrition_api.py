@@ -4,30 +4,274 @@ Usa apenas a API oficial do USDA para dados nutricionais precisos
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import time
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
+from array import array
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 
+from utils.food_cache import FoodCache
+from utils.fdc_local_index import FDCLocalIndex
+from utils.food_names import get_food_name_resolver
+from utils.food_similarity import FoodSimilarityIndex, food_vector, macro_vector
+from utils.nutrient_matrix import NutrientMatrix, TOTAL_KEYS, NUTRIENT_FIELDS, MICRONUTRIENT_FIELDS
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Números de nutrientes do FoodData Central mapeados para os campos de FoodData
+USDA_NUTRIENT_NUMBERS = {
+    '208': 'calories_per_100g',  # Energy (kcal)
+    '203': 'protein_g',          # Protein
+    '205': 'carbs_g',            # Carbohydrate, by difference
+    '204': 'fat_g',              # Total lipid (fat)
+    '291': 'fiber_g',            # Fiber, total dietary
+    '307': 'sodium_mg',          # Sodium, Na
+    '269': 'sugar_g',            # Sugars, total
+    '606': 'saturated_fat_g',    # Fatty acids, total saturated
+    '601': 'cholesterol_mg',     # Cholesterol
+    '301': 'calcium_mg',         # Calcium, Ca
+    '303': 'iron_mg',            # Iron, Fe
+    '304': 'magnesium_mg',       # Magnesium, Mg
+    '306': 'potassium_mg',       # Potassium, K
+    '309': 'zinc_mg',            # Zinc, Zn
+    '320': 'vitamin_a_ug',       # Vitamin A, RAE
+    '401': 'vitamin_c_mg',       # Vitamin C, total ascorbic acid
+    '328': 'vitamin_d_ug',       # Vitamin D (D2 + D3)
+    '418': 'vitamin_b12_ug',     # Vitamin B-12
+    '435': 'folate_ug',          # Folate, DFE
+}
+
+# Energia pelos fatores de Atwater (kcal): usada quando o alimento não informa o nutriente 208,
+# como em parte dos Foundation Foods; em ordem de preferência (fatores específicos primeiro)
+USDA_ENERGY_FALLBACK_NUMBERS = ('958', '957')
+
+# Nomes exatos (em minúsculas) -> número do nutriente, para entradas sem o número
+USDA_NUTRIENT_NAMES = {
+    'energy': '208',
+    'energy (atwater specific factors)': '958',
+    'energy (atwater general factors)': '957',
+    'protein': '203',
+    'carbohydrate, by difference': '205',
+    'total lipid (fat)': '204',
+    'fiber, total dietary': '291',
+    'sodium, na': '307',
+    'sugars, total including nlea': '269',
+    'sugars, total': '269',
+    'total sugars': '269',
+    'fatty acids, total saturated': '606',
+    'cholesterol': '601',
+    'calcium, ca': '301',
+    'iron, fe': '303',
+    'magnesium, mg': '304',
+    'potassium, k': '306',
+    'zinc, zn': '309',
+    'vitamin a, rae': '320',
+    'vitamin c, total ascorbic acid': '401',
+    'vitamin d (d2 + d3)': '328',
+    'vitamin b-12': '418',
+    'folate, dfe': '435',
+}
+
+# Requisições por hora permitidas pelo USDA: DEMO_KEY compartilhada e chave registrada
+USDA_DEMO_KEY_RATE_PER_HOUR = 30
+USDA_REGISTERED_KEY_RATE_PER_HOUR = 1000
+
+# Respostas repetidas por _http_request (limite de taxa e falhas temporárias do servidor)
+USDA_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Limite de fdcIds por requisição ao endpoint /foods
+USDA_DETAILS_BATCH_SIZE = 20
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Lê uma flag booleana das variáveis de ambiente"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def default_rate_limit_per_hour(api_key: str) -> int:
+    """Limite padrão do limitador de taxa conforme a chave (30/h com a DEMO_KEY)"""
+    return USDA_DEMO_KEY_RATE_PER_HOUR if api_key == 'DEMO_KEY' else USDA_REGISTERED_KEY_RATE_PER_HOUR
+
+# Posição de cada nutriente no array interno de FoodData
+_FOOD_FIELD_INDEX = {field_name: position for position, field_name in enumerate(NUTRIENT_FIELDS)}
+
+
 class FoodData:
-    """Estrutura padronizada para dados de alimentos"""
-    name: str
-    calories_per_100g: float
-    protein_g: float
-    carbs_g: float
-    fat_g: float
-    fiber_g: float
-    sodium_mg: float
-    sugar_g: float
-    saturated_fat_g: float
-    source: str
-    description: str = ""
+    """
+    Estrutura padronizada para dados de alimentos (valores por 100g)
+    Os nutrientes ficam em um array compacto de doubles, na ordem de NUTRIENT_FIELDS;
+    cada nutriente é acessível como atributo (food.protein_g, food.iron_mg)
+    """
+    __slots__ = ('name', 'source', 'description', '_values')
+
+    def __init__(self, name: str, calories_per_100g: float = 0.0, protein_g: float = 0.0,
+                 carbs_g: float = 0.0, fat_g: float = 0.0, fiber_g: float = 0.0,
+                 sodium_mg: float = 0.0, sugar_g: float = 0.0, saturated_fat_g: float = 0.0,
+                 source: str = "", description: str = "", **micronutrients: float):
+        unknown = set(micronutrients) - set(MICRONUTRIENT_FIELDS)
+        if unknown:
+            raise TypeError(f"Nutrientes desconhecidos para FoodData: {sorted(unknown)}")
+
+        self.name = name
+        self.source = source
+        self.description = description
+        self._values = array('d', [
+            calories_per_100g or 0, protein_g or 0, carbs_g or 0, fat_g or 0,
+            fiber_g or 0, sodium_mg or 0, sugar_g or 0, saturated_fat_g or 0
+        ])
+        self._values.extend(float(micronutrients.get(field_name) or 0) for field_name in MICRONUTRIENT_FIELDS)
+
+    @property
+    def micronutrients(self) -> Dict[str, float]:
+        """Micronutrientes (minerais, vitaminas e colesterol) por 100g"""
+        offset = len(NUTRIENT_FIELDS) - len(MICRONUTRIENT_FIELDS)
+        return dict(zip(MICRONUTRIENT_FIELDS, self._values[offset:]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para dicionário serializável"""
+        data: Dict[str, Any] = {'name': self.name}
+        data.update(zip(NUTRIENT_FIELDS, self._values))
+        data['source'] = self.source
+        data['description'] = self.description
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FoodData':
+        """Cria a partir de um dicionário (ex.: entrada do cache); campos ausentes valem 0"""
+        return cls(
+            name=data.get('name', ''),
+            source=data.get('source', ''),
+            description=data.get('description', ''),
+            **{field_name: data[field_name] for field_name in NUTRIENT_FIELDS if field_name in data}
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FoodData):
+            return NotImplemented
+        return (self.name, self.source, self.description, self._values) == \
+            (other.name, other.source, other.description, other._values)
+
+    def __repr__(self) -> str:
+        return (f"FoodData(name={self.name!r}, calories_per_100g={self.calories_per_100g}, "
+                f"protein_g={self.protein_g}, carbs_g={self.carbs_g}, fat_g={self.fat_g}, source={self.source!r})")
+
+
+def _nutrient_property(position: int) -> property:
+    """Atributo de leitura/escrita sobre uma posição do array de nutrientes"""
+    def getter(self: FoodData) -> float:
+        return self._values[position]
+
+    def setter(self: FoodData, value: float):
+        self._values[position] = float(value or 0)
+
+    return property(getter, setter)
+
+
+for _field_name, _position in _FOOD_FIELD_INDEX.items():
+    setattr(FoodData, _field_name, _nutrient_property(_position))
+
+
+class RateLimitExceeded(RuntimeError):
+    """Limite de requisições da chave USDA atingido além do tempo máximo de espera"""
+
+
+class TokenBucket:
+    """Limitador de taxa (token bucket) thread-safe"""
+    
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate_per_second = rate_per_second
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, max_wait: float) -> float:
+        """Consome um token, aguardando até max_wait segundos; retorna o tempo esperado"""
+        deadline = time.monotonic() + max_wait
+        waited = 0.0
+        
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                
+                wait = (1 - self._tokens) / self.rate_per_second
+            
+            if now + wait > deadline:
+                raise RateLimitExceeded(f"Limite de requisições USDA atingido (espera necessária: {wait:.1f}s)")
+            
+            time.sleep(wait)
+            waited += wait
+
+
+@dataclass
+class HTTPMetrics:
+    """Métricas de latência e reaproveitamento de conexões com a API USDA"""
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    recent_latencies: deque = field(default_factory=lambda: deque(maxlen=256))
+    
+    def record(self, latency: float, failed: bool = False):
+        """Registra uma requisição concluída"""
+        self.requests += 1
+        if failed:
+            self.errors += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.recent_latencies.append(latency)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para dicionário com latência média e percentis recentes"""
+        recent = sorted(self.recent_latencies)
+        
+        def percentile(fraction: float) -> float:
+            return round(recent[min(len(recent) - 1, int(fraction * len(recent)))], 3) if recent else 0.0
+        
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'retries': self.retries,
+            'avg_latency_seconds': round(self.total_latency / self.requests, 3) if self.requests else 0.0,
+            'p50_latency_seconds': percentile(0.5),
+            'p95_latency_seconds': percentile(0.95),
+            'max_latency_seconds': round(self.max_latency, 3)
+        }
+
+
+@dataclass
+class BatchFoodResult:
+    """Resultado parcial de uma busca em lote: alimentos encontrados e erros por item"""
+    foods: Dict[str, FoodData] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    
+    @property
+    def success_count(self) -> int:
+        return len(self.foods)
+    
+    @property
+    def failed(self) -> List[str]:
+        return list(self.errors.keys())
+
 
 class NutritionAPI:
     """Serviço de API de nutrição usando exclusivamente USDA FoodData Central"""
@@ -36,180 +280,649 @@ class NutritionAPI:
         # API USDA FoodData Central (oficial e gratuita)
         self.usda_api_key = os.getenv('USDA_API_KEY', 'DEMO_KEY')
         
-        # Base URL
-        self.usda_base_url = "https://api.nal.usda.gov/fdc/v1"
+        # Base URL (configurável para apontar para um servidor local de testes)
+        self.usda_base_url = os.getenv('USDA_BASE_URL', "https://api.nal.usda.gov/fdc/v1").rstrip('/')
+        
+        # Modo em duas fases: busca só os fdcIds e depois os detalhes em lote, filtrando nutrientes
+        self.two_phase = _env_flag('USDA_TWO_PHASE')
         
-        # Cache local para reduzir chamadas de API
-        self.food_cache = {}
+        # Cache em memória + disco (compartilhado entre processos) para reduzir chamadas de API
+        self.food_cache = FoodCache()
+        self.food_names = get_food_name_resolver()
+        
+        # Atualizações em segundo plano de entradas vencidas (stale-while-revalidate), uma por alimento
+        self._refreshing: set = set()
+        self._refresh_lock = threading.Lock()
+        self.background_refreshes = 0
+        self.background_refresh_errors = 0
+        
+        # Índice de similaridade de macros (cache + índice local), reconstruído periodicamente
+        # em segundo plano (na inicialização e pelo pré-aquecimento), nunca no caminho da requisição
+        self.similarity_refresh_seconds = float(os.getenv('FOOD_SIMILARITY_REFRESH_SECONDS', '600'))
+        self._similarity_index: Optional[FoodSimilarityIndex] = None
+        self._similarity_built_at = 0.0
+        self._similarity_building = False
+        self._similarity_lock = threading.Lock()
+        
+        # Índice local do FoodData Central (opcional; importado com python -m utils.fdc_local_index)
+        self.local_index = FDCLocalIndex.open_if_available()
+        
+        # Limite de taxa da chave USDA (DEMO_KEY: 30/h; chave registrada: 1000/h)
+        rate_per_hour = float(os.getenv('USDA_RATE_LIMIT_PER_HOUR', str(default_rate_limit_per_hour(self.usda_api_key))))
+        self.rate_limiter = TokenBucket(
+            rate_per_second=rate_per_hour / 3600.0,
+            capacity=int(os.getenv('USDA_RATE_LIMIT_BURST', '10'))
+        )
+        self.rate_limit_max_wait = float(os.getenv('USDA_RATE_LIMIT_MAX_WAIT_SECONDS', '30'))
+        
+        # Pool limitado para buscas em lote
+        self.max_workers = int(os.getenv('USDA_MAX_WORKERS', '4'))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        
+        # Sessão HTTP com keep-alive, pool de conexões e gzip
+        self.request_timeout = float(os.getenv('USDA_TIMEOUT_SECONDS', '10'))
+        # Retentativas feitas em _http_request: cada tentativa consome um token do limitador
+        self.max_retries = int(os.getenv('USDA_MAX_RETRIES', '3'))
+        self.retry_backoff = float(os.getenv('USDA_RETRY_BACKOFF', '0.5'))
+        self.session = self._build_session()
+        self.http_metrics = HTTPMetrics()
+        self._metrics_lock = threading.Lock()
         
         logger.info(f"API USDA inicializada com chave: {self.usda_api_key[:10]}...")
     
     def search_food(self, food_name: str) -> Optional[FoodData]:
         """Busca dados de um alimento usando exclusivamente a API USDA"""
         try:
-            # 1. Verificar cache local
-            cache_key = food_name.lower().strip()
-            if cache_key in self.food_cache:
-                logger.info(f"Alimento '{food_name}' encontrado no cache")
-                return self.food_cache[cache_key]
-            
-            # 2. Buscar na API USDA FoodData Central
-            usda_result = self._search_usda_api(food_name)
-            if usda_result:
-                logger.info(f"Alimento '{food_name}' encontrado na API USDA")
-                self.food_cache[cache_key] = usda_result
-                return usda_result
-            
-            logger.warning(f"Alimento '{food_name}' não encontrado na API USDA")
-            return None
-            
+            return self._lookup_food(food_name)
         except Exception as e:
             logger.error(f"Erro ao buscar alimento '{food_name}': {str(e)}")
             return None
     
-    def _search_usda_api(self, food_name: str) -> Optional[FoodData]:
-        """Busca na API do USDA FoodData Central"""
-        try:
-            # Buscar alimentos
-            search_url = f"{self.usda_base_url}/foods/search"
-            params = {
-                'query': food_name,
-                'api_key': self.usda_api_key,
-                'pageSize': 5,
-                'dataType': ['Foundation', 'SR Legacy']
-            }
-            
-            response = requests.get(search_url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            foods = data.get('foods', [])
-            
-            if not foods:
+    def _lookup_food(self, food_name: str) -> Optional[FoodData]:
+        """Busca no índice local, no cache e depois na API; erros de rede e de limite de taxa são propagados"""
+        # Grafias diferentes do mesmo alimento compartilham a chave e o nome de busca
+        cache_key = self.food_names.canonical(food_name)
+        query_name = self.food_names.usda_name(food_name)
+        
+        # 1. Índice local do FoodData Central (sem rede)
+        local_result = self._search_local_index(query_name)
+        if local_result:
+            return local_result
+        
+        # 2. Verificar cache local (inclui resultados negativos e entradas vencidas)
+        cached = self.food_cache.get_entry(cache_key)
+        if cached is not None:
+            if cached.stale:
+                self._schedule_refresh(cache_key, query_name)
+            if cached.negative:
+                logger.info(f"Alimento '{food_name}' marcado como não encontrado no cache")
                 return None
+            logger.info(f"Alimento '{food_name}' encontrado no cache")
+            return FoodData.from_dict(cached.value)
+        
+        # 3. Buscar na API USDA FoodData Central
+        usda_result = self._search_usda_api(query_name)
+        self._store_result(cache_key, usda_result)
+        if usda_result:
+            logger.info(f"Alimento '{food_name}' encontrado na API USDA")
+            return usda_result
+        
+        logger.warning(f"Alimento '{food_name}' não encontrado na API USDA")
+        return None
+    
+    def _store_result(self, cache_key: str, food_data: Optional[FoodData]):
+        """Grava o resultado no cache; alimentos não encontrados viram entradas negativas (TTL curto)"""
+        if food_data:
+            self.food_cache.set(cache_key, food_data.to_dict())
+        else:
+            self.food_cache.set_negative(cache_key)
+    
+    def _schedule_refresh(self, cache_key: str, query_name: str):
+        """Agenda a atualização de uma entrada vencida sem bloquear quem a está lendo"""
+        with self._refresh_lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+        
+        try:
+            self._get_executor().submit(self._refresh_food, cache_key, query_name)
+        except RuntimeError:
+            # Pool já encerrado (fim do processo)
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+    
+    def _refresh_food(self, cache_key: str, query_name: str):
+        """Busca novamente um alimento vencido na API; em caso de erro a entrada vencida é mantida"""
+        try:
+            self._store_result(cache_key, self._search_usda_api(query_name))
+            with self._refresh_lock:
+                self.background_refreshes += 1
+            logger.info(f"Alimento '{query_name}' atualizado em segundo plano")
+        except Exception as e:
+            with self._refresh_lock:
+                self.background_refresh_errors += 1
+            logger.warning(f"Falha ao atualizar '{query_name}' em segundo plano: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+    
+    def _build_session(self) -> requests.Session:
+        """Cria a sessão HTTP reutilizada por todas as buscas na API USDA"""
+        # Sem retentativas no urllib3: abaixo do limitador de taxa elas gastariam a cota sem consumir tokens
+        # Um slot de conexão por worker do pool de buscas em lote
+        adapter = HTTPAdapter(
+            pool_connections=int(os.getenv('USDA_POOL_CONNECTIONS', '2')),
+            pool_maxsize=int(os.getenv('USDA_POOL_MAXSIZE', str(max(self.max_workers, 1)))),
+            max_retries=0
+        )
+        
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+        return session
+    
+    def _retry_delay(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Pausa antes da próxima tentativa: Retry-After (limitado a USDA_RATE_LIMIT_MAX_WAIT_SECONDS) ou backoff exponencial"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = 0.0
+            return min(max(delay, 0.0), self.rate_limit_max_wait)
+        return min(self.retry_backoff * (2 ** (attempt - 1)), self.rate_limit_max_wait)
+    
+    def _http_request(self, method: str, url: str, params: Dict[str, Any],
+                      json_body: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """
+        Requisição à API USDA pela sessão compartilhada, com limite de taxa e registro de latência
+        Erros de conexão e respostas 429/5xx são repetidos até USDA_MAX_RETRIES vezes; cada tentativa
+        passa pelo limitador de taxa. Esgotadas as tentativas, a última resposta é retornada
+        """
+        for attempt in range(self.max_retries + 1):
+            # Respeitar o limite de taxa da chave antes de cada tentativa
+            self.rate_limiter.acquire(self.rate_limit_max_wait)
             
-            # Pegar o primeiro resultado mais relevante
-            food = foods[0]
-            food_nutrients = food.get('foodNutrients', [])
-            
-            # Extrair nutrientes principais
-            nutrients = {}
-            for nutrient in food_nutrients:
-                nutrient_name = nutrient.get('nutrientName', '').lower()
-                nutrient_value = nutrient.get('value', 0)
-                
-                if 'energy' in nutrient_name or 'calorie' in nutrient_name:
-                    nutrients['calories'] = nutrient_value
-                elif 'protein' in nutrient_name:
-                    nutrients['protein'] = nutrient_value
-                elif 'carbohydrate' in nutrient_name and 'by difference' in nutrient_name:
-                    nutrients['carbs'] = nutrient_value
-                elif 'fat' in nutrient_name and 'total' in nutrient_name:
-                    nutrients['fat'] = nutrient_value
-                elif 'fiber' in nutrient_name:
-                    nutrients['fiber'] = nutrient_value
-                elif 'sodium' in nutrient_name:
-                    nutrients['sodium'] = nutrient_value
-                elif 'sugar' in nutrient_name and 'total' in nutrient_name:
-                    nutrients['sugar'] = nutrient_value
-                elif 'saturated' in nutrient_name:
-                    nutrients['saturated_fat'] = nutrient_value
+            response: Optional[requests.Response] = None
+            started = time.monotonic()
+            failed = True
+            try:
+                response = self.session.request(method, url, params=params, json=json_body, timeout=self.request_timeout)
+                failed = response.status_code >= 400
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                with self._metrics_lock:
+                    self.http_metrics.record(time.monotonic() - started, failed)
             
-            return FoodData(
-                name=food.get('description', food_name),
-                calories_per_100g=nutrients.get('calories', 0),
-                protein_g=nutrients.get('protein', 0),
-                carbs_g=nutrients.get('carbs', 0),
-                fat_g=nutrients.get('fat', 0),
-                fiber_g=nutrients.get('fiber', 0),
-                sodium_mg=nutrients.get('sodium', 0),
-                sugar_g=nutrients.get('sugar', 0),
-                saturated_fat_g=nutrients.get('saturated_fat', 0),
-                source="USDA_API",
-                description=f"Dados da API USDA FoodData Central"
-            )
+            if response is not None and (response.status_code not in USDA_RETRY_STATUSES or attempt == self.max_retries):
+                return response
             
+            delay = self._retry_delay(attempt + 1, response)
+            with self._metrics_lock:
+                self.http_metrics.retries += 1
+            logger.warning(f"Requisição USDA falhou ({response.status_code if response is not None else 'conexão'}); "
+                           f"nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+    
+    def get_http_metrics(self) -> Dict[str, Any]:
+        """Retorna latência e taxa de reaproveitamento de conexões da sessão HTTP"""
+        with self._metrics_lock:
+            metrics = self.http_metrics.to_dict()
+        
+        # Contadores do pool do urllib3: conexões abertas vs requisições enviadas
+        connections_opened = 0
+        pooled_requests = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections_opened += pool.num_connections
+                    pooled_requests += pool.num_requests
+        
+        metrics['connections_opened'] = connections_opened
+        metrics['pooled_requests'] = pooled_requests
+        metrics['connection_reuse_rate'] = (
+            round(1 - connections_opened / pooled_requests, 3) if pooled_requests else 0.0
+        )
+        return metrics
+    
+    def _search_local_index(self, food_name: str) -> Optional[FoodData]:
+        """Busca no índice local; falhas do índice caem para a API remota"""
+        if self.local_index is None:
+            return None
+        
+        try:
+            local_food = self.local_index.search(food_name)
         except Exception as e:
-            logger.error(f"Erro na API USDA para '{food_name}': {str(e)}")
+            logger.warning(f"Erro no índice local FDC para '{food_name}': {e}")
+            return None
+        
+        if not local_food:
+            return None
+        
+        logger.info(f"Alimento '{food_name}' encontrado no índice local FDC")
+        return self._food_from_local(local_food)
+    
+    @staticmethod
+    def _food_from_local(local_food: Dict[str, Any]) -> FoodData:
+        """Converte um resultado do índice local em FoodData"""
+        return FoodData(
+            name=local_food['description'],
+            calories_per_100g=local_food['calories'],
+            protein_g=local_food['protein'],
+            carbs_g=local_food['carbs'],
+            fat_g=local_food['fat'],
+            fiber_g=local_food['fiber'],
+            sodium_mg=local_food['sodium'],
+            sugar_g=local_food['sugar'],
+            saturated_fat_g=local_food['saturated_fat'],
+            source="USDA_LOCAL",
+            description="Dados do índice local USDA FoodData Central",
+            **{field_name: local_food.get(field_name, 0) for field_name in MICRONUTRIENT_FIELDS}
+        )
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Cria o pool de threads sob demanda"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='usda-lookup'
+                )
+            return self._executor
+    
+    def search_foods_batch(self, food_names: List[str]) -> BatchFoodResult:
+        """
+        Busca vários alimentos em paralelo (pool limitado e limite de taxa da chave USDA)
+        Nomes repetidos são buscados uma única vez; retorna resultados parciais com erros por item
+        """
+        result = BatchFoodResult()
+        
+        # Deduplicar pela chave canônica, preservando a ordem
+        unique_names = self.food_names.unique(food_names)
+        
+        if not unique_names:
+            return result
+        
+        if self.two_phase:
+            outcomes = self._lookup_foods_two_phase(unique_names)
+        else:
+            executor = self._get_executor()
+            futures = {
+                cache_key: executor.submit(self._lookup_food, food_name)
+                for cache_key, food_name in unique_names.items()
+            }
+            outcomes = self._collect_outcomes(futures)
+        
+        for food_name in food_names:
+            outcome = outcomes.get(self.food_names.canonical(food_name))
+            if isinstance(outcome, FoodData):
+                result.foods[food_name] = outcome
+            elif isinstance(outcome, Exception):
+                result.errors[food_name] = str(outcome)
+            else:
+                result.errors[food_name] = 'Alimento não encontrado na API USDA'
+        
+        logger.info(f"Busca em lote: {len(unique_names)} alimentos distintos, "
+                    f"{result.success_count} encontrados, {len(result.errors)} com erro")
+        return result
+    
+    @staticmethod
+    def _collect_outcomes(futures: Dict[str, Any]) -> Dict[str, Any]:
+        """Aguarda os futures; cada resultado é um FoodData, None (não encontrado) ou a exceção"""
+        outcomes: Dict[str, Any] = {}
+        for key, future in futures.items():
+            try:
+                outcomes[key] = future.result()
+            except Exception as e:
+                outcomes[key] = e
+        return outcomes
+    
+    def _lookup_foods_two_phase(self, unique_names: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Fase 1: busca enxuta (pageSize=1) de cada alimento, já com os nutrientes do resultado;
+        fase 2: detalhes em lote no endpoint /foods apenas para resultados sem nutrientes
+        """
+        outcomes: Dict[str, Any] = {}
+        
+        # Alimentos do índice local ou já em cache não geram requisições
+        pending: Dict[str, str] = {}
+        for cache_key, food_name in unique_names.items():
+            local_result = self._search_local_index(self.food_names.usda_name(food_name))
+            if local_result:
+                outcomes[cache_key] = local_result
+                continue
+            cached = self.food_cache.get_entry(cache_key)
+            if cached is not None:
+                if cached.stale:
+                    self._schedule_refresh(cache_key, self.food_names.usda_name(food_name))
+                outcomes[cache_key] = None if cached.negative else FoodData.from_dict(cached.value)
+            else:
+                pending[cache_key] = food_name
+        
+        if not pending:
+            return outcomes
+        
+        executor = self._get_executor()
+        
+        # Fase 1: apenas o melhor resultado de cada busca
+        search_futures = {
+            cache_key: executor.submit(self._search_first_food, self.food_names.usda_name(food_name))
+            for cache_key, food_name in pending.items()
+        }
+        fdc_ids: Dict[str, int] = {}
+        for cache_key, outcome in self._collect_outcomes(search_futures).items():
+            if isinstance(outcome, dict) and outcome.get('foodNutrients'):
+                # A busca já trouxe os nutrientes: nenhuma requisição extra
+                food_data = self._food_from_usda(outcome, pending[cache_key])
+                self.food_cache.set(cache_key, food_data.to_dict())
+                outcomes[cache_key] = food_data
+            elif isinstance(outcome, dict) and outcome.get('fdcId'):
+                fdc_ids[cache_key] = outcome['fdcId']
+            else:
+                if outcome is None or isinstance(outcome, dict):
+                    self.food_cache.set_negative(cache_key)
+                    outcome = None
+                outcomes[cache_key] = outcome
+        
+        # Fase 2: detalhes em lotes de até 20 ids, restritos aos nutrientes mapeados
+        unique_ids = list(dict.fromkeys(fdc_ids.values()))
+        chunks = [
+            unique_ids[i:i + USDA_DETAILS_BATCH_SIZE]
+            for i in range(0, len(unique_ids), USDA_DETAILS_BATCH_SIZE)
+        ]
+        chunk_futures = {
+            index: executor.submit(self._fetch_food_details, chunk)
+            for index, chunk in enumerate(chunks)
+        }
+        
+        details: Dict[int, Dict[str, Any]] = {}
+        chunk_errors: Dict[int, Exception] = {}
+        for index, outcome in self._collect_outcomes(chunk_futures).items():
+            if isinstance(outcome, Exception):
+                for fdc_id in chunks[index]:
+                    chunk_errors[fdc_id] = outcome
+            else:
+                details.update(outcome)
+        
+        for cache_key, fdc_id in fdc_ids.items():
+            if fdc_id in chunk_errors:
+                outcomes[cache_key] = chunk_errors[fdc_id]
+            elif fdc_id in details:
+                food_data = self._food_from_usda(details[fdc_id], pending[cache_key])
+                self.food_cache.set(cache_key, food_data.to_dict())
+                outcomes[cache_key] = food_data
+            else:
+                self.food_cache.set_negative(cache_key)
+                outcomes[cache_key] = None
+        
+        logger.info(f"Busca USDA em duas fases: {len(pending)} buscas, {len(chunks)} requisições de detalhes")
+        return outcomes
+    
+    def _search_first_food(self, food_name: str) -> Optional[Dict[str, Any]]:
+        """Fase 1: retorna o resultado mais relevante da busca (com foodNutrients, quando a API os envia)"""
+        params = {
+            'query': food_name,
+            'api_key': self.usda_api_key,
+            'pageSize': 1,
+            'dataType': ['Foundation', 'SR Legacy']
+        }
+        response = self._http_request('GET', f"{self.usda_base_url}/foods/search", params)
+        response.raise_for_status()
+        
+        foods = response.json().get('foods', [])
+        return foods[0] if foods else None
+    
+    def _fetch_food_details(self, fdc_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Fase 2: detalhes de até 20 alimentos, formato resumido e só os nutrientes mapeados"""
+        body = {
+            'fdcIds': fdc_ids,
+            'format': 'abridged',
+            'nutrients': [int(number) for number in (*USDA_NUTRIENT_NUMBERS, *USDA_ENERGY_FALLBACK_NUMBERS)]
+        }
+        response = self._http_request('POST', f"{self.usda_base_url}/foods",
+                                      {'api_key': self.usda_api_key}, json_body=body)
+        response.raise_for_status()
+        
+        return {food.get('fdcId'): food for food in response.json() or []}
+    
+    def _search_usda_api(self, food_name: str) -> Optional[FoodData]:
+        """Busca na API do USDA FoodData Central (erros são propagados para o chamador)"""
+        # Buscar alimentos
+        search_url = f"{self.usda_base_url}/foods/search"
+        params = {
+            'query': food_name,
+            'api_key': self.usda_api_key,
+            'pageSize': 1 if self.two_phase else 5,
+            'dataType': ['Foundation', 'SR Legacy']
+        }
+        
+        response = self._http_request('GET', search_url, params)
+        response.raise_for_status()
+        
+        data = response.json()
+        foods = data.get('foods', [])
+        
+        if not foods:
             return None
+        
+        # Pegar o primeiro resultado mais relevante
+        return self._food_from_usda(foods[0], food_name)
+    
+    @staticmethod
+    def _food_from_usda(food: Dict[str, Any], food_name: str) -> FoodData:
+        """Converte um alimento da API (busca, formato completo ou resumido) em FoodData"""
+        nutrients: Dict[str, float] = {}
+        atwater_energy: Dict[str, float] = {}
+        for nutrient in food.get('foodNutrients', []):
+            # Busca: nutrientNumber/value; detalhes completos: nutrient.number/amount; resumido: number/amount
+            nested = nutrient.get('nutrient') or {}
+            number = str(nutrient.get('nutrientNumber') or nutrient.get('number') or nested.get('number') or '')
+            
+            if not number:
+                # Sem número do nutriente: identificar pelo nome exato (energia só em kcal)
+                nutrient_name = (nutrient.get('nutrientName') or nutrient.get('name') or nested.get('name') or '').lower()
+                unit_name = (nutrient.get('unitName') or nested.get('unitName') or '').lower()
+                if nutrient_name.startswith('energy') and unit_name == 'kj':
+                    continue
+                number = USDA_NUTRIENT_NAMES.get(nutrient_name, '')
+            
+            value = nutrient.get('value', nutrient.get('amount', 0)) or 0
+            if number in USDA_ENERGY_FALLBACK_NUMBERS:
+                atwater_energy[number] = value
+            elif number in USDA_NUTRIENT_NUMBERS:
+                nutrients[USDA_NUTRIENT_NUMBERS[number]] = value
+        
+        # Sem energia (208): fatores de Atwater, quando informados
+        if not nutrients.get('calories_per_100g'):
+            for number in USDA_ENERGY_FALLBACK_NUMBERS:
+                if atwater_energy.get(number):
+                    nutrients['calories_per_100g'] = atwater_energy[number]
+                    break
+        
+        return FoodData(
+            name=food.get('description', food_name),
+            source="USDA_API",
+            description=f"Dados da API USDA FoodData Central",
+            **nutrients
+        )
     
     def get_multiple_foods(self, food_list: List[str]) -> Dict[str, FoodData]:
         """Busca dados de múltiplos alimentos"""
-        results = {}
-        for food_name in food_list:
-            food_data = self.search_food(food_name)
-            if food_data:
-                results[food_name] = food_data
-        return results
+        return self.search_foods_batch(food_list).foods
     
     def calculate_meal_nutrition(self, meal_items: List[Dict[str, Any]]) -> Dict[str, float]:
         """
         Calcula nutrição total de uma refeição
         meal_items: Lista de {'food': nome_do_alimento, 'quantity_g': quantidade_em_gramas}
         """
-        total_nutrition = {
-            'calories': 0,
-            'protein_g': 0,
-            'carbs_g': 0,
-            'fat_g': 0,
-            'fiber_g': 0,
-            'sodium_mg': 0,
-            'sugar_g': 0,
-            'saturated_fat_g': 0
-        }
+        # Buscar todos os alimentos da refeição de uma vez
+        foods = self.search_foods_batch([item.get('food', '') for item in meal_items]).foods
         
-        for item in meal_items:
-            food_name = item.get('food', '')
-            quantity_g = item.get('quantity_g', 0)
+        # Totais = vetor de porções (gramas/100) · matriz de nutrientes por 100g
+        matrix = NutrientMatrix.from_records(foods)
+        totals = matrix.multiply([matrix.portion_vector(
+            [{'food': item.get('food', ''), 'quantity_g': item.get('quantity_g', 0)} for item in meal_items]
+        )])[0]
+        return dict(zip(TOTAL_KEYS, totals))
+    
+    def get_similarity_index(self) -> FoodSimilarityIndex:
+        """
+        Índice de similaridade atual, sem bloquear: se ainda não existe ou venceu,
+        agenda a reconstrução em segundo plano e devolve o índice disponível (vazio na primeira vez)
+        """
+        with self._similarity_lock:
+            index = self._similarity_index
+            expired = time.monotonic() - self._similarity_built_at > self.similarity_refresh_seconds
+        if index is None or expired:
+            self.schedule_similarity_refresh()
+        return index if index is not None else FoodSimilarityIndex([])
+    
+    def schedule_similarity_refresh(self) -> bool:
+        """Agenda a reconstrução do índice de similaridade (uma de cada vez)"""
+        with self._similarity_lock:
+            if self._similarity_building:
+                return False
+            self._similarity_building = True
+        
+        try:
+            self._get_executor().submit(self.refresh_similarity_index)
+        except RuntimeError:
+            # Pool já encerrado (fim do processo)
+            with self._similarity_lock:
+                self._similarity_building = False
+            return False
+        return True
+    
+    def refresh_similarity_index(self) -> FoodSimilarityIndex:
+        """Reconstrói o índice sobre os alimentos do cache e do índice local (sem rede) e o publica"""
+        try:
+            foods: List[FoodData] = []
+            try:
+                foods.extend(FoodData.from_dict(data) for data in self.food_cache.iter_values())
+            except Exception as e:
+                logger.warning(f"Erro ao ler o cache para o índice de similaridade: {e}")
+            if self.local_index is not None:
+                try:
+                    foods.extend(self._food_from_local(row) for row in self.local_index.iter_foods())
+                except Exception as e:
+                    logger.warning(f"Erro ao ler o índice local para o índice de similaridade: {e}")
             
-            food_data = self.search_food(food_name)
-            if food_data:
-                # Calcular proporção (quantidade / 100g)
-                proportion = quantity_g / 100.0
-                
-                total_nutrition['calories'] += food_data.calories_per_100g * proportion
-                total_nutrition['protein_g'] += food_data.protein_g * proportion
-                total_nutrition['carbs_g'] += food_data.carbs_g * proportion
-                total_nutrition['fat_g'] += food_data.fat_g * proportion
-                total_nutrition['fiber_g'] += food_data.fiber_g * proportion
-                total_nutrition['sodium_mg'] += food_data.sodium_mg * proportion
-                total_nutrition['sugar_g'] += food_data.sugar_g * proportion
-                total_nutrition['saturated_fat_g'] += food_data.saturated_fat_g * proportion
-        
-        return total_nutrition
-    
-    def suggest_food_alternatives(self, original_food: str, target_macros: Dict[str, float]) -> List[FoodData]:
-        """Sugere alternativas de alimentos baseado em macros desejados"""
-        # Esta função pode ser expandida para usar ML ou regras mais sofisticadas
-        alternatives = []
-        
-        # Por enquanto, busca variações do alimento original
-        original_data = self.search_food(original_food)
-        if not original_data:
-            return alternatives
-        
-        # Buscar variações (ex: "chicken" -> "grilled chicken", "roasted chicken")
-        variations = [
-            f"grilled {original_food}",
-            f"roasted {original_food}",
-            f"baked {original_food}",
-            f"steamed {original_food}",
-            f"fresh {original_food}"
-        ]
+            # Construído fora da trava: leitores seguem usando o índice anterior até a troca
+            index = FoodSimilarityIndex(foods)
+            with self._similarity_lock:
+                self._similarity_index = index
+                self._similarity_built_at = time.monotonic()
+            return index
+        finally:
+            with self._similarity_lock:
+                self._similarity_building = False
+    
+    def _find_for_similarity(self, food_name: str, index: FoodSimilarityIndex) -> Optional[FoodData]:
+        """Alimento de referência no índice em memória (pelo nome informado ou pelo nome USDA); sem rede"""
+        return index.find(food_name) or index.find(self.food_names.usda_name(food_name))
+    
+    def suggest_food_alternatives(self, original_food: str, target_macros: Dict[str, float] = None,
+                                  limit: int = 3) -> List[FoodData]:
+        """
+        Sugere alimentos com perfil de macros semelhante (vizinhos mais próximos no índice em memória)
+        Com target_macros ({'protein_g', 'carbs_g', 'fat_g'}), busca o perfil desejado em vez do original
+        """
+        index = self.get_similarity_index()
+        original_data = self._find_for_similarity(original_food, index)
+        
+        if target_macros:
+            vector = macro_vector(target_macros.get('protein_g', 0), target_macros.get('carbs_g', 0),
+                                  target_macros.get('fat_g', 0))
+        else:
+            vector = food_vector(original_data) if original_data else None
         
-        for variation in variations:
-            alt_data = self.search_food(variation)
-            if alt_data and alt_data.name != original_data.name:
-                alternatives.append(alt_data)
+        if vector is None:
+            return []
         
-        return alternatives[:3]  # Retornar até 3 alternativas
+        exclude = [original_food] + ([original_data.name] if original_data else [])
+        return [food for food, _ in index.nearest(vector, limit, exclude)]
+    
+    def calculate_food_equivalences(self, food_name: str, other_food: str = None,
+                                    grams: float = 100, limit: int = 3) -> Dict[str, Any]:
+        """
+        Porções equivalentes em calorias: com other_food, entre os dois alimentos;
+        sem other_food, para os substitutos de macros mais próximos
+        """
+        index = self.get_similarity_index()
+        food = self._find_for_similarity(food_name, index)
+        if not food:
+            return {'status': f"Alimento '{food_name}' não encontrado"}
+        
+        if other_food:
+            substitute = self._find_for_similarity(other_food, index)
+            if not substitute:
+                return {'status': f"Alimento '{other_food}' não encontrado"}
+            vector, other_vector = food_vector(food), food_vector(substitute)
+            distance = (sum((a - b) ** 2 for a, b in zip(vector, other_vector)) ** 0.5
+                        if vector and other_vector else None)
+            candidates = [(substitute, distance)]
+        else:
+            vector = food_vector(food)
+            candidates = index.nearest(vector, limit, [food_name, food.name]) if vector else []
+        
+        def portion(item: FoodData, item_grams: float) -> Dict[str, Any]:
+            factor = item_grams / 100
+            return {
+                'food': item.name,
+                'grams': round(item_grams, 1),
+                'calories': round(item.calories_per_100g * factor, 1),
+                'protein_g': round(item.protein_g * factor, 1),
+                'carbs_g': round(item.carbs_g * factor, 1),
+                'fat_g': round(item.fat_g * factor, 1)
+            }
+        
+        equivalents = []
+        for substitute, distance in candidates:
+            equivalent = portion(substitute, FoodSimilarityIndex.equivalent_grams(food, grams, substitute))
+            equivalent['macro_distance'] = round(distance, 3) if distance is not None else None
+            equivalents.append(equivalent)
+        
+        return {'reference': portion(food, grams), 'equivalents': equivalents}
+
+    def get_cache_metrics(self) -> Dict[str, Any]:
+        """Retorna métricas do cache de alimentos e das atualizações em segundo plano"""
+        metrics = self.food_cache.get_metrics()
+        with self._refresh_lock:
+            metrics['background_refreshes'] = self.background_refreshes
+            metrics['background_refresh_errors'] = self.background_refresh_errors
+            metrics['refreshes_in_flight'] = len(self._refreshing)
+        return metrics
+
+_nutrition_service: Optional[NutritionAPI] = None
+_nutrition_service_lock = threading.Lock()
+
+
+def get_nutrition_service() -> NutritionAPI:
+    """Instância global do serviço, criada no primeiro uso (importar o módulo não abre o cache)"""
+    global _nutrition_service
+    if _nutrition_service is None:
+        with _nutrition_service_lock:
+            if _nutrition_service is None:
+                _nutrition_service = NutritionAPI()
+    return _nutrition_service
 
-# Instância global do serviço
-nutrition_service = NutritionAPI()
 
 def get_food_nutrition(food_name: str) -> Optional[Dict[str, Any]]:
     """Função helper para buscar nutrição de um alimento"""
-    food_data = nutrition_service.search_food(food_name)
+    food_data = get_nutrition_service().search_food(food_name)
     if food_data:
         return {
             'name': food_data.name,
@@ -0,0 +1,267 @@
+"""
+Calculadora determinística de energia e macronutrientes
+Aplica Harris-Benedict, fatores de atividade, ajuste por objetivo e distribuição de macros
+conforme a metodologia definida em config/agents/nutritionist.yaml
+"""
+
+import logging
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+# NumPy é opcional: usado para calcular lotes de perfis de uma só vez
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Coeficientes de Harris-Benedict: constante, peso (kg), altura (cm), idade (anos)
+HARRIS_BENEDICT_COEFFICIENTS: Dict[str, Tuple[float, float, float, float]] = {
+    'masculino': (88.362, 13.397, 4.799, 5.677),
+    'feminino': (447.593, 9.247, 3.098, 4.330),
+}
+# Sem fórmula específica: média das equações masculina e feminina
+HARRIS_BENEDICT_COEFFICIENTS['outro'] = tuple(
+    (m + f) / 2 for m, f in zip(HARRIS_BENEDICT_COEFFICIENTS['masculino'],
+                                HARRIS_BENEDICT_COEFFICIENTS['feminino'])
+)
+
+# Fatores de atividade física (códigos do cadastro)
+ACTIVITY_FACTORS: Dict[str, float] = {
+    'sedentario': 1.2,
+    'leve': 1.375,
+    'moderado': 1.55,
+    'intenso': 1.725,
+    'muito_intenso': 1.9,
+}
+
+ACTIVITY_LABELS: Dict[str, str] = {
+    'sedentario': 'Sedentário',
+    'leve': 'Levemente ativo',
+    'moderado': 'Moderadamente ativo',
+    'intenso': 'Muito ativo',
+    'muito_intenso': 'Extremamente ativo',
+}
+
+# Objetivos do cadastro agrupados nas três estratégias calóricas
+GOAL_STRATEGIES: Dict[str, str] = {
+    'perda_peso': 'perda',
+    'ganho_massa_muscular': 'ganho',
+    'manutencao_peso': 'manutencao',
+    'melhora_saude_geral': 'manutencao',
+    'aumento_energia': 'manutencao',
+    'outro': 'manutencao',
+}
+
+GOAL_LABELS: Dict[str, str] = {
+    'perda_peso': 'Perda de peso',
+    'ganho_massa_muscular': 'Ganho de massa muscular',
+    'manutencao_peso': 'Manutenção de peso',
+    'melhora_saude_geral': 'Melhora da saúde geral',
+    'aumento_energia': 'Aumento de energia',
+    'outro': 'Outro objetivo',
+}
+
+# Ajuste sobre o GET (kcal)
+OBJECTIVE_ADJUSTMENTS: Dict[str, float] = {
+    'perda': -400.0,
+    'manutencao': 0.0,
+    'ganho': 400.0,
+}
+
+OBJECTIVE_ADJUSTMENT_LABELS: Dict[str, str] = {
+    'perda': 'Déficit calórico de 400 kcal (perda de peso)',
+    'manutencao': 'Manutenção (sem ajuste calórico)',
+    'ganho': 'Superávit calórico de 400 kcal (ganho de peso)',
+}
+
+# Distribuição de macros por estratégia (fração das calorias): carboidratos, proteínas, gorduras
+MACRO_ORDER: Tuple[str, str, str] = ('carbohydrates', 'proteins', 'fats')
+MACRO_SPLITS: Dict[str, Tuple[float, float, float]] = {
+    'perda': (0.45, 0.28, 0.27),
+    'manutencao': (0.55, 0.18, 0.27),
+    'ganho': (0.58, 0.22, 0.20),
+}
+# kcal por grama: carboidratos, proteínas, gorduras
+MACRO_KCAL_PER_GRAM: Tuple[float, float, float] = (4.0, 4.0, 9.0)
+
+STRATEGY_ORDER: Tuple[str, str, str] = ('perda', 'manutencao', 'ganho')
+
+# O cadastro grava a altura em metros (ProfileSchema.validate_height: até 3.0 m);
+# valores até este limite são convertidos para centímetros
+MAX_HEIGHT_METERS = 3.0
+
+
+def height_to_cm(height: Any) -> float:
+    """Altura do perfil (metros ou centímetros) em centímetros"""
+    height = float(height)
+    return height * 100 if height <= MAX_HEIGHT_METERS else height
+
+
+@dataclass
+class AnthropometricProfile:
+    """Dados antropométricos usados nos cálculos"""
+    weight_kg: float
+    height_cm: float
+    age_years: int
+    gender: str
+    activity_level: str
+    primary_objective: str
+    name: str = 'Paciente'
+
+    @classmethod
+    def from_user_data(cls, user_data: Dict[str, Any]) -> 'AnthropometricProfile':
+        """Cria o perfil a partir dos dados do cadastro do usuário"""
+        missing = [key for key in ('weight', 'height', 'age') if user_data.get(key) in (None, '')]
+        if missing:
+            raise ValueError(f"Dados antropométricos ausentes no perfil: {', '.join(missing)}")
+
+        return cls(
+            weight_kg=float(user_data['weight']),
+            height_cm=height_to_cm(user_data['height']),
+            age_years=int(user_data['age']),
+            gender=str(user_data.get('gender') or 'outro').lower(),
+            activity_level=str(user_data.get('activity_level') or 'moderado').lower(),
+            primary_objective=str(user_data.get('primary_goal') or 'manutencao_peso').lower(),
+            name=user_data.get('name') or 'Paciente'
+        )
+
+    @property
+    def strategy(self) -> str:
+        """Estratégia calórica (perda, manutenção ou ganho) do objetivo"""
+        return GOAL_STRATEGIES.get(self.primary_objective, 'manutencao')
+
+    @property
+    def activity_factor(self) -> float:
+        """Fator de atividade física do perfil"""
+        factor = ACTIVITY_FACTORS.get(self.activity_level)
+        if factor is None:
+            raise ValueError(f"Nível de atividade desconhecido: {self.activity_level}")
+        return factor
+
+    @property
+    def coefficients(self) -> Tuple[float, float, float, float]:
+        """Coeficientes de Harris-Benedict para o sexo do perfil"""
+        return HARRIS_BENEDICT_COEFFICIENTS.get(self.gender, HARRIS_BENEDICT_COEFFICIENTS['outro'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para o formato de anthropometric_data usado pela dieta"""
+        return {
+            'weight_kg': self.weight_kg,
+            'height_cm': self.height_cm,
+            'age_years': self.age_years,
+            'gender': self.gender,
+            'activity_level': ACTIVITY_LABELS.get(self.activity_level, self.activity_level),
+            'primary_objective': GOAL_LABELS.get(self.primary_objective, self.primary_objective),
+            'name': self.name
+        }
+
+
+@dataclass
+class MacronutrientTarget:
+    """Meta diária de um macronutriente"""
+    grams_per_day: float
+    percentage: int
+    kcal_per_day: float
+
+
+@dataclass
+class NutritionalNeeds:
+    """Resultado completo dos cálculos nutricionais"""
+    anthropometric_data: AnthropometricProfile
+    tmb_kcal: float
+    activity_factor: float
+    get_kcal: float
+    daily_target_kcal: float
+    objective_adjustment: str
+    macronutrient_distribution: Dict[str, MacronutrientTarget]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para a mesma estrutura JSON que o handler de cálculos produzia"""
+        return {
+            'anthropometric_data': self.anthropometric_data.to_dict(),
+            'tmb_kcal': self.tmb_kcal,
+            'activity_factor': self.activity_factor,
+            'get_kcal': self.get_kcal,
+            'daily_target_kcal': self.daily_target_kcal,
+            'objective_adjustment': self.objective_adjustment,
+            'macronutrient_distribution': {
+                macro: asdict(target) for macro, target in self.macronutrient_distribution.items()
+            }
+        }
+
+
+def _build_needs(profile: AnthropometricProfile, tmb: float, get: float, target: float,
+                 macro_kcal: Sequence[float]) -> NutritionalNeeds:
+    """Monta o resultado arredondado a partir dos valores calculados"""
+    splits = MACRO_SPLITS[profile.strategy]
+    distribution = {
+        macro: MacronutrientTarget(
+            grams_per_day=round(float(kcal) / kcal_per_gram, 1),
+            percentage=int(round(split * 100)),
+            kcal_per_day=round(float(kcal), 1)
+        )
+        for macro, split, kcal, kcal_per_gram in zip(MACRO_ORDER, splits, macro_kcal, MACRO_KCAL_PER_GRAM)
+    }
+
+    return NutritionalNeeds(
+        anthropometric_data=profile,
+        tmb_kcal=round(float(tmb), 1),
+        activity_factor=profile.activity_factor,
+        get_kcal=round(float(get), 1),
+        daily_target_kcal=round(float(target), 1),
+        objective_adjustment=OBJECTIVE_ADJUSTMENT_LABELS[profile.strategy],
+        macronutrient_distribution=distribution
+    )
+
+
+def calculate_nutritional_needs(profile: AnthropometricProfile) -> NutritionalNeeds:
+    """Calcula TMB, GET, meta calórica e distribuição de macros de um perfil"""
+    constant, weight_coef, height_coef, age_coef = profile.coefficients
+    tmb = constant + weight_coef * profile.weight_kg + height_coef * profile.height_cm - age_coef * profile.age_years
+    get = tmb * profile.activity_factor
+    target = get + OBJECTIVE_ADJUSTMENTS[profile.strategy]
+    macro_kcal = [target * split for split in MACRO_SPLITS[profile.strategy]]
+    return _build_needs(profile, tmb, get, target, macro_kcal)
+
+
+def calculate_batch(profiles: Sequence[AnthropometricProfile]) -> List[NutritionalNeeds]:
+    """Calcula as necessidades de vários perfis; vetorizado com NumPy quando disponível"""
+    if not profiles:
+        return []
+
+    if not NUMPY_AVAILABLE:
+        return [calculate_nutritional_needs(profile) for profile in profiles]
+
+    coefficients = np.array([profile.coefficients for profile in profiles], dtype=float)
+    anthropometry = np.array(
+        [(1.0, profile.weight_kg, profile.height_cm, -profile.age_years) for profile in profiles],
+        dtype=float
+    )
+    factors = np.array([profile.activity_factor for profile in profiles], dtype=float)
+    strategy_index = np.array([STRATEGY_ORDER.index(profile.strategy) for profile in profiles])
+
+    adjustments = np.array([OBJECTIVE_ADJUSTMENTS[s] for s in STRATEGY_ORDER], dtype=float)
+    splits = np.array([MACRO_SPLITS[s] for s in STRATEGY_ORDER], dtype=float)
+
+    # TMB = c0 + c1*peso + c2*altura - c3*idade, linha a linha
+    tmb = np.einsum('ij,ij->i', coefficients, anthropometry)
+    get = tmb * factors
+    target = get + adjustments[strategy_index]
+    macro_kcal = target[:, None] * splits[strategy_index]
+
+    return [
+        _build_needs(profile, tmb[i], get[i], target[i], macro_kcal[i])
+        for i, profile in enumerate(profiles)
+    ]
+
+
+def calculate_from_user_data(user_data: Dict[str, Any], name: Optional[str] = None) -> Dict[str, Any]:
+    """Atalho: calcula a partir do perfil do cadastro e retorna a estrutura em dicionário"""
+    profile = AnthropometricProfile.from_user_data(user_data)
+    if name:
+        profile.name = name
+    return calculate_nutritional_needs(profile).to_dict()
@@ -20,6 +20,8 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
 from reportlab.pdfgen import canvas
 from reportlab.lib import colors
 
+from utils.food_names import portuguese_food_name
+
 logger = logging.getLogger(__name__)
 
 
@@ -450,29 +452,8 @@ class ShapeMatePDFGenerator:
         return elements
     
     def _translate_food_name(self, english_name: str) -> str:
-        """Traduz nome do alimento do inglês para português"""
-        translation_map = {
-            'cooked white rice': 'Arroz branco cozido',
-            'cooked black beans': 'Feijão preto cozido',
-            'grilled chicken breast': 'Peito de frango grelhado',
-            'sweet potato': 'Batata doce',
-            'banana': 'Banana',
-            'boiled egg': 'Ovo cozido',
-            'whole milk': 'Leite integral',
-            'oats': 'Aveia',
-            'broccoli': 'Brócolis',
-            'spinach': 'Espinafre',
-            'apple': 'Maçã',
-            'tomato': 'Tomate',
-            'olive oil': 'Azeite de oliva',
-            'salmon': 'Salmão',
-            'greek yogurt': 'Iogurte grego',
-            'almonds': 'Amêndoas',
-            'avocado': 'Abacate',
-            'quinoa': 'Quinoa'
-        }
-        
-        return translation_map.get(english_name, english_name.title())
+        """Traduz nome do alimento do inglês para português (tabela config/food_aliases.yaml)"""
+        return portuguese_food_name(english_name)
     
     def _add_header_footer(self, canvas, doc):
         """Adiciona cabeçalho e rodapé às páginas"""
@@ -0,0 +1,281 @@
+"""
+Pré-cálculo especulativo do preview da dieta
+Inicia cálculos nutricionais e buscas na API USDA em segundo plano durante a consulta
+"""
+
+import os
+import copy
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional
+
+from dotenv import load_dotenv
+
+from utils import json_codec
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Lê uma flag booleana das variáveis de ambiente"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _user_messages(history: List[Dict[str, Any]]) -> List[Any]:
+    return [msg.get('message') for msg in history if msg.get('role') == 'user']
+
+
+def consultation_fingerprint(consultation_state: Dict[str, Any], history_length: Optional[int] = None) -> str:
+    """
+    Resumo das entradas do preview: dados do perfil e mensagens do usuário
+    history_length limita o resumo às mensagens que existiam quando a especulação começou
+    """
+    history = consultation_state.get('conversation_history', [])
+    user_messages = _user_messages(history if history_length is None else history[:history_length])
+    payload = json_codec.dumps_bytes(
+        {'user_data': consultation_state.get('user_data') or {}, 'user_messages': user_messages},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+@dataclass
+class _Speculation:
+    """Trabalho especulativo em andamento para uma consulta"""
+    future: Future
+    started_at: float
+    history_length: int
+    fingerprint: str
+
+    def matches(self, consultation_state: Dict[str, Any],
+                changes_inputs: Optional[Callable[[str], bool]] = None) -> bool:
+        """
+        True se o preview ainda vale para o estado atual: perfil e mensagens do snapshot inalterados
+        e nenhuma mensagem posterior do usuário com informação nova para a dieta
+        changes_inputs decide se uma mensagem nova altera as entradas (padrão: qualquer mensagem altera)
+        """
+        if consultation_fingerprint(consultation_state, self.history_length) != self.fingerprint:
+            return False
+        new_messages = _user_messages(consultation_state.get('conversation_history', [])[self.history_length:])
+        if changes_inputs is None:
+            return not new_messages
+        return not any(changes_inputs(message or '') for message in new_messages)
+
+
+@dataclass
+class SpeculationMetrics:
+    """Contadores de uso do pré-cálculo especulativo"""
+    started: int = 0
+    warm_hits: int = 0
+    in_flight_hits: int = 0
+    misses: int = 0
+    failed: int = 0
+    wasted: int = 0
+    stale: int = 0
+    saved_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte as métricas para dicionário, incluindo as taxas derivadas"""
+        used = self.warm_hits + self.in_flight_hits
+        requested = used + self.misses
+        return {
+            'started': self.started,
+            'warm_hits': self.warm_hits,
+            'in_flight_hits': self.in_flight_hits,
+            'misses': self.misses,
+            'failed': self.failed,
+            'wasted': self.wasted,
+            'stale': self.stale,
+            'hit_ratio': round(used / requested, 3) if requested else 0.0,
+            'waste_ratio': round(self.wasted / self.started, 3) if self.started else 0.0,
+            'saved_seconds': round(self.saved_seconds, 3)
+        }
+
+
+class SpeculativePreviewCache:
+    """Executa o preview da dieta antecipadamente e guarda o resultado por consulta"""
+
+    def __init__(self, enabled: Optional[bool] = None, max_workers: Optional[int] = None,
+                 wait_timeout: Optional[float] = None, max_age_seconds: Optional[float] = None):
+        # Modo opt-in: desabilitado por padrão
+        self.enabled = enabled if enabled is not None else _env_flag('NUTRITIONIST_SPECULATIVE_PREVIEW')
+        self.max_workers = max_workers or int(os.getenv('NUTRITIONIST_SPECULATIVE_WORKERS', '2'))
+        # Tempo máximo aguardando um trabalho ainda em andamento quando o usuário chega ao preview
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(
+            os.getenv('NUTRITIONIST_SPECULATIVE_WAIT_SECONDS', '120'))
+        # Consultas abandonadas têm o trabalho descartado após esse tempo
+        self.max_age_seconds = max_age_seconds if max_age_seconds is not None else float(
+            os.getenv('NUTRITIONIST_SPECULATIVE_MAX_AGE_SECONDS', '1800'))
+
+        self.metrics = SpeculationMetrics()
+        self._speculations: Dict[str, _Speculation] = {}
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        if self.enabled:
+            logger.info(f"Preview especulativo habilitado ({self.max_workers} workers)")
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Cria o pool de threads sob demanda"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='diet-preview-speculation'
+            )
+        return self._executor
+
+    def speculate(self, consultation_id: str, consultation_state: Dict[str, Any],
+                  preview_fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+                  changes_inputs: Optional[Callable[[str], bool]] = None) -> bool:
+        """
+        Inicia o cálculo do preview em segundo plano, se ainda não houver um válido para o estado
+        atual da consulta; um trabalho iniciado com dados anteriores é cancelado e refeito
+        """
+        if not self.enabled or not consultation_id:
+            return False
+
+        fingerprint = consultation_fingerprint(consultation_state)
+
+        with self._lock:
+            self._discard_expired_locked()
+
+            previous = self._speculations.get(consultation_id)
+            if previous is not None:
+                if previous.matches(consultation_state, changes_inputs):
+                    return False
+                previous.future.cancel()
+                self.metrics.wasted += 1
+
+            # Snapshot independente: a consulta continua sendo alterada na thread da requisição
+            snapshot = copy.deepcopy(consultation_state)
+            future = self._get_executor().submit(self._run_timed, preview_fn, snapshot)
+            self._speculations[consultation_id] = _Speculation(
+                future=future,
+                started_at=time.monotonic(),
+                history_length=len(snapshot.get('conversation_history', [])),
+                fingerprint=fingerprint
+            )
+            self.metrics.started += 1
+
+        logger.info(f"🔮 Preview especulativo iniciado para {consultation_id}")
+        return True
+
+    @staticmethod
+    def _run_timed(preview_fn: Callable[[Dict[str, Any]], Dict[str, Any]],
+                   snapshot: Dict[str, Any]):
+        """Executa o preview medindo quanto tempo de cálculo foi antecipado"""
+        started = time.monotonic()
+        diet_preview = preview_fn(snapshot)
+        return diet_preview, time.monotonic() - started
+
+    def take(self, consultation_id: str, consultation_state: Dict[str, Any],
+             changes_inputs: Optional[Callable[[str], bool]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Retorna o preview pré-calculado (aguardando se ainda estiver em andamento) ou None
+        O preview só é usado se as entradas do snapshot não mudaram: mensagens posteriores do usuário
+        são aceitas quando changes_inputs indica que não trazem informação nova (ex.: a confirmação
+        que libera o preview). Caso contrário ele é descartado e o chamador gera um novo
+        (as buscas USDA feitas na especulação já estão no cache)
+        """
+        if not self.enabled or not consultation_id:
+            return None
+
+        with self._lock:
+            speculation = self._speculations.pop(consultation_id, None)
+
+        if speculation is None:
+            self.metrics.misses += 1
+            return None
+
+        if not speculation.matches(consultation_state, changes_inputs):
+            speculation.future.cancel()
+            self.metrics.stale += 1
+            self.metrics.wasted += 1
+            self.metrics.misses += 1
+            history_length = len(consultation_state.get('conversation_history', []))
+            logger.info(f"Preview especulativo de {consultation_id} desatualizado "
+                        f"({speculation.history_length} -> {history_length} mensagens); gerando novamente")
+            return None
+
+        future = speculation.future
+        was_done = future.done()
+        waited_from = time.monotonic()
+
+        try:
+            diet_preview, duration = future.result(timeout=self.wait_timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self.metrics.wasted += 1
+            self.metrics.misses += 1
+            logger.warning(f"Preview especulativo de {consultation_id} excedeu o tempo de espera")
+            return None
+        except Exception as e:
+            self.metrics.failed += 1
+            self.metrics.misses += 1
+            logger.warning(f"Preview especulativo de {consultation_id} falhou: {e}")
+            return None
+
+        if was_done:
+            self.metrics.warm_hits += 1
+            self.metrics.saved_seconds += duration
+        else:
+            # Apenas a parte calculada antes da espera foi economizada
+            self.metrics.in_flight_hits += 1
+            self.metrics.saved_seconds += max(0.0, duration - (time.monotonic() - waited_from))
+
+        logger.info(f"⚡ Preview especulativo reaproveitado para {consultation_id} "
+                    f"({'pronto' if was_done else 'em andamento'}, "
+                    f"{speculation.history_length} mensagens no snapshot)")
+        return diet_preview
+
+    def discard(self, consultation_id: str) -> bool:
+        """Cancela o trabalho especulativo de uma consulta que não vai mais usá-lo"""
+        with self._lock:
+            speculation = self._speculations.pop(consultation_id, None)
+
+        if speculation is None:
+            return False
+
+        # Trabalhos ainda na fila são cancelados; os que já estão rodando terminam e são descartados
+        speculation.future.cancel()
+        self.metrics.wasted += 1
+        logger.info(f"Preview especulativo descartado para {consultation_id}")
+        return True
+
+    def _discard_expired_locked(self):
+        """Descarta trabalhos de consultas abandonadas (chamado com o lock adquirido)"""
+        now = time.monotonic()
+        expired = [
+            consultation_id for consultation_id, speculation in self._speculations.items()
+            if now - speculation.started_at > self.max_age_seconds
+        ]
+        for consultation_id in expired:
+            self._speculations.pop(consultation_id).future.cancel()
+            self.metrics.wasted += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna as métricas de acerto e desperdício"""
+        with self._lock:
+            in_flight = len(self._speculations)
+        metrics = self.metrics.to_dict()
+        metrics['enabled'] = self.enabled
+        metrics['pending'] = in_flight
+        return metrics
+
+    def shutdown(self):
+        """Cancela todos os trabalhos pendentes e encerra o pool"""
+        with self._lock:
+            pending = list(self._speculations.keys())
+        for consultation_id in pending:
+            self.discard(consultation_id)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
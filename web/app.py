@@ -5,10 +5,12 @@ Integrado com sistema de agentes Langgraph
 """
 
 from flask import Flask, render_template, request, jsonify, redirect, url_for, session, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import sys
 import os
 import logging
+import threading
 from werkzeug.utils import secure_filename
 
 # Adicionar o diretório raiz ao path
@@ -19,7 +21,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from register.registration import RegistrationSystem
 from database.services import get_database_service
-from database.config import GENDER_DISPLAY, GOAL_DISPLAY, ACTIVITY_LEVEL_DISPLAY
+from database.config import GENDER_DISPLAY, GOAL_DISPLAY, ACTIVITY_LEVEL_DISPLAY, INVENTORY_BULK_MAX_ITEMS
 
 # Importar sistema de agentes real
 from core.core import CoreAgentSystem, AgentType, TaskType, TaskPriority, BaseAgent, AgentConfig
@@ -28,6 +30,8 @@ from core.config_loader import get_config_loader
 # Importar utilitários
 from utils.diet_manager.diet_storage import diet_manager
 from utils.pdf_generator import process_uploaded_diet
+from utils.cache_prewarmer import CachePrewarmer, prewarm_enabled
+from utils import json_codec
 
 # Classe de agente Daily Assistant simples
 class SimpleDailyAssistantAgent(BaseAgent):
@@ -65,7 +69,24 @@ class SimpleDailyAssistantAgent(BaseAgent):
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """jsonify e request.get_json pelo codec JSON do projeto (orjson/msgspec quando instalados)"""
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(
+            obj,
+            indent=bool(kwargs.get('indent')),
+            sort_keys=kwargs.get('sort_keys', self.sort_keys),
+            default=kwargs.get('default', self.default)
+        )
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 app.secret_key = 'shapemate_secret_key_2025'  # Em produção, usar variável de ambiente
 CORS(app)
 
@@ -116,6 +137,30 @@ except Exception as e:
     daily_assistant_available = False
     daily_assistant_agent = None
 
+# Pré-aquecimento do cache de alimentos (vocabulário comum) em segundo plano
+# Iniciado na primeira requisição: só o processo que atende requisições busca na API
+# (nunca o processo pai do reloader do modo debug, sem WERKZEUG_RUN_MAIN, que apenas observa os arquivos)
+food_cache_prewarmer = None
+_prewarm_checked = False
+_prewarm_lock = threading.Lock()
+
+@app.before_request
+def start_food_cache_prewarmer():
+    """Inicia o pré-aquecimento uma única vez por processo, se habilitado"""
+    global food_cache_prewarmer, _prewarm_checked
+    if _prewarm_checked:
+        return
+    with _prewarm_lock:
+        if _prewarm_checked:
+            return
+        _prewarm_checked = True
+        if nutritionist_available:
+            # Índice de similaridade montado em segundo plano, antes das primeiras substituições
+            nutritionist_agent.nutrition_api.schedule_similarity_refresh()
+        if nutritionist_available and prewarm_enabled(nutritionist_agent.nutrition_api):
+            food_cache_prewarmer = CachePrewarmer(nutritionist_agent.nutrition_api)
+            food_cache_prewarmer.start()
+
 def allowed_file(filename):
     """Verifica se o arquivo é permitido"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -167,10 +212,8 @@ def dashboard():
     has_diet = False
     
     try:
-        # Verificar se tem dieta no diet_manager
-        user_diets = diet_manager.get_user_diet_list(user_id)
-        if user_diets and len(user_diets) > 0:
-            has_diet = True
+        # Verificar se tem dieta no diet_manager (EXISTS, sem carregar as dietas)
+        has_diet = diet_manager.has_active_diet(user_id)
     except Exception as e:
         logging.error(f"Erro ao verificar dieta do usuário: {e}")
         has_diet = False
@@ -428,7 +471,10 @@ def api_send_message():
 
 @app.route('/api/chat/history')
 def api_chat_history():
-    """API para obter histórico do chat"""
+    """
+    API para obter histórico do chat, paginado por cursor
+    Parâmetros: limit, before (mensagens mais antigas) ou since (apenas mensagens novas)
+    """
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
     
@@ -438,10 +484,21 @@ def api_chat_history():
         if not session_id:
             return jsonify({'success': False, 'message': 'Nenhuma sessão de chat ativa'}), 400
         
-        history = db_service.get_user_chat_history(session_id)
+        page, message = db_service.get_chat_history_page(
+            session_id,
+            limit=request.args.get('limit'),
+            before=request.args.get('before'),
+            since=request.args.get('since')
+        )
+        if page is None:
+            return jsonify({'success': False, 'message': message}), 400
+        
         return jsonify({
             'success': True,
-            'history': history
+            'history': page['messages'],
+            'has_more': page['has_more'],
+            'before_cursor': page['before_cursor'],
+            'sync_cursor': page['sync_cursor']
         })
         
     except Exception as e:
@@ -451,6 +508,35 @@ def api_chat_history():
         }), 500
 
 
+@app.route('/api/chat/sessions')
+def api_chat_sessions():
+    """API para listar as sessões de chat do usuário, paginadas por cursor (limit, before)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Usuário não autenticado'}), 401
+    
+    try:
+        page, message = db_service.get_user_sessions_page(
+            session['user_id'],
+            limit=request.args.get('limit'),
+            before=request.args.get('before')
+        )
+        if page is None:
+            return jsonify({'success': False, 'message': message}), 400
+        
+        return jsonify({
+            'success': True,
+            'sessions': page['sessions'],
+            'has_more': page['has_more'],
+            'next_cursor': page['next_cursor']
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Erro ao obter sessões: {str(e)}'
+        }), 500
+
+
 @app.route('/api/system/health')
 def api_system_health():
     """API para verificar saúde do sistema"""
@@ -458,7 +544,10 @@ def api_system_health():
     return jsonify({
         'healthy': is_healthy,
         'message': message,
-        'nutritionist_available': nutritionist_available
+        'nutritionist_available': nutritionist_available,
+        'food_cache_ready': food_cache_prewarmer.ready.is_set() if food_cache_prewarmer else None,
+        'chat_writer': db_service.db.chat_writer.get_metrics() if db_service.db.chat_writer else None,
+        'password_hasher': db_service.db.password_hasher.get_metrics()
     })
 
 
@@ -473,7 +562,11 @@ def api_nutritionist_status():
             'Cálculos de IMC e necessidades calóricas',
             'Planejamento de refeições',
             'Avaliação nutricional'
-        ] if nutritionist_available else []
+        ] if nutritionist_available else [],
+        'speculative_preview': nutritionist_agent.preview_speculation.get_metrics() if nutritionist_available else {},
+        'food_cache': nutritionist_agent.nutrition_api.get_cache_metrics() if nutritionist_available else {},
+        'usda_http': nutritionist_agent.nutrition_api.get_http_metrics() if nutritionist_available else {},
+        'food_cache_prewarm': food_cache_prewarmer.get_status() if food_cache_prewarmer else {}
     })
 
 
@@ -677,6 +770,7 @@ Estou aqui sempre que precisar de ajustes! Vamos nessa jornada juntos! 💪"""
 
                 # Limpar estado da consulta
                 if 'consultation_state' in session:
+                    nutritionist_agent.discard_speculative_preview(session['consultation_state'])
                     del session['consultation_state']
                 
                 return jsonify({
@@ -725,6 +819,8 @@ def api_reset_consultation():
     try:
         # Limpar estado da consulta
         if 'consultation_state' in session:
+            if nutritionist_agent:
+                nutritionist_agent.discard_speculative_preview(session['consultation_state'])
             del session['consultation_state']
         
         return jsonify({
@@ -771,9 +867,7 @@ def daily_assistant():
     has_diet = False
     
     try:
-        user_diets = diet_manager.get_user_diet_list(user_id)
-        if user_diets and len(user_diets) > 0:
-            has_diet = True
+        has_diet = diet_manager.has_active_diet(user_id)
     except Exception as e:
         logging.error(f"Erro ao verificar dieta do usuário: {e}")
         has_diet = False
@@ -1058,6 +1152,109 @@ def update_inventory_api():
             'message': 'Erro interno do servidor'
         }), 500
 
+@app.route('/api/inventory/delete', methods=['POST'])
+@require_login
+def delete_inventory_api():
+    """Remove item do estoque"""
+    try:
+        data = request.get_json() or {}
+        item_name = str(data.get('item_name') or '').strip()
+
+        if not item_name:
+            return jsonify({
+                'success': False,
+                'message': 'Nome do item é obrigatório'
+            }), 400
+
+        result = diet_manager.bulk_update_inventory(session['user_id'], deletes=[item_name])
+
+        if not result['deleted']:
+            return jsonify({
+                'success': False,
+                'message': 'Item não encontrado no estoque'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'message': 'Item removido com sucesso'
+        })
+
+    except Exception as e:
+        logger.error(f"Erro ao remover item do estoque: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Erro interno do servidor'
+        }), 500
+
+@app.route('/api/inventory/bulk', methods=['POST'])
+@require_login
+def bulk_inventory_api():
+    """Adiciona/atualiza e remove vários itens do estoque em uma única transação"""
+    try:
+        data = request.get_json() or {}
+        upserts = data.get('upserts') or []
+        deletes = data.get('deletes') or []
+
+        if not isinstance(upserts, list) or not isinstance(deletes, list):
+            return jsonify({
+                'success': False,
+                'message': 'upserts e deletes devem ser listas'
+            }), 400
+
+        if not upserts and not deletes:
+            return jsonify({
+                'success': False,
+                'message': 'Nenhum item fornecido'
+            }), 400
+
+        if len(upserts) + len(deletes) > INVENTORY_BULK_MAX_ITEMS:
+            return jsonify({
+                'success': False,
+                'message': f'Máximo de {INVENTORY_BULK_MAX_ITEMS} itens por requisição'
+            }), 400
+
+        items = []
+        for position, item in enumerate(upserts):
+            if not isinstance(item, dict):
+                return jsonify({
+                    'success': False,
+                    'message': f'Item {position + 1}: formato inválido'
+                }), 400
+
+            item_name = str(item.get('item_name') or '').strip()
+            quantity = str(item.get('quantity') or '').strip()
+            if not item_name or not quantity:
+                return jsonify({
+                    'success': False,
+                    'message': f'Item {position + 1}: nome do item e quantidade são obrigatórios'
+                }), 400
+
+            items.append({
+                'item_name': item_name,
+                'quantity': quantity,
+                'unit': item.get('unit', 'unidade'),
+                'category': item.get('category', 'outros'),
+                'expiration_date': item.get('expiration_date')
+            })
+
+        names = [str(name).strip() for name in deletes if str(name or '').strip()]
+
+        result = diet_manager.bulk_update_inventory(session['user_id'], upserts=items, deletes=names)
+
+        return jsonify({
+            'success': True,
+            'message': 'Estoque atualizado com sucesso',
+            'upserted': result['upserted'],
+            'deleted': result['deleted']
+        })
+
+    except Exception as e:
+        logger.error(f"Erro ao atualizar estoque em lote: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'Erro interno do servidor'
+        }), 500
+
 
 def run_app():
     """Function to run the app for uv script"""